@@ -239,19 +239,17 @@ class LoginWorkerThread(QThread):
         
         # Проверяем авторизацию
         self.progress_signal.emit("Testing authorization via Wordstat...")
-        auth_results = await auth_checker.check_multiple_accounts(accounts_to_check)
         
-        # Фильтруем кто нуждается в логине
+        # Фильтруем кто нуждается в логине (результаты приходят по мере готовности)
         need_login = []
         already_authorized = []
         
-        for acc_data in accounts_to_check:
+        async for acc_data, result in auth_checker.iter_check_accounts(accounts_to_check):
             acc_name = acc_data["name"]
-            result = auth_results.get(acc_name, {})
             
             if result.get("is_authorized"):
                 already_authorized.append(acc_name)
-                self.progress_signal.emit(f"[OK] {acc_name}: Already authorized")
+                self.progress_signal.emit(f"[OK] {acc_name}: Already authorized ({result.get('method')})")
                 # Обновляем статус в БД
                 self.account_logged_signal.emit(acc_data["account_id"], True, "Authorized")
             else:
@@ -41,12 +41,15 @@ from PySide6.QtWidgets import (
 )
 
 from ..services import phrase_tools
+from ..services import morphology
+from ..services.cluster_store import ClusterStore
 from ..services import accounts as account_service
 from ..services import tasks as task_service
 from ..services import importer as importer_service
 from ..services import frequency as frequency_service
 from ..workers.frequency_runner import execute_task
 from ..workers.deep_runner import run_deep_task
+from ..workers.browser_pool import shutdown_shared_pool_host
 from ..core.db import Base, engine, ensure_schema, SessionLocal
 from .turbo_tab_qt import TurboParserTab
 from .full_pipeline_tab import FullPipelineTab
@@ -60,6 +63,8 @@ LOGS_DIR = Path("results") / "gui_logs"
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 MANUAL_SEEDS_DIR = Path("results") / "manual_inputs"
 MANUAL_SEEDS_DIR.mkdir(parents=True, exist_ok=True)
+# Больше комбинаций не выводим в окно, а пишем в файлы
+COMBO_PREVIEW_LIMIT = 200_000
 
 
 def append_log_line(path: Path, message: str) -> None:
@@ -261,15 +266,22 @@ class PhrasePrepTab(QWidget):
         self.strip_punct_check = QCheckBox("Удалить знаки пунктуации")
         self.dedup_check = QCheckBox("Удалить дубликаты")
         self.dedup_check.setChecked(True)
+        self.collapse_check = QCheckBox("Склеить неявные дубли (порядок слов, словоформы)")
+        self._duplicate_groups: phrase_tools.DuplicateGroups | None = None
 
         norm_box = QGroupBox("Нормализация")
         norm_layout = QVBoxLayout(norm_box)
         norm_layout.addWidget(self.lowercase_check)
         norm_layout.addWidget(self.strip_punct_check)
         norm_layout.addWidget(self.dedup_check)
+        norm_layout.addWidget(self.collapse_check)
         self.normalize_btn = QPushButton("Нормализовать")
         self.normalize_btn.clicked.connect(self.normalize_phrases)
         norm_layout.addWidget(self.normalize_btn)
+        self.export_aliases_btn = QPushButton("Экспорт склеек…")
+        self.export_aliases_btn.setEnabled(False)
+        self.export_aliases_btn.clicked.connect(self.export_aliases)
+        norm_layout.addWidget(self.export_aliases_btn)
 
         self.min_len_spin = QSpinBox()
         self.min_len_spin.setRange(0, 100)
@@ -304,9 +316,18 @@ class PhrasePrepTab(QWidget):
         cluster_box = QGroupBox("Кластеризация")
         cluster_form = QFormLayout(cluster_box)
         cluster_form.addRow("Порог схожести:", self.similarity_spin)
+        self.cluster_store_check = QCheckBox("Дописывать в сохранённые кластеры")
+        self.cluster_store_check.setToolTip(
+            "Новые фразы распределяются по кластерам из базы, старые не пересчитываются"
+        )
+        cluster_form.addRow("", self.cluster_store_check)
+        self._cluster_stores: dict[float, ClusterStore] = {}
         self.cluster_btn = QPushButton("Сгруппировать")
         self.cluster_btn.clicked.connect(self.cluster_phrases)
         cluster_form.addRow("", self.cluster_btn)
+        self.clear_clusters_btn = QPushButton("Очистить сохранённые кластеры")
+        self.clear_clusters_btn.clicked.connect(self.clear_stored_clusters)
+        cluster_form.addRow("", self.clear_clusters_btn)
 
         self.combo_edit = QPlainTextEdit()
         self.combo_edit.setPlaceholderText(
@@ -316,6 +337,7 @@ class PhrasePrepTab(QWidget):
         self.combo_normalize_check.setChecked(True)
         self.combinate_btn = QPushButton("Сгенерировать комбинации")
         self.combinate_btn.clicked.connect(self.generate_combinations)
+        self._combo_thread: CombinationShardThread | None = None
 
         combo_box = QGroupBox("Комбинации словарей")
         combo_layout = QVBoxLayout(combo_box)
@@ -404,8 +426,35 @@ class PhrasePrepTab(QWidget):
             return
         options = self._build_normalizer()
         normalized = phrase_tools.normalize_phrases(phrases, options)
+        self._duplicate_groups = None
+        status = f"Нормализовано: {len(normalized)}"
+        if self.collapse_check.isChecked():
+            groups = phrase_tools.collapse_duplicates(normalized)
+            self._duplicate_groups = groups
+            normalized = groups.representatives
+            status += f", склеено дублей: {groups.removed}"
+        self.export_aliases_btn.setEnabled(bool(self._duplicate_groups and self._duplicate_groups.aliases))
         self._set_result(normalized)
-        self._update_status(f"Нормализовано: {len(normalized)}")
+        self._update_status(status)
+
+    def export_aliases(self) -> None:
+        groups = self._duplicate_groups
+        if not groups or not groups.aliases:
+            self._update_status("Нет склеенных дублей")
+            return
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Сохранить склейки",
+            str(Path.cwd() / "aliases.csv"),
+            "CSV файлы (*.csv);;Все файлы (*.*)",
+        )
+        if not filename:
+            return
+        try:
+            count = groups.write_aliases(filename)
+            self._update_status(f"Склейки сохранены: {count} → {filename}")
+        except OSError as exc:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось выполнить действие\n{exc}")
 
     def filter_phrases(self) -> None:
         phrases = self._get_result_phrases() or self._get_input_phrases()
@@ -430,12 +479,48 @@ class PhrasePrepTab(QWidget):
         if not phrases:
             self._update_status("Нет данных для кластеризации")
             return
-        clusters = phrase_tools.cluster_phrases(phrases, similarity=self.similarity_spin.value())
+        similarity = round(self.similarity_spin.value(), 2)
+        if self.cluster_store_check.isChecked():
+            store = self._cluster_store(similarity)
+            try:
+                added = store.add_phrases(phrases)
+            except Exception as exc:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить кластеры\n{exc}")
+                return
+            clusters = store.clusters
+            status = (
+                f"Кластеров: {len(clusters)} (новых фраз: {added.added}, "
+                f"новых кластеров: {added.new_clusters})"
+            )
+        else:
+            clusters = phrase_tools.cluster_phrases(
+                phrases,
+                similarity=similarity,
+                tokenizer=morphology.lemmas,
+            )
+            status = f"Кластеров: {len(clusters)}"
         lines: list[str] = []
         for size, representative, members in phrase_tools.walk_clusters(clusters):
             lines.append(f"[{size}] {representative} -> {'; '.join(members)}")
         self.result_edit.setPlainText("\n".join(lines))
-        self._update_status(f"Кластеров: {len(clusters)}")
+        self._update_status(status)
+
+    def _cluster_store(self, similarity: float) -> ClusterStore:
+        # Порог фиксирован на всё время жизни namespace, поэтому у каждого порога свой
+        store = self._cluster_stores.get(similarity)
+        if store is None:
+            store = ClusterStore(f"phrase_prep:{similarity:.2f}", similarity=similarity)
+            self._cluster_stores[similarity] = store
+        return store
+
+    def clear_stored_clusters(self) -> None:
+        similarity = round(self.similarity_spin.value(), 2)
+        try:
+            self._cluster_store(similarity).clear()
+        except Exception as exc:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось выполнить действие\n{exc}")
+            return
+        self._update_status(f"Сохранённые кластеры (порог {similarity:.2f}) очищены")
 
     def generate_combinations(self) -> None:
         blocks: list[list[str]] = []
@@ -454,10 +539,39 @@ class PhrasePrepTab(QWidget):
             self._update_status("Словари не заданы")
             return
         normalizer = self._build_normalizer() if self.combo_normalize_check.isChecked() else None
+        total = phrase_tools.combination_count(blocks)
+        if total > COMBO_PREVIEW_LIMIT:
+            # Столько строк окно не покажет: пишем сразу в файлы по частям
+            out_dir = QFileDialog.getExistingDirectory(
+                self, f"Комбинаций {total:,} — выберите папку для файлов", str(Path.cwd())
+            )
+            if not out_dir:
+                self._update_status(f"Комбинаций {total:,}: слишком много для окна, папка не выбрана")
+                return
+            # Запись занимает минуты: в отдельном потоке, прогресс по каждому чанку
+            thread = CombinationShardThread(blocks, normalizer, out_dir, total)
+            thread.progress.connect(
+                lambda written, expected: self._update_status(f"Комбинаций записано: {written:,} из ~{expected:,}")
+            )
+            thread.completed.connect(self._on_combinations_written)
+            self._combo_thread = thread
+            self.combinate_btn.setEnabled(False)
+            self._update_status(f"Комбинаций до {total:,}: запись в {out_dir}…")
+            thread.start()
+            return
         combos = phrase_tools.generate_combinations(blocks, normalization=normalizer)
         self._set_result(combos)
         self._update_status(f"Комбинаций: {len(combos)}")
 
+    def _on_combinations_written(self, success: bool, message: str) -> None:
+        self._combo_thread = None
+        self.combinate_btn.setEnabled(True)
+        if success:
+            self._update_status(message)
+        else:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось выполнить действие\n{message}")
+            self._update_status("Комбинации не записаны")
+
     def copy_to_input(self) -> None:
         phrases = self._get_result_phrases()
         if not phrases:
@@ -514,6 +628,48 @@ class PhrasePrepTab(QWidget):
     def clear_input(self) -> None:
         self.input_edit.clear()
 
+class CombinationShardThread(QThread):
+    """Ворк-поток записи больших наборов комбинаций в файлы по частям."""
+
+    progress = Signal(int, int)  # записано, всего (оценка сверху)
+    completed = Signal(bool, str)
+
+    def __init__(
+        self,
+        blocks: list[list[str]],
+        normalizer: Optional[phrase_tools.NormalizationOptions],
+        out_dir: str,
+        total: int,
+    ) -> None:
+        super().__init__()
+        self.blocks = blocks
+        self.normalizer = normalizer
+        self.out_dir = out_dir
+        self.total = total
+
+    def _counted(self, chunks):
+        written = 0
+        for chunk in chunks:
+            if self.isInterruptionRequested():
+                return
+            yield chunk
+            written += len(chunk)
+            self.progress.emit(written, self.total)
+
+    def run(self) -> None:  # type: ignore[override]
+        try:
+            chunks = phrase_tools.iter_combination_chunks(
+                self.blocks, normalization=self.normalizer, chunk_size=50_000, temp_dir=self.out_dir
+            )
+            paths = phrase_tools.write_combination_shards(self._counted(chunks), self.out_dir)
+        except Exception as exc:  # pragma: no cover - GUI
+            self.completed.emit(False, str(exc))
+            return
+        self.completed.emit(
+            True, f"Комбинаций до {self.total:,}: записано в {len(paths)} файл(ов) в {self.out_dir}"
+        )
+
+
 class FrequencyWorkerThread(QThread):
     """Ворк-поток для задач частотности."""
 
@@ -1663,6 +1819,8 @@ class MainWindow(QMainWindow):
         settings = QSettings("KeySet", "KeySet")
         settings.setValue("main_splitter_state", self.main_splitter.saveState())
         settings.setValue("left_splitter_state", self.left_splitter.saveState())
+        # Тёплые браузеры раннеров живут до выхода из приложения
+        shutdown_shared_pool_host()
         super().closeEvent(event)
     
     def _save_log(self):
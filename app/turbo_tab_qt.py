@@ -17,42 +17,71 @@ from PySide6.QtWidgets import (
 )
 from pathlib import Path
 from ..core.db import get_db_connection
-from ..services import frequency, direct
+from ..services import frequency, direct, morphology
 
-# Inline cluster (NLTK, no separate)
+# Inline cluster: phrases with the same set of word stems (shared morphology layer)
 def cluster_results(results):
-    try:
-        from nltk.stem.snowball import SnowballStemmer
-        from nltk.corpus import stopwords
-        stemmer = SnowballStemmer('russian')
-        stops = set(stopwords.words('russian'))
-        grouped = {}
-        for r in results:
-            phrase = r['phrase'].lower()
-            if any(w in stops for w in phrase.split()):
-                continue
-            stem = stemmer.stem(phrase)
-            if stem not in grouped:
-                grouped[stem] = []
-            grouped[stem].append(r)
-        clustered = []
-        for stem, group in grouped.items():
-            if len(group) > 1 and min(g['freq'] for g in group) > 10:
-                avg_freq = sum(g['freq'] for g in group) / len(group)
-                for g in group:
-                    g['stem'] = stem
-                    g['avg_freq'] = avg_freq
-                    clustered.append(g)
-        clustered = list({r['phrase']: r for r in clustered}.values())
-        clustered.sort(key=lambda x: x['freq'], reverse=True)
-        for r in clustered:
-            with get_db_connection() as conn:
-                conn.execute("INSERT OR REPLACE INTO clusters (stem, phrases, avg_freq) VALUES (?, ?, ?)",
-                             (r['stem'], json.dumps([r['phrase']]), r['avg_freq']))
-        return clustered
-    except ImportError as e:
-        print(f"NLTK error: {e} - Install nltk")
-        return results  # Fallback
+    stops = morphology.stopwords()
+    grouped = {}
+    for r, words in zip(results, morphology.tokenize_many(r['phrase'] for r in results)):
+        if any(w in stops for w in words):
+            continue
+        stem = " ".join(sorted({morphology.stem(w) for w in words}))
+        if stem not in grouped:
+            grouped[stem] = []
+        grouped[stem].append(r)
+    clustered = []
+    for stem, group in grouped.items():
+        if len(group) > 1 and min(g['freq'] for g in group) > 10:
+            avg_freq = sum(g['freq'] for g in group) / len(group)
+            for g in group:
+                g['stem'] = stem
+                g['avg_freq'] = avg_freq
+                clustered.append(g)
+    clustered = list({r['phrase']: r for r in clustered}.values())
+    clustered.sort(key=lambda x: x['freq'], reverse=True)
+    save_clusters(clustered)
+    return clustered
+
+
+def save_clusters(clustered):
+    """Merge clustered rows into the clusters table in one transaction.
+
+    Phrases of a stem that is already stored are appended to its list, so a new
+    batch only extends existing clusters instead of replacing them. avg_freq is
+    recomputed over the merged list: stored phrases count at the stored
+    average, phrases of this batch at their own frequency.
+    """
+    by_stem = {}
+    for r in clustered:
+        by_stem.setdefault(r['stem'], {})[r['phrase']] = r['freq']
+    if not by_stem:
+        return
+    rows = {stem: (list(freqs), sum(freqs.values())) for stem, freqs in by_stem.items()}
+    stems = list(by_stem)
+    with get_db_connection() as conn:
+        for i in range(0, len(stems), 500):
+            chunk = stems[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            query = f"SELECT stem, phrases, avg_freq FROM clusters WHERE stem IN ({placeholders})"
+            for row in conn.execute(query, chunk):
+                try:
+                    stored = json.loads(row['phrases'] or '[]')
+                except ValueError:
+                    stored = []
+                fresh = by_stem[row['stem']]
+                kept = [p for p in dict.fromkeys(stored) if p not in fresh]
+                phrases, freq_sum = rows[row['stem']]
+                merged = list(dict.fromkeys(stored + phrases))
+                rows[row['stem']] = (merged, freq_sum + (row['avg_freq'] or 0) * len(kept))
+        conn.executemany(
+            "INSERT INTO clusters (stem, phrases, avg_freq) VALUES (?, ?, ?) "
+            "ON CONFLICT(stem) DO UPDATE SET phrases = excluded.phrases, avg_freq = excluded.avg_freq",
+            [
+                (stem, json.dumps(phrases, ensure_ascii=False), freq_sum / len(phrases))
+                for stem, (phrases, freq_sum) in rows.items()
+            ],
+        )
 
 # Use new services from services/frequency.py and services/direct.py
 async def parse_frequency(masks, region=225):
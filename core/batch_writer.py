@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Generic, Optional, Sequence, TypeVar
+
+T = TypeVar('T')
+
+
+class AsyncBatchWriter(Generic[T]):
+    """Buffer rows in memory and flush them in bulk from a worker thread.
+
+    A flush is triggered when the buffer reaches *max_batch* rows or when
+    *flush_interval* seconds have passed since the previous one, whichever
+    comes first. *flush_fn* receives the whole batch and runs in
+    ``asyncio.to_thread`` so SQLite I/O never blocks the event loop.
+    Flushes are serialized; a failed batch is put back and retried on the
+    next flush.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[Sequence[T]], Any],
+        *,
+        max_batch: int = 500,
+        flush_interval: float = 2.0,
+        name: str = 'batch',
+    ) -> None:
+        self.flush_fn = flush_fn
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = max(0.1, float(flush_interval))
+        self.name = name
+        self.total_written = 0
+        self._buffer: list[T] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+        self._closed = False
+
+    async def __aenter__(self) -> 'AsyncBatchWriter[T]':
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run_timer())
+
+    def add(self, item: T) -> None:
+        """Queue one row; never blocks."""
+        if self._closed:
+            raise RuntimeError(f'{self.name} writer is closed')
+        self._buffer.append(item)
+        if len(self._buffer) >= self.max_batch:
+            self._schedule_flush()
+
+    def extend(self, items: Sequence[T]) -> None:
+        for item in items:
+            self.add(item)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns number of rows written."""
+        async with self._lock:
+            if not self._buffer:
+                return 0
+            batch, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self.flush_fn, batch)
+            except Exception:
+                self._buffer[:0] = batch
+                raise
+            self.total_written += len(batch)
+            return len(batch)
+
+    async def close(self) -> None:
+        """Stop the timer and flush the remaining rows."""
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        await self.flush()
+
+    def _schedule_flush(self) -> None:
+        task = asyncio.create_task(self._safe_flush())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _safe_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception as exc:
+            print(f"[{self.name}] Ошибка записи пачки ({len(self._buffer)} в очереди): {exc}")
+
+    async def _run_timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._safe_flush()
+
+
+__all__ = ['AsyncBatchWriter']
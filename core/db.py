@@ -2,6 +2,7 @@
 
 from pathlib import Path
 from contextlib import contextmanager
+import os
 import sqlite3
 
 from sqlalchemy import create_engine, inspect, text, event
@@ -11,6 +12,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / 'data'
 DATA_DIR.mkdir(exist_ok=True)
 DB_PATH = DATA_DIR / 'keyset.db'
+if os.environ.get('SEMTOOL_BENCH_DB'):
+    # Throwaway database for scripts/bench_wordstat.py; relative paths are taken from the project root.
+    # Not DB_PATH: that name is already used by .env.example for another database file.
+    DB_PATH = Path(os.environ['SEMTOOL_BENCH_DB'])
+    if not DB_PATH.is_absolute():
+        DB_PATH = BASE_DIR / DB_PATH
 
 DATABASE_URL = f'sqlite:///{DB_PATH.as_posix()}'
 
@@ -19,6 +26,155 @@ class Base(DeclarativeBase):
     pass
 
 
+# Materialized frequency + forecast report, maintained by triggers on the source tables.
+# Each source: (table, phrase column, region expression, {report column: source column},
+# optional WHEN condition for rows that should reach the report).
+_REPORT_SOURCES = {
+    'frequencies': ('phrase', 'COALESCE({row}.region, 225)', {'freq': 'freq'}, None),
+    'forecasts': ('phrase', 'COALESCE({row}.region, 225)',
+                  {'cpc': 'cpc', 'impressions': 'impressions', 'budget': 'budget'}, None),
+    'freq_results': ('mask', '{row}.region', {'freq': 'freq_total'}, "{row}.status = 'ok'"),
+}
+_REPORT_VALUE_COLUMNS = ('freq', 'cpc', 'impressions', 'budget')
+
+
+def _report_value_sql(table: str, column: str, phrase: str, region: str) -> str:
+    """Subquery with the value ``table`` currently holds for report ``column`` of (phrase, region)."""
+    phrase_col, region_expr, columns, condition = _REPORT_SOURCES[table]
+    where = [f"src.{phrase_col} = {phrase}", f"{region_expr.format(row='src')} = {region}"]
+    if condition:
+        where.append(condition.format(row='src'))
+    return f"(SELECT src.{columns[column]} FROM {table} AS src WHERE {' AND '.join(where)} LIMIT 1)"
+
+
+def _report_trigger_sql(table: str, available: tuple[str, ...]) -> list[str]:
+    """CREATE TRIGGER statements that mirror ``table`` changes into freq_forecast_report.
+
+    ``available`` lists the source tables that exist; a column fed by several of them
+    (``freq``) falls back to the other sources' value when this source clears it.
+    """
+    phrase_col, region_expr, columns, condition = _REPORT_SOURCES[table]
+
+    def upsert(row: str) -> str:
+        cols = ', '.join(columns)
+        values = ', '.join(f'{row}.{src}' for src in columns.values())
+        updates = ', '.join(f'{col} = excluded.{col}' for col in columns)
+        return (
+            f"INSERT INTO freq_forecast_report (phrase, region, {cols}, updated_at) "
+            f"VALUES ({row}.{phrase_col}, {region_expr.format(row=row)}, {values}, CURRENT_TIMESTAMP) "
+            f"ON CONFLICT(phrase, region) DO UPDATE SET {updates}, updated_at = excluded.updated_at;"
+        )
+
+    def fallback(row: str, column: str) -> str:
+        phrase, region = f'{row}.{phrase_col}', region_expr.format(row=row)
+        others = [
+            _report_value_sql(other, column, phrase, region)
+            for other in available
+            if other != table and column in _REPORT_SOURCES[other][2]
+        ]
+        if not others:
+            return 'NULL'
+        return others[0] if len(others) == 1 else f"COALESCE({', '.join(others)})"
+
+    def clear(row: str) -> str:
+        key = f"phrase = {row}.{phrase_col} AND region = {region_expr.format(row=row)}"
+        resets = ', '.join(f'{col} = {fallback(row, col)}' for col in columns)
+        empty = ' AND '.join(f'{col} IS NULL' for col in _REPORT_VALUE_COLUMNS)
+        return (
+            f"UPDATE freq_forecast_report SET {resets}, updated_at = CURRENT_TIMESTAMP WHERE {key}; "
+            f"DELETE FROM freq_forecast_report WHERE {key} AND {empty};"
+        )
+
+    when_new = f" WHEN {condition.format(row='NEW')}" if condition else ''
+    return [
+        f"CREATE TRIGGER trg_report_{table}_ins AFTER INSERT ON {table}{when_new} "
+        f"BEGIN {upsert('NEW')} END",
+        # Key change moves the values; for a filtered source a row that leaves the filter keeps
+        # its last reported value
+        f"CREATE TRIGGER trg_report_{table}_upd AFTER UPDATE ON {table}{when_new} "
+        f"BEGIN {clear('OLD')} {upsert('NEW')} END",
+        f"CREATE TRIGGER trg_report_{table}_del AFTER DELETE ON {table} "
+        f"BEGIN {clear('OLD')} END",
+    ]
+
+
+def _install_report_sources(conn, available: tuple[str, ...]) -> None:
+    """Backfill newly added report sources (once) and recreate the triggers of all of them.
+
+    Triggers are recreated every time because their fallback subqueries depend on which
+    source tables exist.
+    """
+    for table in available:
+        installed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"),
+            {'name': f'trg_report_{table}_ins'},
+        ).first()
+        if not installed:
+            phrase_col, region_expr, columns, condition = _REPORT_SOURCES[table]
+            cols = ', '.join(columns)
+            values = ', '.join(f'src.{c}' for c in columns.values())
+            updates = ', '.join(f'{col} = excluded.{col}' for col in columns)
+            where = f"WHERE {condition.format(row='src')}" if condition else 'WHERE true'
+            conn.execute(text(
+                f"INSERT INTO freq_forecast_report (phrase, region, {cols}) "
+                f"SELECT src.{phrase_col}, {region_expr.format(row='src')}, {values} FROM {table} AS src {where} "
+                f"ON CONFLICT(phrase, region) DO UPDATE SET {updates}"
+            ))
+    for table in available:
+        for op in ('ins', 'upd', 'del'):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_report_{table}_{op}"))
+        for statement in _report_trigger_sql(table, available):
+            conn.execute(text(statement))
+
+
+def rebuild_freq_forecast_report() -> None:
+    """Drop and rebuild the report table and its triggers from the source tables."""
+    with engine.begin() as conn:
+        for table in _REPORT_SOURCES:
+            for op in ('ins', 'upd', 'del'):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS trg_report_{table}_{op}"))
+        conn.execute(text("DROP TABLE IF EXISTS freq_forecast_report"))
+    ensure_schema()
+
+
+_FORECASTS_DDL = '''
+    CREATE TABLE {table} (
+        phrase TEXT NOT NULL,
+        region INTEGER NOT NULL DEFAULT 225,
+        cpc REAL,
+        impressions INTEGER,
+        budget REAL,
+        processed BOOLEAN DEFAULT 0,
+        freq_ref TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (phrase, region),
+        FOREIGN KEY (freq_ref) REFERENCES frequencies(phrase)
+    )
+'''
+
+
+def _migrate_forecasts_pk(conn, old_columns: set[str]) -> None:
+    """Rebuild an old ``forecasts(phrase PRIMARY KEY)`` table with the (phrase, region) key.
+
+    SQLite cannot change a primary key in place, so rows are copied into a new table
+    which then replaces the old one. The report triggers go away with the old table
+    and are reinstalled (with a backfill) by ``_install_report_sources``.
+    """
+    copied = [col for col in ('cpc', 'impressions', 'budget', 'freq_ref', 'created_at') if col in old_columns]
+    region = 'COALESCE(region, 225)' if 'region' in old_columns else '225'
+    processed = 'COALESCE(processed, 0)' if 'processed' in old_columns else '0'
+    conn.execute(text(_FORECASTS_DDL.format(table='forecasts_new')))
+    conn.execute(text(
+        f"INSERT OR REPLACE INTO forecasts_new (phrase, region, processed{''.join(', ' + c for c in copied)}) "
+        f"SELECT phrase, {region}, {processed}{''.join(', ' + c for c in copied)} FROM forecasts"
+    ))
+    for op in ('ins', 'upd', 'del'):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS trg_report_forecasts_{op}"))
+    conn.execute(text("DROP TABLE forecasts"))
+    conn.execute(text("ALTER TABLE forecasts_new RENAME TO forecasts"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_forecast_phrase ON forecasts(phrase)"))
+
+
 def ensure_schema() -> None:
     """Perform lightweight SQLite migrations for the tasks table."""
     engine = ensure_schema.engine  # type: ignore[attr-defined]
@@ -42,18 +198,28 @@ def ensure_schema() -> None:
         
         # Forecasts table (Direct budget results)
         if not inspector.has_table('forecasts'):
+            conn.execute(text(_FORECASTS_DDL.format(table='forecasts')))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_forecast_phrase ON forecasts(phrase)"))
+        elif inspector.get_pk_constraint('forecasts').get('constrained_columns') != ['phrase', 'region']:
+            _migrate_forecasts_pk(conn, {col['name'] for col in inspector.get_columns('forecasts')})
+        
+        # Forecast cache (normalized phrase + region-set hash, see services/forecast_cache.py)
+        if not inspector.has_table('forecast_cache'):
             conn.execute(text('''
-                CREATE TABLE forecasts (
-                    phrase TEXT PRIMARY KEY,
-                    cpc REAL,
-                    impressions INTEGER,
-                    budget REAL,
-                    freq_ref TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (freq_ref) REFERENCES frequencies(phrase)
+                CREATE TABLE forecast_cache (
+                    phrase_key TEXT NOT NULL,
+                    region_key TEXT NOT NULL,
+                    phrase TEXT NOT NULL,
+                    regions TEXT,
+                    shows INTEGER NOT NULL DEFAULT 0,
+                    clicks INTEGER NOT NULL DEFAULT 0,
+                    cost REAL NOT NULL DEFAULT 0,
+                    cpc REAL NOT NULL DEFAULT 0,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (phrase_key, region_key)
                 )
             '''))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_forecast_phrase ON forecasts(phrase)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_forecast_cache_fetched ON forecast_cache(fetched_at)"))
         
         # Clusters table (grouped/clustered results)
         if not inspector.has_table('clusters'):
@@ -67,6 +233,76 @@ def ensure_schema() -> None:
                 )
             '''))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_cluster_stem ON clusters(stem)"))
+        
+        # Persistent phrase cluster index (see services/cluster_store.py)
+        if not inspector.has_table('cluster_index'):
+            conn.execute(text('''
+                CREATE TABLE cluster_index (
+                    namespace TEXT NOT NULL,
+                    cluster_no INTEGER NOT NULL,
+                    representative TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    similarity REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, cluster_no)
+                )
+            '''))
+        if not inspector.has_table('cluster_members'):
+            conn.execute(text('''
+                CREATE TABLE cluster_members (
+                    namespace TEXT NOT NULL,
+                    phrase TEXT NOT NULL,
+                    cluster_no INTEGER NOT NULL,
+                    member_no INTEGER NOT NULL,
+                    tokens TEXT NOT NULL,
+                    added_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, phrase)
+                )
+            '''))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_cluster_members_order "
+                "ON cluster_members(namespace, cluster_no, member_no)"
+            ))
+        
+        # Related phrases (left/right Wordstat columns captured from API responses)
+        if not inspector.has_table('related_phrases'):
+            conn.execute(text('''
+                CREATE TABLE related_phrases (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source_mask TEXT NOT NULL,
+                    region INTEGER NOT NULL DEFAULT 225,
+                    kind TEXT NOT NULL,
+                    phrase TEXT NOT NULL,
+                    freq INTEGER NOT NULL DEFAULT 0,
+                    position INTEGER NOT NULL DEFAULT 0,
+                    source TEXT,
+                    captured_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(source_mask, region, kind, phrase)
+                )
+            '''))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_related_phrase ON related_phrases(phrase)"))
+        
+        # Frequency + forecast report (replaces the frequencies/forecasts LEFT JOIN on export)
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS freq_forecast_report (
+                phrase TEXT NOT NULL,
+                region INTEGER NOT NULL DEFAULT 225,
+                freq INTEGER,
+                cpc REAL,
+                impressions INTEGER,
+                budget REAL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (phrase, region)
+            )
+        '''))
+        # Covering index: export reads region + ORDER BY freq DESC without touching the table
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_report_region_freq "
+            "ON freq_forecast_report(region, freq DESC, phrase, cpc, impressions, budget)"
+        ))
+        # freq_results appears later (ORM create_all); it is picked up on the next start
+        tables = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+        _install_report_sources(conn, tuple(t for t in _REPORT_SOURCES if t in tables))
     
     if not inspector.has_table('tasks'):
         return
@@ -90,6 +326,7 @@ def ensure_schema() -> None:
             '''))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_freq_status ON freq_results(status)"))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_freq_updated ON freq_results(updated_at)"))
+            _install_report_sources(conn, tuple(_REPORT_SOURCES))
 
     with engine.begin() as conn:
         info_rows = list(conn.execute(text('PRAGMA table_info(tasks)')))
@@ -194,4 +431,4 @@ def get_db_connection():
         conn.close()
 
 
-__all__ = ['Base', 'engine', 'SessionLocal', 'DB_PATH', 'ensure_schema', 'get_db_connection']
+__all__ = ['Base', 'engine', 'SessionLocal', 'DB_PATH', 'ensure_schema', 'get_db_connection', 'rebuild_freq_forecast_report']
@@ -0,0 +1,328 @@
+"""
+Офлайн-бенчмарк раннеров Wordstat
+
+Поднимает локальный фейковый Wordstat (scripts/fake_wordstat.py), подменяет
+https://wordstat.yandex.ru через Playwright route и гоняет:
+ - turbo    — TurboWordstatParser.parse_batch (перехват /wordstat/api);
+ - session  — parse_frequency_with_session (страницы ?words=...);
+ - cdp      — parse_with_cdp (захват URL экспорта + HTTP-реплей).
+
+Пишет JSON-отчёт: фраз/мин, p50/p95 задержки, CPU и RSS процесса.
+Отчёты сравниваются между коммитами через --compare.
+База данных — временная (SEMTOOL_BENCH_DB), рабочая keyset.db не трогается.
+
+Запуск из каталога, где лежит пакет keyset:
+    python keyset/scripts/bench_wordstat.py --runner turbo --phrases 300 --latency-ms 120
+    python keyset/scripts/bench_wordstat.py --runner all --out bench/new.json --compare bench/base.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+# Временная БД до импорта keyset.core.db
+_TMP_DIR = tempfile.mkdtemp(prefix="keyset_bench_")
+os.environ.setdefault("SEMTOOL_BENCH_DB", str(Path(_TMP_DIR) / "bench.db"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_wordstat import FakeWordstat, FakeWordstatConfig  # noqa: E402
+
+from playwright.async_api import BrowserContext, Route, async_playwright  # noqa: E402
+
+try:
+    import psutil  # type: ignore
+except ImportError:  # pragma: no cover - psutil is optional
+    psutil = None  # type: ignore
+
+RUNNERS = ("turbo", "session", "cdp")
+WORDSTAT_PATTERN = "https://wordstat.yandex.ru/**"
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _rss_mb() -> Optional[float]:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        import resource
+        # ru_maxrss в КБ на Linux (пиковое значение)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+class BenchHarness:
+    """Фейковый сервер + перенаправление wordstat.yandex.ru в браузере + замеры"""
+
+    def __init__(self, server: FakeWordstat):
+        self.server = server
+        self.route_latencies_ms: list[float] = []
+
+    async def attach(self, context: BrowserContext):
+        """Все запросы к wordstat.yandex.ru отдаём с локального сервера"""
+
+        async def forward(route: Route):
+            parts = urlsplit(route.request.url)
+            target = f"{self.server.base_url}{parts.path or '/'}"
+            if parts.query:
+                target += f"?{parts.query}"
+            started = time.perf_counter()
+            try:
+                response = await route.fetch(url=target)
+                await route.fulfill(response=response)
+            except Exception:
+                await route.abort()
+                return
+            if parts.path.startswith("/wordstat/api"):
+                self.route_latencies_ms.append((time.perf_counter() - started) * 1000)
+
+        await context.route(WORDSTAT_PATTERN, forward)
+
+
+async def _prepare_db() -> int:
+    """Схема во временной БД + тестовый аккаунт; возвращает account_id"""
+    from keyset.core.db import Base, SessionLocal, engine, ensure_schema
+    from keyset.core.models import Account
+
+    Base.metadata.create_all(engine)
+    ensure_schema()
+    profile = Path(_TMP_DIR) / "profiles" / "bench"
+    profile.mkdir(parents=True, exist_ok=True)
+    with SessionLocal() as session:
+        account = session.query(Account).filter(Account.name == "bench").first()
+        if account is None:
+            account = Account(name="bench", profile_path=str(profile))
+            session.add(account)
+            session.commit()
+            session.refresh(account)
+        return account.id
+
+
+async def run_turbo(harness: BenchHarness, phrases: list[str], tabs: int) -> int:
+    from keyset.workers.turbo_parser_integration import TurboWordstatParser
+
+    class BenchTurboParser(TurboWordstatParser):
+        async def init_browser(self):
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(headless=True)
+            self.context = await self.browser.new_context()
+            await harness.attach(self.context)
+
+    parser = BenchTurboParser(account=None, headless=True, visual_mode=False)
+    parser.num_tabs = tabs
+    try:
+        results = await parser.parse_batch(phrases)
+    finally:
+        await parser.close()
+    return len(results)
+
+
+async def run_session(harness: BenchHarness, phrases: list[str], account_id: int) -> int:
+    from keyset.workers.browser_pool import BrowserPool
+    from keyset.workers.session_frequency_runner import parse_frequency_with_session
+
+    class BenchPool(BrowserPool):
+        async def _launch(self, key, profile_path, proxy, headless):
+            entry = await super()._launch(key, profile_path, None, headless)
+            await harness.attach(entry.context)
+            return entry
+
+    pool = BenchPool(keep_context=True, headless=True, warm_url=None)
+    try:
+        stats = await parse_frequency_with_session(account_id, phrases, region=225, headless=True, pool=pool)
+    finally:
+        await pool.stop()
+    return int(stats.get("success", 0))
+
+
+async def run_cdp(harness: BenchHarness, phrases: list[str], account_id: int, port: int) -> int:
+    from keyset.workers import cdp_frequency_runner
+
+    original = cdp_frequency_runner.CDPFrequencyParser
+
+    class BenchCDPParser(original):
+        async def capture_export_url(self, page, masks_sample):
+            # route действует в рамках CDP-подключения раннера, вешаем его здесь
+            await harness.attach(page.context)
+            return await super().capture_export_url(page, masks_sample)
+
+    cdp_frequency_runner.CDPFrequencyParser = BenchCDPParser
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True, args=[f"--remote-debugging-port={port}"])
+            try:
+                stats = await cdp_frequency_runner.parse_with_cdp(
+                    account_id, phrases, region=225, cdp_url=f"http://127.0.0.1:{port}"
+                )
+            finally:
+                await browser.close()
+    finally:
+        cdp_frequency_runner.CDPFrequencyParser = original
+    return int(stats.get("success", 0))
+
+
+async def bench_one(runner: str, args: argparse.Namespace) -> dict[str, Any]:
+    config = FakeWordstatConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        captcha_rate=args.captcha_rate,
+        seed=args.seed,
+    )
+    server = await FakeWordstat(config).start()
+    harness = BenchHarness(server)
+    phrases = [f"bench {runner} фраза {i}" for i in range(args.phrases)]
+    account_id = await _prepare_db()
+
+    peak_rss = _rss_mb() or 0.0
+    sampling = True
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while sampling:
+            peak_rss = max(peak_rss, _rss_mb() or 0.0)
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(sample_rss())
+    cpu_start = time.process_time()
+    started = time.perf_counter()
+    error: Optional[str] = None
+    ok = 0
+    try:
+        if runner == "turbo":
+            ok = await run_turbo(harness, phrases, args.tabs)
+        elif runner == "session":
+            ok = await run_session(harness, phrases, account_id)
+        elif runner == "cdp":
+            ok = await run_cdp(harness, phrases, account_id, args.cdp_port)
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_start
+    sampling = False
+    await sampler
+    await server.stop()
+
+    latencies = harness.route_latencies_ms or server.stats.latencies_ms
+    return {
+        "runner": runner,
+        "phrases": len(phrases),
+        "ok": ok,
+        "failed": len(phrases) - ok,
+        "elapsed_sec": round(elapsed, 3),
+        "phrases_per_min": round(ok / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 2),
+            "p95": round(_percentile(latencies, 95), 2),
+            "mean": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            "samples": len(latencies),
+        },
+        "cpu_sec": round(cpu, 3),
+        "rss_mb_peak": round(peak_rss, 1) if peak_rss else None,
+        "server": server.describe(),
+        "error": error,
+    }
+
+
+def compare_reports(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессии фраз/мин больше tolerance (доля) относительно baseline"""
+    regressions = []
+    base_runs = {r["runner"]: r for r in baseline.get("runs", [])}
+    for run in current.get("runs", []):
+        base = base_runs.get(run["runner"])
+        if not base or not base.get("phrases_per_min"):
+            continue
+        delta = (run["phrases_per_min"] - base["phrases_per_min"]) / base["phrases_per_min"]
+        p95_delta = run["latency_ms"]["p95"] - base["latency_ms"]["p95"]
+        line = (
+            f"{run['runner']:8s} {base['phrases_per_min']:8.1f} -> {run['phrases_per_min']:8.1f} фраз/мин "
+            f"({delta:+.1%}), p95 {p95_delta:+.0f} мс"
+        )
+        print(line)
+        if delta < -tolerance:
+            regressions.append(line)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк раннеров Wordstat")
+    parser.add_argument("--runner", choices=RUNNERS + ("all",), default="turbo")
+    parser.add_argument("--phrases", type=int, default=200)
+    parser.add_argument("--tabs", type=int, default=1, help="вкладок для turbo")
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cdp-port", type=int, default=9333)
+    parser.add_argument("--out", type=Path, default=None, help="куда записать JSON-отчёт")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON-отчёт для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="допустимое падение фраз/мин (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    runners = RUNNERS if args.runner == "all" else (args.runner,)
+    runs = [asyncio.run(bench_one(runner, args)) for runner in runners]
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "runs": runs,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(text, encoding="utf-8")
+        print(f"[BENCH] Отчёт: {args.out}")
+    else:
+        print(text)
+
+    for run in runs:
+        print(
+            f"[BENCH] {run['runner']}: {run['ok']}/{run['phrases']} за {run['elapsed_sec']} с, "
+            f"{run['phrases_per_min']} фраз/мин, p50={run['latency_ms']['p50']} мс, "
+            f"p95={run['latency_ms']['p95']} мс" + (f", ошибка: {run['error']}" if run["error"] else "")
+        )
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare_reports(report, baseline, args.tolerance)
+        if regressions:
+            print(f"[BENCH] Регрессия скорости больше {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Локальный фейковый Wordstat для офлайн-бенчмарков
+
+Отдаёт:
+ - GET  /                 HTML с полем ввода; при ?words=... ещё и
+                          «Общее число запросов: N» + кнопку «Скачать»;
+ - POST /wordstat/api     JSON {data: {totalValue, table: {tableData: {popular, associations}}}};
+ - GET  /wordstat/export  CSV (фраза;частота) для маски;
+ - GET  /showcaptcha      страница капчи.
+
+Задержка, доля ошибок (HTTP 500) и доля капч настраиваются. Частоты
+детерминированы (crc32 фразы), так что прогоны сравнимы между коммитами.
+
+Запуск отдельно: python scripts/fake_wordstat.py --port 8765 --latency-ms 150
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import html
+import json
+import random
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+from urllib.parse import quote
+
+from aiohttp import web
+
+PAGE_TEMPLATE = """<!doctype html>
+<html lang="ru"><head><meta charset="utf-8"><title>Wordstat (fake)</title></head>
+<body>
+<form id="f" onsubmit="return false">
+  <input name="text" type="text" placeholder="Введите слово или словосочетание" value="{value}">
+</form>
+<div id="result">{result}</div>
+<script>
+const input = document.querySelector('input[name="text"]');
+input.addEventListener('keydown', async (e) => {{
+  if (e.key !== 'Enter') return;
+  const resp = await fetch('/wordstat/api', {{
+    method: 'POST',
+    headers: {{'Content-Type': 'application/json'}},
+    body: JSON.stringify({{searchValue: input.value, regions: [{region}]}})
+  }});
+  if (resp.redirected || resp.url.includes('showcaptcha')) {{ location.href = resp.url; return; }}
+  try {{
+    const data = await resp.json();
+    if (data.data) document.getElementById('result').innerText =
+      'Общее число запросов: ' + data.data.totalValue;
+  }} catch (err) {{}}
+}});
+</script>
+</body></html>"""
+
+
+@dataclass
+class FakeWordstatConfig:
+    latency_ms: float = 100.0
+    jitter_ms: float = 30.0
+    error_rate: float = 0.0
+    captcha_rate: float = 0.0
+    related_per_column: int = 20
+    seed: int = 42
+
+
+@dataclass
+class FakeWordstatStats:
+    api_requests: int = 0
+    page_requests: int = 0
+    export_requests: int = 0
+    errors_injected: int = 0
+    captchas_injected: int = 0
+    latencies_ms: list[float] = field(default_factory=list)
+
+
+def fake_frequency(phrase: str) -> int:
+    """Детерминированная «частота» фразы"""
+    return 100 + zlib.crc32(phrase.strip().lower().encode("utf-8")) % 250_000
+
+
+class FakeWordstat:
+    """aiohttp-сервер, имитирующий страницы и API Wordstat"""
+
+    def __init__(self, config: Optional[FakeWordstatConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeWordstatConfig()
+        self.stats = FakeWordstatStats()
+        self.host = host
+        self.port = port
+        self._rng = random.Random(self.config.seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> "FakeWordstat":
+        app = web.Application()
+        app.router.add_get("/", self._page)
+        app.router.add_post("/wordstat/api", self._api)
+        app.router.add_get("/wordstat/export", self._export)
+        app.router.add_get("/showcaptcha", self._captcha)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # --- внутреннее ------------------------------------------------------
+
+    async def _delay(self) -> float:
+        cfg = self.config
+        delay = max(0.0, cfg.latency_ms + self._rng.uniform(-cfg.jitter_ms, cfg.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        return delay
+
+    def _roll(self, rate: float) -> bool:
+        return rate > 0 and self._rng.random() < rate
+
+    def _related(self, phrase: str) -> dict:
+        n = self.config.related_per_column
+        popular = [{"text": f"{phrase} {i}", "value": fake_frequency(f"{phrase} {i}")} for i in range(n)]
+        associations = [{"text": f"похожее {phrase} {i}", "value": fake_frequency(f"~{phrase} {i}")} for i in range(n)]
+        return {"popular": popular, "associations": associations}
+
+    async def _page(self, request: web.Request) -> web.Response:
+        self.stats.page_requests += 1
+        words = request.query.get("words", "").replace("+", " ").strip()
+        region = request.query.get("regions") or request.query.get("region") or "225"
+        result = ""
+        if words:
+            await self._delay()
+            export_url = f"{self.base_url}/wordstat/export?words={quote(words)}&regions={quote(region)}"
+            result = (
+                f"Общее число запросов со словами «{html.escape(words)}»: {fake_frequency(words)}"
+                f'<table><tr><td>{html.escape(words)}\t{fake_frequency(words)}</td></tr></table>'
+                f'<a href="{export_url}">Скачать</a>'
+            )
+        body = PAGE_TEMPLATE.format(value=html.escape(words), result=result, region=int(region) if region.isdigit() else 225)
+        return web.Response(text=body, content_type="text/html")
+
+    async def _api(self, request: web.Request) -> web.StreamResponse:
+        started = time.perf_counter()
+        self.stats.api_requests += 1
+        try:
+            payload = json.loads(await request.text() or "{}")
+        except ValueError:
+            payload = {}
+        phrase = str(payload.get("searchValue", "")).strip()
+        await self._delay()
+        try:
+            if self._roll(self.config.error_rate):
+                self.stats.errors_injected += 1
+                return web.json_response({"error": "internal"}, status=500)
+            if self._roll(self.config.captcha_rate):
+                self.stats.captchas_injected += 1
+                raise web.HTTPFound("/showcaptcha")
+            data = {"totalValue": fake_frequency(phrase), "table": {"tableData": self._related(phrase)}}
+            return web.json_response({"data": data})
+        finally:
+            self.stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    async def _export(self, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        self.stats.export_requests += 1
+        phrase = request.query.get("words", "").strip()
+        await self._delay()
+        try:
+            if self._roll(self.config.error_rate):
+                self.stats.errors_injected += 1
+                return web.Response(status=500, text="error")
+            if self._roll(self.config.captcha_rate):
+                self.stats.captchas_injected += 1
+                raise web.HTTPFound("/showcaptcha")
+            lines = ["Ключевые фразы;Число запросов", f"{phrase};{fake_frequency(phrase)}"]
+            for item in self._related(phrase)["popular"]:
+                lines.append(f"{item['text']};{item['value']}")
+            return web.Response(text="\n".join(lines), content_type="text/csv", charset="utf-8")
+        finally:
+            self.stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    async def _captcha(self, request: web.Request) -> web.Response:
+        return web.Response(text="<html><body>captcha</body></html>", content_type="text/html")
+
+    def describe(self) -> dict:
+        stats = asdict(self.stats)
+        stats.pop("latencies_ms")
+        return {"config": asdict(self.config), "stats": stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фейковый Wordstat для бенчмарков")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = FakeWordstatConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        captcha_rate=args.captcha_rate,
+    )
+
+    async def serve():
+        server = await FakeWordstat(config, args.host, args.port).start()
+        print(f"[FAKE] Wordstat на {server.base_url} (Ctrl+C для выхода)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
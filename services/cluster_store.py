@@ -0,0 +1,189 @@
+"""
+Сохранённый индекс кластеров фраз.
+
+Кластеры, номера участников и наборы токенов лежат в таблицах
+``cluster_index`` и ``cluster_members``, разбитых по ``namespace`` (проект или
+список фраз). :class:`ClusterStore` поднимает их в
+:class:`~services.phrase_tools.ClusterIndex` и при :meth:`ClusterStore.add_phrases`
+распределяет только новые фразы: они попадают в существующие кластеры или
+открывают новые, а изменения пишутся одной транзакцией. Ежедневный прирост в
+несколько тысяч фраз так кластеризуется за секунды, без пересчёта всей базы.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from sqlalchemy import text
+
+from ..core.db import engine
+from . import morphology
+from .phrase_tools import Cluster, ClusterIndex
+
+DEFAULT_NAMESPACE = "default"
+
+# Tokens are stored joined by the ASCII unit separator: cheaper to split than JSON
+_TOKEN_SEP = "\x1f"
+
+_LOAD_SQL = text(
+    """
+    SELECT cluster_no, phrase, tokens
+    FROM cluster_members
+    WHERE namespace = :namespace
+    ORDER BY cluster_no, member_no
+    """
+)
+
+_INSERT_MEMBER_SQL = text(
+    """
+    INSERT OR IGNORE INTO cluster_members
+        (namespace, phrase, cluster_no, member_no, tokens, added_at)
+    VALUES
+        (:namespace, :phrase, :cluster_no, :member_no, :tokens, :added_at)
+    """
+)
+
+_UPSERT_CLUSTER_SQL = text(
+    """
+    INSERT INTO cluster_index
+        (namespace, cluster_no, representative, size, similarity, updated_at)
+    VALUES
+        (:namespace, :cluster_no, :representative, :size, :similarity, :updated_at)
+    ON CONFLICT(namespace, cluster_no) DO UPDATE SET
+        representative = excluded.representative,
+        size = excluded.size,
+        updated_at = excluded.updated_at
+    """
+)
+
+
+@dataclass
+class AddResult:
+    added: int = 0
+    skipped: int = 0
+    new_clusters: int = 0
+    touched: list[int] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return (
+            f"added={self.added} skipped={self.skipped} "
+            f"new_clusters={self.new_clusters} touched={len(self.touched)}"
+        )
+
+
+class ClusterStore:
+    """Persistent :class:`ClusterIndex` for one namespace.
+
+    The default tokenizer is :func:`services.morphology.lemmas`, so word forms
+    of one word fall into the same cluster. ``similarity`` and ``tokenizer``
+    should stay the same for the lifetime of a namespace; stored members keep
+    the tokens they were clustered with.
+
+    Methods are blocking; call them via ``asyncio.to_thread`` from async code.
+    """
+
+    def __init__(
+        self,
+        namespace: str = DEFAULT_NAMESPACE,
+        *,
+        similarity: float = 0.5,
+        tokenizer: Callable[[str], Iterable[str]] | None = None,
+    ):
+        self.namespace = namespace
+        self.similarity = similarity
+        self.tokenizer = tokenizer or morphology.lemmas
+        self._index: ClusterIndex | None = None
+        self._known: set[str] = set()
+
+    def load(self) -> ClusterIndex:
+        """Read the namespace into memory once and return its index."""
+        if self._index is not None:
+            return self._index
+        clusters: list[Cluster] = []
+        known: set[str] = set()
+        with engine.connect() as conn:
+            for row in conn.execute(_LOAD_SQL, {"namespace": self.namespace}):
+                # cluster_no is dense (0..n-1), so rows arrive cluster by cluster
+                while len(clusters) <= row.cluster_no:
+                    clusters.append(Cluster([], []))
+                tokens = set(row.tokens.split(_TOKEN_SEP)) if row.tokens else set()
+                clusters[row.cluster_no].add(row.phrase, tokens)
+                known.add(row.phrase)
+        self._index = ClusterIndex(similarity=self.similarity, tokenizer=self.tokenizer, clusters=clusters)
+        self._known = known
+        return self._index
+
+    @property
+    def clusters(self) -> list[Cluster]:
+        return self.load().clusters
+
+    def add_phrases(self, phrases: Iterable[str], *, workers: int | None = 1) -> AddResult:
+        """Cluster phrases that are not stored yet and persist the changes in one transaction."""
+        index = self.load()
+        result = AddResult()
+        fresh: list[str] = []
+        for phrase in phrases:
+            phrase = (phrase or "").strip()
+            if not phrase or phrase in self._known:
+                result.skipped += 1
+                continue
+            self._known.add(phrase)
+            fresh.append(phrase)
+        if not fresh:
+            return result
+
+        sizes_before = [cluster.size() for cluster in index.clusters]
+        clusters_before = len(sizes_before)
+        index.add_phrases(fresh, workers=workers)
+        touched = sorted(
+            {no for no, size in enumerate(sizes_before) if index.clusters[no].size() != size}
+            | set(range(clusters_before, len(index.clusters)))
+        )
+
+        now = time.time()
+        member_rows = []
+        cluster_rows = []
+        for no in touched:
+            cluster = index.clusters[no]
+            start = sizes_before[no] if no < clusters_before else 0
+            for member_no in range(start, cluster.size()):
+                member_rows.append({
+                    "namespace": self.namespace,
+                    "phrase": cluster.keys[member_no],
+                    "cluster_no": no,
+                    "member_no": member_no,
+                    "tokens": _TOKEN_SEP.join(sorted(cluster.tokens[member_no])),
+                    "added_at": now,
+                })
+            cluster_rows.append({
+                "namespace": self.namespace,
+                "cluster_no": no,
+                "representative": cluster.representative(),
+                "size": cluster.size(),
+                "similarity": self.similarity,
+                "updated_at": now,
+            })
+        try:
+            with engine.begin() as conn:
+                conn.execute(_INSERT_MEMBER_SQL, member_rows)
+                conn.execute(_UPSERT_CLUSTER_SQL, cluster_rows)
+        except Exception:
+            # The in-memory index is ahead of the database now: reload next time
+            self._index = None
+            self._known = set()
+            raise
+
+        result.added = len(member_rows)
+        result.new_clusters = len(index.clusters) - clusters_before
+        result.touched = touched
+        return result
+
+    def clear(self) -> None:
+        """Drop every stored cluster of the namespace."""
+        with engine.begin() as conn:
+            params = {"namespace": self.namespace}
+            conn.execute(text("DELETE FROM cluster_members WHERE namespace = :namespace"), params)
+            conn.execute(text("DELETE FROM cluster_index WHERE namespace = :namespace"), params)
+        self._index = None
+        self._known = set()
@@ -5,31 +5,133 @@ Yandex.Direct forecast service - budget prediction for phrases.
 from __future__ import annotations
 
 import asyncio
-import json
-from typing import Any
+from typing import Any, Iterator
 
 from ..core.db import get_db_connection
+from .forecast_cache import ForecastCache, normalize_phrase
+
+
+# Phrases per form submission: the budget forecast form accepts up to ~200
+MAX_SUBMIT_PHRASES = 200
+DEFAULT_SUBMIT_PHRASES = 150
+
+# ON CONFLICT keeps the row (and freq_ref), so the report triggers see an UPDATE;
+# INSERT OR REPLACE would delete it without firing the delete trigger
+_UPSERT_FORECAST_SQL = """
+    INSERT INTO forecasts (phrase, region, cpc, impressions, budget, processed)
+    VALUES (?, ?, ?, ?, ?, 0)
+    ON CONFLICT(phrase, region) DO UPDATE SET
+        cpc = excluded.cpc,
+        impressions = excluded.impressions,
+        budget = excluded.budget,
+        processed = 0
+"""
+
+
+def bulk_upsert_forecasts(rows: list[dict], region: int = 225) -> int:
+    """Store forecast rows ({phrase, cpc, impressions, budget}) in one transaction.
+
+    Blocking; call it via ``asyncio.to_thread`` from async code.
+    """
+    params = [
+        (row['phrase'], int(region), float(row['cpc']), int(row['impressions']), float(row['budget']))
+        for row in rows
+        if row.get('phrase')
+    ]
+    if not params:
+        return 0
+    with get_db_connection() as conn:
+        conn.executemany(_UPSERT_FORECAST_SQL, params)
+    return len(params)
+
+
+def _empty_forecast(phrase: str) -> dict:
+    return {'phrase': phrase, 'cpc': 0.0, 'impressions': 0, 'budget': 0.0}
+
+
+def _match_forecast(chunk: list[str], items: list[dict]) -> tuple[list[dict], list[str]]:
+    """Map parsed forecast items back onto the submitted phrases.
+
+    Direct echoes phrases normalized (case, spacing), so matching is done on a
+    lowercased, whitespace-collapsed key; if nothing matches but the counts
+    agree, items are taken positionally. Returns (found rows, missing phrases).
+    """
+    def key(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    items = [it for it in items if it.get('phrase') != '__TOTAL__']
+    by_key = {key(it['phrase']): it for it in items if it.get('phrase')}
+    pairs = [(phrase, by_key.get(key(phrase))) for phrase in chunk]
+    if not any(it for _, it in pairs) and len(items) == len(chunk):
+        pairs = list(zip(chunk, items))
+
+    found, missing = [], []
+    for phrase, it in pairs:
+        if it is None:
+            missing.append(phrase)
+            continue
+        found.append({
+            'phrase': phrase,
+            'cpc': float(it.get('cpc') or 0.0),
+            'impressions': int(it.get('shows') or 0),
+            'budget': round(float(it.get('cost') or 0.0), 2),
+        })
+    return found, missing
 
 
 async def forecast_batch_direct(
     phrases: list[str],
     session_page=None,
-    chunk_size: int = 100,
-    region: int = 225
+    chunk_size: int = DEFAULT_SUBMIT_PHRASES,
+    region: int = 225,
+    chunk_delay: float = 2.0,
+    cache: ForecastCache | None = None,
+    use_cache: bool = True
 ) -> list[dict]:
     """
     Get budget forecast from Yandex.Direct for batch of phrases.
     
+    Phrases are pasted into the budget forecast form ``chunk_size`` at a time
+    (capped at MAX_SUBMIT_PHRASES), the forecast XHR JSON is intercepted and
+    parsed, and every chunk is stored with a single bulk upsert.
+    
     Args:
         phrases: List of phrases to forecast
         session_page: Playwright page with active Yandex session (from autologin)
-        chunk_size: Number of phrases per batch (Direct limit: ~100/min)
+        chunk_size: Number of phrases per form submission (100-200 works best)
         region: Yandex region ID
+        chunk_delay: Pause between submissions, seconds
+        cache: Forecast cache to consult first (a default ForecastCache if omitted)
+        use_cache: Set to False to send every phrase to Direct
     
     Returns:
         List of dicts: [{'phrase': str, 'cpc': float, 'impressions': int, 'budget': float}, ...]
+        in input order; phrases without a forecast get zeros and are not stored.
     """
-    results = []
+    from .forecast_ui import ForecastSession
+    
+    phrases = [p.strip() for p in phrases if p and p.strip()]
+    if not phrases:
+        return []
+    chunk_size = max(1, min(chunk_size, MAX_SUBMIT_PHRASES))
+    results: dict[str, dict] = {}
+    
+    # Only missing or stale phrases go to Direct
+    if use_cache:
+        cache = cache or ForecastCache()
+        hits, to_fetch = await asyncio.to_thread(cache.lookup, phrases, [region])
+        for phrase, row in hits.items():
+            results[normalize_phrase(phrase)] = {
+                'phrase': phrase,
+                'cpc': row['cpc'],
+                'impressions': row['shows'],
+                'budget': round(row['cost'], 2),
+            }
+        print(f"[Direct] Cache: {cache.stats}")
+        if not to_fetch:
+            return [results.get(normalize_phrase(phrase)) or _empty_forecast(phrase) for phrase in phrases]
+    else:
+        to_fetch = phrases
     
     # Import only when needed
     from playwright.async_api import async_playwright
@@ -43,89 +145,49 @@ async def forecast_batch_direct(
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         )
         session_page = await context.new_page()
-        await session_page.goto("https://direct.yandex.ru/")
+    
+    # The form session remembers the applied region set, so regions are set once
+    forecast = ForecastSession(session_page.context, chunk=chunk_size, page=session_page)
+    regions = [region] if region else []
     
     try:
-        for i in range(0, len(phrases), chunk_size):
-            batch = phrases[i:i + chunk_size]
-            
-            for phrase in batch:
+        await forecast.open()
+        
+        for i in range(0, len(to_fetch), chunk_size):
+            chunk = to_fetch[i:i + chunk_size]
+            try:
+                items = await forecast.run(chunk, regions)
+                
+                found, missing = _match_forecast(chunk, items)
+                stored = await asyncio.to_thread(bulk_upsert_forecasts, found, region)
+                if use_cache:
+                    await asyncio.to_thread(cache.store, found, [region])
+                for row in found:
+                    results[normalize_phrase(row['phrase'])] = row
+                print(
+                    f"[Direct] Chunk {i // chunk_size + 1}: {len(chunk)} phrases, "
+                    f"stored {stored}, missing {len(missing)}"
+                )
+            except Exception as e:
+                print(f"[Direct ERROR] Chunk {i // chunk_size + 1} ({len(chunk)} phrases): {e}")
+                # Reopen the form so the next chunk starts from a clean state
                 try:
-                    # Navigate to Direct forecast tool
-                    url = f"https://direct.yandex.ru/registered/main.pl?cmd=forecastByWords&words={phrase}"
-                    await session_page.goto(url, timeout=20000)
-                    
-                    # Wait for forecast results to load
-                    await session_page.wait_for_selector(
-                        ".forecast-table, [data-bem*='forecast']",
-                        timeout=15000
-                    )
-                    
-                    # Extract CPC (cost per click)
-                    try:
-                        cpc_element = session_page.locator(
-                            ".forecast-table__cpc, [data-test-id='cpc']"
-                        )
-                        cpc_text = await cpc_element.first.inner_text(timeout=5000)
-                        cpc = float(''.join(filter(lambda x: x.isdigit() or x == '.', cpc_text)))
-                    except:
-                        cpc = 0.0
-                    
-                    # Extract impressions (показы)
-                    try:
-                        impr_element = session_page.locator(
-                            ".forecast-table__impressions, [data-test-id='impressions']"
-                        )
-                        impr_text = await impr_element.first.inner_text(timeout=5000)
-                        impressions = int(''.join(filter(str.isdigit, impr_text)))
-                    except:
-                        impressions = 0
-                    
-                    # Calculate monthly budget (CPC * impressions * 30 days)
-                    budget = round(cpc * impressions * 30, 2)
-                    
-                    result = {
-                        'phrase': phrase,
-                        'cpc': cpc,
-                        'impressions': impressions,
-                        'budget': budget
-                    }
-                    results.append(result)
-                    
-                    # Save to database immediately
-                    with get_db_connection() as conn:
-                        conn.execute(
-                            """INSERT OR REPLACE INTO forecasts 
-                            (phrase, cpc, impressions, budget, region, processed) 
-                            VALUES (?, ?, ?, ?, ?, 0)""",
-                            (phrase, cpc, impressions, budget, region)
-                        )
-                    
-                    # Rate limiting: ~1 req/sec = 60/min
-                    await asyncio.sleep(1.0)
-                    
-                    print(f"[Direct] {phrase}: CPC={cpc:.2f} ₽, Shows={impressions:,}, Budget={budget:,.0f} ₽")
-                    
-                except Exception as e:
-                    print(f"[Direct ERROR] {phrase}: {e}")
-                    results.append({
-                        'phrase': phrase,
-                        'cpc': 0.0,
-                        'impressions': 0,
-                        'budget': 0.0
-                    })
+                    await forecast.open()
+                except Exception as reopen_error:
+                    print(f"[Direct ERROR] Could not reopen forecast form: {reopen_error}")
+                    break
             
-            # Longer pause between batches
-            if i + chunk_size < len(phrases):
-                await asyncio.sleep(5)
+            if i + chunk_size < len(to_fetch):
+                await asyncio.sleep(chunk_delay)
     
     finally:
+        await forecast.close()
         if own_browser:
             await context.close()
             await browser.close()
             await playwright.stop()
     
-    return results
+    return [results.get(normalize_phrase(phrase)) or _empty_forecast(phrase) for phrase in phrases]
 
 
 async def get_saved_forecasts(region: int = 225) -> list[dict]:
@@ -149,6 +211,39 @@ async def get_saved_forecasts(region: int = 225) -> list[dict]:
         ]
 
 
+_REPORT_SQL = """
+    SELECT phrase, freq, cpc, impressions, budget
+    FROM freq_forecast_report INDEXED BY idx_report_region_freq
+    WHERE region = ? AND freq IS NOT NULL
+    ORDER BY freq DESC
+"""
+
+
+def iter_freq_forecast_report(region: int = 225, batch_size: int = 5000) -> Iterator[list[dict]]:
+    """
+    Stream the frequency + forecast report in batches, highest frequency first.
+    
+    Reads the trigger-maintained freq_forecast_report table through its covering
+    index, so no join or sort happens at export time.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.execute(_REPORT_SQL, (region,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [
+                {
+                    'phrase': row[0],
+                    'freq': row[1],
+                    'cpc': row[2] or 0.0,
+                    'impressions': row[3] or 0,
+                    'budget': row[4] or 0.0
+                }
+                for row in rows
+            ]
+
+
 def merge_freq_and_forecast(region: int = 225) -> list[dict]:
     """
     Merge frequency and forecast data for export.
@@ -156,30 +251,4 @@ def merge_freq_and_forecast(region: int = 225) -> list[dict]:
     Returns:
         List of dicts with: phrase, freq, cpc, impressions, budget
     """
-    with get_db_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT 
-                f.phrase,
-                f.freq,
-                fc.cpc,
-                fc.impressions,
-                fc.budget
-            FROM frequencies f
-            LEFT JOIN forecasts fc ON f.phrase = fc.phrase AND f.region = fc.region
-            WHERE f.region = ?
-            ORDER BY f.freq DESC
-            """,
-            (region,)
-        )
-        
-        return [
-            {
-                'phrase': row[0],
-                'freq': row[1],
-                'cpc': row[2] or 0.0,
-                'impressions': row[3] or 0,
-                'budget': row[4] or 0.0
-            }
-            for row in cursor.fetchall()
-        ]
+    return [row for batch in iter_freq_forecast_report(region) for row in batch]
@@ -1,30 +1,186 @@
 # services/direct_batch.py
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
-from playwright.async_api import async_playwright, Browser, BrowserContext
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, AsyncIterator
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
 from pathlib import Path
+from dataclasses import dataclass, field
 import asyncio
+import csv
+import inspect
 import json
 import logging
 from datetime import datetime
 
+from ..utils.proxy import parse_proxy
+from .forecast_cache import DEFAULT_MAX_AGE, CacheStats, ForecastCache, normalize_phrase
+from ..workers.http_replay import AdaptivePacer
+
 logger = logging.getLogger(__name__)
 
 # Константы для chunk обработки
 DEFAULT_CHUNK_SIZE = 200
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+# Пауза между стартами чанков в одном контексте (стартовая, дальше адаптивная)
+CHUNK_DELAY = 1.0
+# После стольких ошибок подряд контекст выводится из пула
+MAX_CONTEXT_FAILURES = 3
+
+
+# Колонки CSV по умолчанию (лишние ключи строк отбрасываются)
+RESULT_FIELDS = ["phrase", "shows", "clicks", "cost", "cpc", "ctr", "cached", "error", "timestamp"]
+
+
+async def _deliver(consumer: callable, rows: List[Dict[str, Any]]):
+    """Отдать пачку строк потребителю (функции или корутине)"""
+    result = consumer(rows)
+    if inspect.isawaitable(result):
+        await result
+
+
+class _ResultWriter(ABC):
+    """Построчная запись результатов: файл открыт весь прогон, строки дописываются"""
+    
+    def __init__(self, output_path: str):
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        self.output_path = output_path
+        self.count = 0
+        self._file = open(output_path, 'w', encoding='utf-8', newline='')
+    
+    @abstractmethod
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        """Дописать строки и сбросить буфер файла"""
+    
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JsonlResultWriter(_ResultWriter):
+    """Одна строка JSON на результат"""
+    
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self._file.write(json.dumps(row, ensure_ascii=False))
+            self._file.write('\n')
+        self._file.flush()
+        self.count += len(rows)
+
+
+class JsonArrayResultWriter(_ResultWriter):
+    """JSON-массив, который пишется по элементу (формат как у export_to_json)"""
+    
+    def __init__(self, output_path: str):
+        super().__init__(output_path)
+        self._file.write('[')
+    
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self._file.write(',\n  ' if self.count else '\n  ')
+            self._file.write(json.dumps(row, ensure_ascii=False))
+            self.count += 1
+        self._file.flush()
+    
+    def close(self):
+        if not self._file.closed:
+            self._file.write('\n]' if self.count else ']')
+        super().close()
+
+
+class CsvResultWriter(_ResultWriter):
+    """CSV с фиксированным набором колонок"""
+    
+    def __init__(self, output_path: str, fieldnames: Optional[List[str]] = None):
+        super().__init__(output_path)
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames or RESULT_FIELDS, extrasaction='ignore')
+        self._writer.writeheader()
+    
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        self._writer.writerows(rows)
+        self._file.flush()
+        self.count += len(rows)
+
+
+def open_result_writer(output_path: str, export_format: str = 'jsonl') -> _ResultWriter:
+    """Писатель по формату: 'jsonl', 'csv' или 'json'"""
+    if export_format == 'csv':
+        return CsvResultWriter(output_path)
+    if export_format == 'json':
+        return JsonArrayResultWriter(output_path)
+    return JsonlResultWriter(output_path)
+
+
+@dataclass
+class DirectContextSource:
+    """Аккаунт для пула: файл сессии + его прокси
+
+    ``name`` различает контексты при повторе чанков, поэтому должен быть
+    уникальным: лучше передать имя аккаунта. По умолчанию - полный путь к
+    файлу сессии (у всех аккаунтов он называется storage_state.json).
+    """
+
+    storage_state_path: str
+    proxy: Optional[str] = None
+    name: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.name:
+            self.name = str(Path(self.storage_state_path).resolve())
+
+
+@dataclass
+class _ContextSlot:
+    """Контекст браузера одного аккаунта и его темп"""
+
+    source: DirectContextSource
+    pacer: AdaptivePacer
+    context: Optional[BrowserContext] = None
+    # Открытые формы прогноза (по одной на воркер) - регионы в них уже выставлены
+    sessions: List[Any] = field(default_factory=list)
+    active: bool = True
+    failures: int = 0
+    chunks_done: int = 0
+
+
+@dataclass
+class _ChunkJob:
+    num: int
+    phrases: List[str]
+    attempt: int = 0
+    tried: set = field(default_factory=set)
+    last_error: Optional[str] = None
+
 
 class DirectBatchProcessor:
-    """Пакетная обработка прогнозов ставок Direct API"""
+    """Пакетная обработка прогнозов ставок Direct API
+    
+    Чанки обрабатываются параллельно пулом контекстов (по одному на
+    аккаунт/прокси). У каждого контекста свой темп (AdaptivePacer);
+    упавший чанк повторяется на другом контексте, если такой есть.
+    """
     
     def __init__(
         self,
-        storage_state_path: str,
+        storage_state_path: Optional[str] = None,
         proxy: Optional[str] = None,
         region_ids: Optional[List[int]] = None,
         chunk_size: int = DEFAULT_CHUNK_SIZE,
-        use_mock: bool = False
+        use_mock: bool = False,
+        contexts: Optional[List[DirectContextSource]] = None,
+        concurrency_per_context: int = 1,
+        chunk_delay: float = CHUNK_DELAY,
+        max_context_failures: int = MAX_CONTEXT_FAILURES,
+        headless: bool = True,
+        use_cache: bool = True,
+        cache_max_age: float = DEFAULT_MAX_AGE,
+        region_mode: str = "auto"
     ):
         """
         Args:
@@ -33,14 +189,38 @@ class DirectBatchProcessor:
             region_ids: список ID регионов для таргетинга
             chunk_size: размер чанка для пакетной обработки
             use_mock: использовать моковые данные вместо реального API
+            contexts: пул аккаунтов (сессия + прокси); если не задан -
+                один контекст из storage_state_path/proxy
+            concurrency_per_context: сколько чанков одновременно в одном контексте
+            chunk_delay: стартовая пауза между чанками в одном контексте
+            max_context_failures: ошибок подряд до вывода контекста из пула
+            headless: запускать браузер без окна
+            use_cache: брать свежие прогнозы из кэша и отправлять в Директ
+                только недостающие (в mock режиме кэш не используется)
+            cache_max_age: сколько секунд прогноз в кэше считается свежим
+            region_mode: "auto" - регионы в параметрах запроса прогноза,
+                "ui" - через окно выбора регионов (см. forecast_ui.ForecastSession)
         """
-        self.storage_state_path = storage_state_path
-        self.proxy = proxy
+        if not contexts:
+            if not storage_state_path:
+                raise ValueError("Нужен storage_state_path или contexts")
+            contexts = [DirectContextSource(storage_state_path, proxy)]
+        self.sources = contexts
+        self.storage_state_path = contexts[0].storage_state_path
+        self.proxy = contexts[0].proxy
         self.region_ids = region_ids or [213]  # По умолчанию Москва
         self.chunk_size = chunk_size
         self.use_mock = use_mock
+        self.concurrency_per_context = max(1, concurrency_per_context)
+        self.chunk_delay = chunk_delay
+        self.max_context_failures = max_context_failures
+        self.headless = headless
+        self.cache = ForecastCache(cache_max_age) if use_cache and not use_mock else None
+        self.region_mode = region_mode
+        self.playwright: Optional[Playwright] = None
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
+        self.slots: List[_ContextSlot] = []
     
     async def __aenter__(self):
         """Контекстный менеджер - вход"""
@@ -51,14 +231,25 @@ class DirectBatchProcessor:
         """Контекстный менеджер - выход"""
         await self.cleanup()
     
+    def _new_slot(self, source: DirectContextSource) -> _ContextSlot:
+        pacer = AdaptivePacer(
+            concurrency=self.concurrency_per_context,
+            min_delay=self.chunk_delay / 2,
+            max_delay=max(30.0, self.chunk_delay),
+            start_delay=self.chunk_delay,
+            decrease=0.95,
+        )
+        return _ContextSlot(source=source, pacer=pacer)
+    
     async def initialize(self):
-        """Инициализация браузера и контекста"""
+        """Инициализация браузера и пула контекстов"""
+        self.slots = [self._new_slot(source) for source in self.sources]
         if self.use_mock:
             logger.info("Используется mock режим")
             return
         
         try:
-            p = await async_playwright().start()
+            self.playwright = await async_playwright().start()
             
             # Настройки браузера
             browser_args = [
@@ -68,27 +259,42 @@ class DirectBatchProcessor:
             ]
             
             launch_options = {
-                "headless": True,
+                "headless": self.headless,
                 "args": browser_args
             }
             
-            # Добавляем прокси если указан
-            if self.proxy:
-                launch_options["proxy"] = {"server": self.proxy}
-                logger.info(f"Использование прокси: {self.proxy}")
+            # Один браузер на всех: прокси задаётся на уровне контекста.
+            # Chromium требует глобальный прокси, чтобы разрешить прокси в контекстах
+            per_context_proxy = any(source.proxy for source in self.sources)
+            if per_context_proxy:
+                launch_options["proxy"] = {"server": "http://per-context"}
             
-            self.browser = await p.chromium.launch(**launch_options)
+            self.browser = await self.playwright.chromium.launch(**launch_options)
             
-            # Создаем контекст с сохраненной сессией
-            context_params = {}
-            
-            if Path(self.storage_state_path).exists():
-                context_params["storage_state"] = self.storage_state_path
-                logger.info(f"Загружена сессия из {self.storage_state_path}")
-            else:
-                logger.warning(f"Файл сессии не найден: {self.storage_state_path}")
+            for slot in self.slots:
+                source = slot.source
+                # Создаем контекст с сохраненной сессией
+                context_params = {}
+                
+                if Path(source.storage_state_path).exists():
+                    context_params["storage_state"] = source.storage_state_path
+                    logger.info(f"[{source.name}] Загружена сессия из {source.storage_state_path}")
+                else:
+                    logger.warning(f"[{source.name}] Файл сессии не найден: {source.storage_state_path}")
+                
+                # Добавляем прокси если указан
+                if source.proxy:
+                    proxy_config = parse_proxy(source.proxy)
+                    if proxy_config:
+                        context_params["proxy"] = proxy_config
+                        logger.info(f"[{source.name}] Использование прокси: {proxy_config['server']}")
+                if per_context_proxy and "proxy" not in context_params:
+                    # Без своего прокси - напрямую, мимо глобальной заглушки
+                    context_params["proxy"] = {"server": "direct://"}
+                
+                slot.context = await self.browser.new_context(**context_params)
             
-            self.context = await self.browser.new_context(**context_params)
+            self.context = self.slots[0].context
             
         except Exception as e:
             logger.error(f"Ошибка инициализации: {e}")
@@ -97,10 +303,24 @@ class DirectBatchProcessor:
     
     async def cleanup(self):
         """Очистка ресурсов"""
-        if self.context:
-            await self.context.close()
+        for slot in self.slots:
+            slot.sessions.clear()
+            if slot.context:
+                try:
+                    await slot.context.close()
+                except Exception:
+                    pass
+                slot.context = None
+        self.context = None
         if self.browser:
-            await self.browser.close()
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
     
     def _chunk_phrases(self, phrases: List[str]) -> List[List[str]]:
         """Разбивка фраз на чанки"""
@@ -130,101 +350,312 @@ class DirectBatchProcessor:
         await asyncio.sleep(0.5)
         return results
     
-    async def _process_chunk_with_retry(
-        self,
-        chunk: List[str],
-        chunk_num: int,
-        total_chunks: int
-    ) -> List[Dict[str, Any]]:
-        """Обработка чанка с повторными попытками"""
+    async def _run_chunk(self, slot: _ContextSlot, chunk: List[str], session=None) -> List[Dict[str, Any]]:
+        """Один прогон чанка в контексте слота (в открытой форме session, если есть)"""
+        if self.use_mock:
+            return await self._get_mock_data(chunk)
         
-        for attempt in range(MAX_RETRIES):
-            try:
-                logger.info(
-                    f"Обработка чанка {chunk_num}/{total_chunks} "
-                    f"({len(chunk)} фраз), попытка {attempt + 1}/{MAX_RETRIES}"
-                )
-                
-                if self.use_mock:
-                    return await self._get_mock_data(chunk)
-                
-                # Импортируем forecast_batch здесь чтобы избежать циклических импортов
-                from .forecast_ui import forecast_batch
-                
-                # Вызываем forecast_batch через playwright
-                results = await forecast_batch(
-                    context=self.context,
-                    phrases=chunk,
-                    region_ids=self.region_ids
-                )
-                
-                logger.info(f"Чанк {chunk_num} успешно обработан")
-                return results
-                
-            except Exception as e:
-                logger.error(f"Ошибка обработки чанка {chunk_num}: {e}")
-                
-                if attempt < MAX_RETRIES - 1:
-                    logger.info(f"Повтор через {RETRY_DELAY} сек...")
-                    await asyncio.sleep(RETRY_DELAY)
-                else:
-                    logger.error(f"Чанк {chunk_num} не удалось обработать после {MAX_RETRIES} попыток")
-                    # Возвращаем пустые результаты с ошибкой
-                    return [
-                        {
-                            "phrase": phrase,
-                            "error": str(e),
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        for phrase in chunk
-                    ]
+        # Импортируем forecast_batch здесь чтобы избежать циклических импортов
+        from .forecast_ui import forecast_batch
+        
+        # Вызываем forecast_batch через playwright
+        return await forecast_batch(
+            context=slot.context,
+            phrases=chunk,
+            region_ids=self.region_ids,
+            session=session
+        )
+    
+    @staticmethod
+    def _error_results(chunk: List[str], error: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "phrase": phrase,
+                "error": error,
+                "timestamp": datetime.now().isoformat()
+            }
+            for phrase in chunk
+        ]
+    
+    def _take_job(self, pending: List[_ChunkJob], slot: _ContextSlot) -> Optional[_ChunkJob]:
+        """Первый чанк, который этому контексту стоит брать
+        
+        Повтор отдаём контексту, который этот чанк ещё не пробовал; свой же
+        неудачный чанк контекст берёт только если других живых не осталось.
+        """
+        active = {s.source.name for s in self.slots if s.active}
+        for i, job in enumerate(pending):
+            if slot.source.name not in job.tried or active <= job.tried:
+                return pending.pop(i)
+        return None
     
     async def process_phrases(
         self,
         phrases: List[str],
-        progress_callback: Optional[callable] = None
+        progress_callback: Optional[callable] = None,
+        chunk_callback: Optional[callable] = None,
+        on_results: Optional[callable] = None,
+        collect: bool = True
     ) -> List[Dict[str, Any]]:
         """Основной метод пакетной обработки фраз
         
         Args:
             phrases: список ключевых фраз для обработки
             progress_callback: коллбэк для отслеживания прогресса (progress, total)
+            chunk_callback: коллбэк по каждому завершённому чанку, получает dict
+                {chunk, total_chunks, context, attempt, ok, phrases, error}
+            on_results: потребитель строк по мере готовности чанков (обычная
+                функция или корутина, получает список строк); попадания кэша
+                приходят первой пачкой
+            collect: копить результаты для возврата; False - вернуть пустой
+                список и держать в памяти только текущие чанки
         
         Returns:
-            Список словарей с результатами прогноза
+            Список словарей с результатами прогноза (в порядке входных фраз)
         """
         if not phrases:
             logger.warning("Пустой список фраз")
             return []
+        if not self.slots:
+            self.slots = [self._new_slot(source) for source in self.sources]
         
         logger.info(f"Начало обработки {len(phrases)} фраз")
         logger.info(f"Регионы: {self.region_ids}")
         logger.info(f"Размер чанка: {self.chunk_size}")
         
+        # Свежие прогнозы берём из кэша, в Директ уходят только промахи
+        cached: Dict[str, Dict[str, Any]] = {}
+        to_fetch = phrases
+        if self.cache is not None:
+            self.cache.stats = CacheStats()
+            cached, to_fetch = await asyncio.to_thread(self.cache.lookup, phrases, self.region_ids)
+            logger.info(f"Кэш прогнозов: {self.cache.stats}")
+            if progress_callback and cached:
+                progress_callback(len(cached), len(cached) + len(to_fetch))
+            if on_results and cached:
+                await _deliver(on_results, list(cached.values()))
+        
         # Разбиваем на чанки
-        chunks = self._chunk_phrases(phrases)
+        chunks = self._chunk_phrases(to_fetch)
         total_chunks = len(chunks)
         
-        logger.info(f"Создано {total_chunks} чанков")
+        logger.info(
+            f"Создано {total_chunks} чанков, контекстов: {len(self.slots)} "
+            f"x {self.concurrency_per_context}"
+        )
         
-        all_results = []
+        pending = [_ChunkJob(num=i, phrases=chunk) for i, chunk in enumerate(chunks, 1)]
+        results_by_chunk: Dict[int, List[Dict[str, Any]]] = {}
+        changed = asyncio.Condition()
+        in_flight = 0
+        done_phrases = len(cached)
+        total_phrases = len(cached) + len(to_fetch)
         
-        # Обрабатываем чанки последовательно
-        for i, chunk in enumerate(chunks, 1):
-            chunk_results = await self._process_chunk_with_retry(chunk, i, total_chunks)
-            all_results.extend(chunk_results)
-            
-            # Вызываем коллбэк прогресса
+        async def finish(job: _ChunkJob, slot: Optional[_ContextSlot], results: List[Dict[str, Any]], ok: bool):
+            nonlocal done_phrases
+            if collect:
+                results_by_chunk[job.num] = results
+            if on_results:
+                await _deliver(on_results, results)
+            done_phrases += len(job.phrases)
+            if chunk_callback:
+                chunk_callback({
+                    "chunk": job.num,
+                    "total_chunks": total_chunks,
+                    "context": slot.source.name if slot else None,
+                    "attempt": job.attempt,
+                    "ok": ok,
+                    "phrases": len(job.phrases),
+                    "error": job.last_error if not ok else None,
+                })
             if progress_callback:
-                progress_callback(len(all_results), len(phrases))
+                progress_callback(done_phrases, total_phrases)
+        
+        async def worker(slot: _ContextSlot):
+            nonlocal in_flight
+            # Своя форма прогноза на воркер: страница и регионы живут между чанками
+            session = None
+            if not self.use_mock:
+                from .forecast_ui import ForecastSession
+                session = ForecastSession(slot.context, region_mode=self.region_mode)
+                slot.sessions.append(session)
+            while slot.active:
+                async with changed:
+                    while True:
+                        job = self._take_job(pending, slot) if slot.active else None
+                        if job or not slot.active or (not pending and in_flight == 0):
+                            break
+                        await changed.wait()
+                    if job is None:
+                        break
+                    in_flight += 1
+                
+                job.attempt += 1
+                job.tried.add(slot.source.name)
+                logger.info(
+                    f"[{slot.source.name}] Обработка чанка {job.num}/{total_chunks} "
+                    f"({len(job.phrases)} фраз), попытка {job.attempt}/{MAX_RETRIES}"
+                )
+                try:
+                    async with slot.pacer:
+                        results = await self._run_chunk(slot, job.phrases, session)
+                except Exception as e:
+                    job.last_error = str(e)
+                    if session is not None:
+                        # Следующий чанк начнётся с чистой формы
+                        try:
+                            await session.close()
+                        except Exception:
+                            pass
+                    slot.failures += 1
+                    slot.pacer.on_throttle()
+                    logger.error(f"[{slot.source.name}] Ошибка обработки чанка {job.num}: {e}")
+                    if slot.failures >= self.max_context_failures:
+                        slot.active = False
+                        logger.error(
+                            f"[{slot.source.name}] {slot.failures} ошибок подряд, контекст выведен из пула"
+                        )
+                    if job.attempt < MAX_RETRIES:
+                        # Повторная попытка уйдёт другому контексту, если он есть
+                        await asyncio.sleep(RETRY_DELAY)
+                        async with changed:
+                            pending.append(job)
+                    else:
+                        logger.error(f"Чанк {job.num} не удалось обработать после {MAX_RETRIES} попыток")
+                        # Возвращаем пустые результаты с ошибкой
+                        await finish(job, slot, self._error_results(job.phrases, job.last_error), ok=False)
+                else:
+                    slot.failures = 0
+                    slot.chunks_done += 1
+                    slot.pacer.on_success()
+                    logger.info(f"[{slot.source.name}] Чанк {job.num} успешно обработан")
+                    if self.cache is not None:
+                        await asyncio.to_thread(self.cache.store, results, self.region_ids)
+                    await finish(job, slot, results, ok=True)
+                finally:
+                    async with changed:
+                        in_flight -= 1
+                        changed.notify_all()
             
-            # Небольшая пауза между чанками
-            if i < total_chunks:
-                await asyncio.sleep(1)
+            if session is not None:
+                slot.sessions.remove(session)
+                try:
+                    await session.close()
+                except Exception:
+                    pass
+        
+        await asyncio.gather(*(
+            worker(slot)
+            for slot in self.slots
+            for _ in range(self.concurrency_per_context)
+        ))
         
-        logger.info(f"Обработка завершена. Получено {len(all_results)} результатов")
+        # Все контексты выведены из пула - оставшиеся чанки помечаем ошибкой
+        for job in pending:
+            logger.error(f"Чанк {job.num} не обработан: нет живых контекстов")
+            await finish(job, None, self._error_results(job.phrases, job.last_error or "Нет живых контекстов"), ok=False)
+        pending.clear()
+        
+        fetched = [row for num in sorted(results_by_chunk) for row in results_by_chunk[num]]
+        if not collect:
+            all_results = []
+        elif cached:
+            # Собираем в порядке входных фраз: из кэша или из свежего ответа
+            cached_by_key = {normalize_phrase(phrase): row for phrase, row in cached.items()}
+            fetched_by_key = {normalize_phrase(row.get("phrase", "")): row for row in fetched}
+            all_results = []
+            for phrase in phrases:
+                key = normalize_phrase(phrase)
+                row = cached_by_key.pop(key, None) or fetched_by_key.pop(key, None)
+                if row is not None:
+                    all_results.append(row)
+            all_results.extend(fetched_by_key.values())
+        else:
+            all_results = fetched
+        if self.cache is not None:
+            logger.info(f"Кэш прогнозов за прогон: {self.cache.stats}")
+        logger.info(f"Обработка завершена. Обработано {done_phrases} фраз")
         return all_results
     
+    async def iter_results(
+        self,
+        phrases: List[str],
+        progress_callback: Optional[callable] = None,
+        chunk_callback: Optional[callable] = None,
+        max_pending: int = 8
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Результаты пачками по мере готовности чанков (порядок - по завершению)
+        
+        Следующая стадия может начинать работу сразу, не дожидаясь конца
+        прогона. Если потребитель отстаёт больше чем на max_pending чанков,
+        обработка ждёт его.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        done = object()
+        
+        async def run():
+            try:
+                await self.process_phrases(
+                    phrases,
+                    progress_callback=progress_callback,
+                    chunk_callback=chunk_callback,
+                    on_results=queue.put,
+                    collect=False
+                )
+            finally:
+                await queue.put(done)
+        
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                rows = await queue.get()
+                if rows is done:
+                    break
+                yield rows
+            # Пробрасываем ошибку прогона, если была
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+    
+    async def stream_to_file(
+        self,
+        phrases: List[str],
+        output_path: str,
+        export_format: str = 'jsonl',
+        progress_callback: Optional[callable] = None,
+        chunk_callback: Optional[callable] = None
+    ) -> int:
+        """Прогнать фразы, дописывая строки в файл по мере готовности чанков
+        
+        Returns:
+            Число записанных строк
+        """
+        with open_result_writer(output_path, export_format) as writer:
+            await self.process_phrases(
+                phrases,
+                progress_callback=progress_callback,
+                chunk_callback=chunk_callback,
+                on_results=writer.write_rows,
+                collect=False
+            )
+        logger.info(f"Результаты экспортированы в {output_path} ({writer.count} строк)")
+        return writer.count
+    
+    def context_stats(self) -> List[Dict[str, Any]]:
+        """Состояние пула контекстов"""
+        return [
+            {
+                "name": slot.source.name,
+                "active": slot.active,
+                "chunks_done": slot.chunks_done,
+                "failures": slot.failures,
+                "delay": round(slot.pacer.delay, 2),
+            }
+            for slot in self.slots
+        ]
+    
     def export_to_json(self, results: List[Dict[str, Any]], output_path: str):
         """Экспорт результатов в JSON"""
         try:
@@ -237,8 +668,6 @@ class DirectBatchProcessor:
     
     def export_to_csv(self, results: List[Dict[str, Any]], output_path: str):
         """Экспорт результатов в CSV"""
-        import csv
-        
         try:
             if not results:
                 logger.warning("Нет результатов для экспорта")
@@ -267,7 +696,8 @@ async def take_bids_for_phrases(
     chunk_size: int = DEFAULT_CHUNK_SIZE,
     use_mock: bool = False,
     export_path: Optional[str] = None,
-    export_format: str = 'json'
+    export_format: str = 'json',
+    contexts: Optional[List[DirectContextSource]] = None
 ) -> List[Dict[str, Any]]:
     """
     Получить ставки/показы/клики для списка фраз через Прогноз бюджета
@@ -280,7 +710,8 @@ async def take_bids_for_phrases(
         chunk_size: размер чанка для пакетной обработки
         use_mock: использовать моковые данные
         export_path: путь для экспорта результатов
-        export_format: формат экспорта ('json' или 'csv')
+        export_format: формат экспорта ('json', 'jsonl' или 'csv')
+        contexts: пул аккаунтов для параллельной обработки чанков
     
     Returns:
         Список словарей с метриками {phrase, shows, clicks, cost, cpc, ...}
@@ -291,17 +722,16 @@ async def take_bids_for_phrases(
         proxy=proxy,
         region_ids=region_ids,
         chunk_size=chunk_size,
-        use_mock=use_mock
+        use_mock=use_mock,
+        contexts=contexts
     ) as processor:
-        results = await processor.process_phrases(phrases)
-        
-        # Экспорт если указан путь
-        if export_path:
-            if export_format == 'csv':
-                processor.export_to_csv(results, export_path)
-            else:
-                processor.export_to_json(results, export_path)
+        if not export_path:
+            return await processor.process_phrases(phrases)
         
+        # Экспорт по мере готовности чанков, без сборки всего списка в конце
+        with open_result_writer(export_path, export_format) as writer:
+            results = await processor.process_phrases(phrases, on_results=writer.write_rows)
+        logger.info(f"Результаты экспортированы в {export_path}")
         return results
 
 
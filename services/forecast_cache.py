@@ -0,0 +1,197 @@
+"""
+Кэш прогнозов Директа с политикой свежести.
+
+Ключ записи — нормализованная фраза + хэш набора регионов, поэтому один и
+тот же прогноз не запрашивается повторно, пока не устарел (``max_age``).
+Перед отправкой в Директ вызывающий делит фразы на попадания и промахи
+(:meth:`ForecastCache.lookup`), запрашивает только промахи и кладёт
+ответы обратно (:meth:`ForecastCache.store`). Счётчики попаданий за прогон
+лежат в :attr:`ForecastCache.stats`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy import bindparam, text
+
+from ..core.db import engine
+
+# Прогноз Директа меняется медленно: неделя — разумный срок по умолчанию
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+_LOOKUP_BATCH = 500
+
+
+def normalize_phrase(phrase: str) -> str:
+    """Cache key for a phrase: lowercased, whitespace collapsed."""
+    return " ".join((phrase or "").lower().split())
+
+
+def region_key(region_ids: Iterable[int | str]) -> str:
+    """Stable short hash of a region set (order and duplicates ignored)."""
+    ids = sorted({str(r).strip() for r in region_ids if str(r).strip()})
+    return hashlib.sha1(",".join(ids).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    stale: int = 0
+    misses: int = 0
+    stored: int = 0
+
+    @property
+    def requested(self) -> int:
+        return self.hits + self.stale + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requested if self.requested else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"hits={self.hits} stale={self.stale} misses={self.misses} "
+            f"stored={self.stored} hit_rate={self.hit_rate:.0%}"
+        )
+
+
+_SELECT_SQL = text(
+    """
+    SELECT phrase_key, shows, clicks, cost, cpc, fetched_at
+    FROM forecast_cache
+    WHERE region_key = :region_key AND phrase_key IN :keys
+    """
+).bindparams(bindparam("keys", expanding=True))
+
+_UPSERT_SQL = text(
+    """
+    INSERT INTO forecast_cache
+        (phrase_key, region_key, phrase, regions, shows, clicks, cost, cpc, fetched_at)
+    VALUES
+        (:phrase_key, :region_key, :phrase, :regions, :shows, :clicks, :cost, :cpc, :fetched_at)
+    ON CONFLICT(phrase_key, region_key) DO UPDATE SET
+        phrase = excluded.phrase,
+        shows = excluded.shows,
+        clicks = excluded.clicks,
+        cost = excluded.cost,
+        cpc = excluded.cpc,
+        fetched_at = excluded.fetched_at
+    """
+)
+
+
+def _number(row: dict, *keys: str, default: Any = 0) -> Any:
+    for key in keys:
+        if row.get(key) is not None:
+            return row[key]
+    return default
+
+
+class ForecastCache:
+    """Forecast rows keyed by (normalized phrase, region set), fresh for ``max_age`` seconds.
+
+    Methods are blocking; call them via ``asyncio.to_thread`` from async code.
+    """
+
+    def __init__(self, max_age: float = DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self.stats = CacheStats()
+
+    def lookup(
+        self,
+        phrases: Sequence[str],
+        region_ids: Iterable[int | str],
+    ) -> tuple[dict[str, dict], list[str]]:
+        """Split phrases into cached rows and phrases that still need Direct.
+
+        Returns ``(hits, to_fetch)``: ``hits`` maps the original phrase to a row
+        ``{phrase, shows, clicks, cost, cpc, cached}``; ``to_fetch`` keeps input
+        order with duplicates (by normalized key) removed.
+        """
+        rkey = region_key(region_ids)
+        by_key: dict[str, str] = {}
+        for phrase in phrases:
+            key = normalize_phrase(phrase)
+            if key and key not in by_key:
+                by_key[key] = phrase.strip()
+        if not by_key:
+            return {}, []
+
+        found: dict[str, Any] = {}
+        keys = list(by_key)
+        with engine.connect() as conn:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                params = {"region_key": rkey, "keys": keys[i:i + _LOOKUP_BATCH]}
+                for row in conn.execute(_SELECT_SQL, params):
+                    found[row.phrase_key] = row
+
+        oldest = time.time() - self.max_age
+        hits: dict[str, dict] = {}
+        to_fetch: list[str] = []
+        for key, phrase in by_key.items():
+            row = found.get(key)
+            if row is None:
+                self.stats.misses += 1
+                to_fetch.append(phrase)
+            elif (row.fetched_at or 0) < oldest:
+                self.stats.stale += 1
+                to_fetch.append(phrase)
+            else:
+                self.stats.hits += 1
+                hits[phrase] = {
+                    "phrase": phrase,
+                    "shows": int(row.shows or 0),
+                    "clicks": int(row.clicks or 0),
+                    "cost": float(row.cost or 0.0),
+                    "cpc": float(row.cpc or 0.0),
+                    "cached": True,
+                }
+        return hits, to_fetch
+
+    def store(self, rows: Iterable[dict], region_ids: Iterable[int | str]) -> int:
+        """Upsert fresh forecast rows in one transaction.
+
+        Accepts both result shapes used in the project: ``shows/cost`` from the
+        forecast UI and ``impressions/budget`` from ``forecast_batch_direct``.
+        Rows with an ``error`` or the ``__TOTAL__`` summary are skipped.
+        """
+        region_ids = list(region_ids)
+        rkey = region_key(region_ids)
+        regions = json.dumps(sorted({str(r) for r in region_ids}))
+        now = time.time()
+        params = []
+        for row in rows:
+            phrase = (row.get("phrase") or "").strip()
+            if not phrase or phrase == "__TOTAL__" or row.get("error"):
+                continue
+            params.append({
+                "phrase_key": normalize_phrase(phrase),
+                "region_key": rkey,
+                "phrase": phrase,
+                "regions": regions,
+                "shows": int(_number(row, "shows", "impressions")),
+                "clicks": int(_number(row, "clicks")),
+                "cost": float(_number(row, "cost", "budget", default=0.0)),
+                "cpc": float(_number(row, "cpc", default=0.0)),
+                "fetched_at": now,
+            })
+        if not params:
+            return 0
+        with engine.begin() as conn:
+            conn.execute(_UPSERT_SQL, params)
+        self.stats.stored += len(params)
+        return len(params)
+
+    def purge(self, older_than: float | None = None) -> int:
+        """Delete entries older than ``older_than`` seconds (default ``max_age``)."""
+        cutoff = time.time() - (self.max_age if older_than is None else older_than)
+        with engine.begin() as conn:
+            result = conn.execute(text("DELETE FROM forecast_cache WHERE fetched_at < :cutoff"), {"cutoff": cutoff})
+        return result.rowcount or 0
+
+
+__all__ = ["DEFAULT_MAX_AGE", "CacheStats", "ForecastCache", "normalize_phrase", "region_key"]
@@ -1,8 +1,9 @@
 # services/forecast_ui.py
 from __future__ import annotations
 import asyncio, re, json
-from typing import Iterable, Dict, Any, List, Optional
-from playwright.async_api import Page, BrowserContext
+from typing import Iterable, Dict, Any, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+from playwright.async_api import Page, BrowserContext, Route
 
 # ------ Локаторы (робастные + фолбэки) ------
 LOC_FORECAST_ENTRY = [
@@ -32,11 +33,13 @@ LOC_CALCULATE = [
 ]
 
 def _first(page: Page, variants: List[str]):
-    for sel in variants:
-        loc = page.locator(sel)
-        if loc and loc.count() >= 0:
-            return loc.first
-    raise RuntimeError(f"Selector not found among: {variants}")
+    # Локатор «любой из вариантов»: count() в async API - корутина, проверять его здесь нельзя
+    if not variants:
+        raise RuntimeError("No selector variants given")
+    loc = page.locator(variants[0])
+    for sel in variants[1:]:
+        loc = loc.or_(page.locator(sel))
+    return loc.first
 
 async def open_budget_forecast(page: Page):
     # Мы уже в https://direct.yandex.ru/ с активной сессией (storage_state профиля)
@@ -57,9 +60,19 @@ async def open_budget_forecast(page: Page):
     # Дождаться загрузки формы
     await _first(page, LOC_CALCULATE).wait_for(timeout=20_000)
 
-async def set_regions(page: Page, region_names_or_ids: List[str|int]):
+async def set_regions(page: Page, region_names_or_ids: List[str|int], previous: Optional[Iterable[str|int]] = None):
     # Открыть окно выбора регионов
     await _first(page, LOC_REGION_OPEN).click(timeout=10_000)
+    # Снять регионы прошлого набора, которых нет в новом
+    wanted = {str(r) for r in region_names_or_ids}
+    for r in previous or []:
+        if str(r) in wanted:
+            continue
+        cb = page.locator("[role='treeitem']", has_text=re.compile(str(r))).locator("input[type='checkbox'], div[role='checkbox']")
+        try:
+            await cb.first.uncheck(timeout=3_000)
+        except:
+            pass
     # В модальном древе ищем элементы
     for r in region_names_or_ids:
         patt = str(r)
@@ -163,26 +176,214 @@ async def wait_forecast_json(page: Page, timeout_ms=45_000) -> List[Dict[str, An
         jd = json.loads(txt) if txt.strip().startswith("{") else {}
     return _extract_from_json(jd)
 
-async def forecast_batch(context: BrowserContext, phrases: List[str], region_ids: List[int]) -> List[Dict[str, Any]]:
+# ------ Регионы через параметры запроса ------
+# Ключи, под которыми запрос прогноза несёт регионы (в разных версиях по-разному)
+GEO_PARAM_KEYS = ("geo", "geoIds", "geo_ids", "GeoID", "regionIds", "region_ids", "regions")
+FORECAST_REQUEST_RE = re.compile(r"forecast|live/v4", re.I)
+
+def region_set_key(region_ids: Iterable[str|int]) -> Tuple[str, ...]:
+    return tuple(sorted({str(r).strip() for r in region_ids if str(r).strip()}))
+
+def _geo_value(old: Any, ids: Tuple[str, ...]) -> Any:
+    # Сохраняем формат исходного значения: строка "1,2", список или одно число
+    if isinstance(old, list):
+        return [int(i) if i.isdigit() else i for i in ids]
+    if isinstance(old, int) and not isinstance(old, bool):
+        return int(ids[0]) if len(ids) == 1 and ids[0].isdigit() else None
+    if isinstance(old, str):
+        return ",".join(ids)
+    return None
+
+def _inject_geo_json(node: Any, ids: Tuple[str, ...]) -> bool:
+    replaced = False
+    if isinstance(node, dict):
+        for key in list(node):
+            if key in GEO_PARAM_KEYS:
+                value = _geo_value(node[key], ids)
+                if value is not None:
+                    node[key] = value
+                    replaced = True
+            elif isinstance(node[key], (dict, list)):
+                replaced = _inject_geo_json(node[key], ids) or replaced
+    elif isinstance(node, list):
+        for item in node:
+            replaced = _inject_geo_json(item, ids) or replaced
+    return replaced
+
+def inject_geo(post_data: Optional[str], ids: Tuple[str, ...]) -> Optional[str]:
     """
-    Полный цикл: открыть инструмент, проставить регионы, вставить фразы, рассчитать.
+    Подставить регионы в тело запроса прогноза (JSON или form-urlencoded).
+    None - если ключа регионов в теле нет.
     """
-    page = await context.new_page()
-    await page.goto("https://direct.yandex.ru/", timeout=60_000)
-    await open_budget_forecast(page)
-    
-    if region_ids:
-        await set_regions(page, [str(i) for i in region_ids])
-    
-    out = []
-    CHUNK = 80
-    for i in range(0, len(phrases), CHUNK):
-        chunk = phrases[i:i+CHUNK]
-        await fill_phrases(page, chunk)
-        await click_calculate(page)
-        data = await wait_forecast_json(page)
-        out.extend(data)
-        await page.wait_for_timeout(300)
-    
-    await page.close()
+    if not post_data or not ids:
+        return None
+    body = post_data.strip()
+    if body.startswith("{") or body.startswith("["):
+        try:
+            jd = json.loads(body)
+        except ValueError:
+            return None
+        return json.dumps(jd, ensure_ascii=False) if _inject_geo_json(jd, ids) else None
+    pairs = parse_qsl(body, keep_blank_values=True)
+    if not any(k in GEO_PARAM_KEYS for k, _ in pairs):
+        return None
+    return urlencode([(k, ",".join(ids) if k in GEO_PARAM_KEYS else v) for k, v in pairs])
+
+
+class ForecastSession:
+    """
+    Открытая форма «Прогноза бюджета» с запомненным набором регионов.
+
+    Регионы меняются только когда набор отличается от применённого. По
+    умолчанию (region_mode="auto") они подставляются прямо в параметры
+    запроса прогноза через page.route; если запрос текущего расчёта не
+    удалось перехватить с ключом регионов, сессия переключается на
+    модальное окно и пересчитывает чанк.
+    """
+
+    def __init__(self, context: BrowserContext, region_mode: str = "auto", chunk: int = 80,
+                 page: Optional[Page] = None):
+        self.context = context
+        self.region_mode = region_mode
+        self.chunk = chunk
+        # Чужую страницу (page=...) используем, но не закрываем
+        self.page: Optional[Page] = page
+        self._own_page = page is None
+        self._routed = False
+        self._opened = False
+        self.applied_regions: Optional[Tuple[str, ...]] = None
+        self.ui_region_switches = 0
+        self._wanted: Tuple[str, ...] = ()
+        self._via_params = False
+        # Подставлены ли регионы в запрос текущего расчёта; route учитывает
+        # только запросы, ушедшие между кликом и ответом (_armed)
+        self._injected = False
+        self._armed = False
+        self._params_failed = False
+
+    async def open(self):
+        if self.page is None or self.page.is_closed():
+            self.page = await self.context.new_page()
+            self._own_page = True
+            self._routed = False
+        if self.region_mode == "auto" and not self._routed:
+            await self.page.route(FORECAST_REQUEST_RE, self._route_forecast)
+            self._routed = True
+        # Форма открывается заново - регионы в ней сброшены
+        self.applied_regions = None
+        await self.page.goto("https://direct.yandex.ru/", timeout=60_000)
+        await open_budget_forecast(self.page)
+        self._opened = True
+
+    async def close(self):
+        if self.page is not None and not self.page.is_closed():
+            if self._own_page:
+                await self.page.close()
+            elif self._routed:
+                await self.page.unroute(FORECAST_REQUEST_RE, self._route_forecast)
+        self.page = None
+        self._routed = False
+        self._opened = False
+
+    async def _route_forecast(self, route: Route):
+        request = route.request
+        if request.method == "POST" and self._wanted and self._armed:
+            body = inject_geo(request.post_data, self._wanted)
+            if body is not None:
+                self._injected = True
+                await route.continue_(post_data=body)
+                return
+        await route.continue_()
+
+    async def ensure_regions(self, region_ids: Iterable[str|int]):
+        wanted = region_set_key(region_ids)
+        self._wanted = wanted
+        if wanted == self.applied_regions:
+            return
+        if self.region_mode == "auto" and not self._params_failed:
+            # Регионы уйдут в параметрах запроса, модальное окно не трогаем
+            self.applied_regions = wanted
+            self._via_params = True
+            return
+        previous = None if self._via_params else self.applied_regions
+        if wanted:
+            await set_regions(self.page, list(wanted), previous=previous)
+        self.applied_regions = wanted
+        self._via_params = False
+        self.ui_region_switches += 1
+
+    async def _submit(self, phrases: List[str]) -> List[Dict[str, Any]]:
+        await fill_phrases(self.page, phrases)
+        # Слушаем ответ до клика, чтобы не пропустить быстрый XHR
+        waiter = asyncio.create_task(wait_forecast_json(self.page))
+        await asyncio.sleep(0)
+        self._injected = False
+        self._armed = True
+        try:
+            try:
+                await click_calculate(self.page)
+            except BaseException:
+                waiter.cancel()
+                raise
+            return await waiter
+        finally:
+            self._armed = False
+
+    async def run(self, phrases: List[str], region_ids: Iterable[str|int]) -> List[Dict[str, Any]]:
+        """Прогноз для фраз в заданных регионах (фразы уходят порциями по self.chunk)"""
+        if not self._opened or self.page.is_closed():
+            await self.open()
+        await self.ensure_regions(region_ids)
+        out = []
+        for i in range(0, len(phrases), self.chunk):
+            part = phrases[i:i + self.chunk]
+            data = await self._submit(part)
+            if self._via_params and self._wanted and not self._injected:
+                # Запрос расчёта не перехвачен или в нём нет ключа регионов:
+                # ответ посчитан не для тех регионов - выставляем их в форме и пересчитываем
+                self._params_failed = True
+                self.applied_regions = None
+                await self.ensure_regions(self._wanted)
+                data = await self._submit(part)
+            out.extend(data)
+            await self.page.wait_for_timeout(300)
+        return out
+
+
+async def forecast_region_groups(
+    context: BrowserContext,
+    groups: List[Tuple[List[str], List[int]]],
+    session: Optional[ForecastSession] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Прогноз для нескольких пар (фразы, регионы) одной сессией.
+    Пары с одинаковым набором регионов идут подряд, так что регионы
+    меняются не чаще числа разных наборов. Результаты - в порядке groups.
+    """
+    own = session is None
+    session = session or ForecastSession(context)
+    order = sorted(range(len(groups)), key=lambda i: region_set_key(groups[i][1]))
+    out: List[List[Dict[str, Any]]] = [[] for _ in groups]
+    try:
+        for i in order:
+            phrases, region_ids = groups[i]
+            out[i] = await session.run(phrases, region_ids)
+    finally:
+        if own:
+            await session.close()
     return out
+
+async def forecast_batch(context: BrowserContext, phrases: List[str], region_ids: List[int],
+                         session: Optional[ForecastSession] = None) -> List[Dict[str, Any]]:
+    """
+    Полный цикл: открыть инструмент, проставить регионы, вставить фразы, рассчитать.
+    С переданной session форма и набор регионов переиспользуются между вызовами.
+    """
+    if session is not None:
+        return await session.run(phrases, region_ids or [])
+    session = ForecastSession(context)
+    try:
+        # Упавший чанк уйдёт на повтор - страница не должна висеть в контексте
+        return await session.run(phrases, region_ids or [])
+    finally:
+        await session.close()
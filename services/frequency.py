@@ -4,9 +4,9 @@ from dataclasses import dataclass, asdict
 from datetime import datetime
 from typing import Iterable, Literal, Optional, Sequence
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text
 
-from ..core.db import SessionLocal
+from ..core.db import SessionLocal, engine
 from ..core.models import FrequencyResult
 
 # Modes:
@@ -67,6 +67,98 @@ def enqueue_masks(masks: Iterable[str], region: int) -> int:
     return inserted
 
 
+_ENQUEUE_SQL = text(
+    """
+    INSERT INTO freq_results
+        (mask, region, status, freq_total, freq_quotes, freq_exact, attempts, created_at, updated_at)
+    VALUES
+        (:mask, :region, 'queued', 0, 0, 0, 0, :ts, :ts)
+    ON CONFLICT(mask, region) DO UPDATE SET
+        status = 'queued',
+        freq_total = 0,
+        freq_quotes = 0,
+        freq_exact = 0,
+        error = NULL,
+        updated_at = excluded.updated_at
+    WHERE freq_results.status != 'ok'
+    """
+)
+
+
+def bulk_enqueue_masks(masks: Iterable[str], region: int, *, batch_size: int = 5000) -> int:
+    """Set-based :func:`enqueue_masks` for large inputs (e.g. combinator output).
+
+    Same semantics - new masks are queued, non-ok rows are re-queued, ok rows are
+    left alone - but written with one executemany per batch instead of a SELECT per
+    mask. Returns the number of newly inserted rows. Blocking; call it via
+    ``asyncio.to_thread`` from async code.
+    """
+    # New rows get ids above the current maximum; conflicting rows keep theirs
+    max_id_sql = text("SELECT COALESCE(MAX(id), 0) FROM freq_results")
+    inserted = 0
+    batch: list[dict] = []
+
+    def flush() -> int:
+        with engine.begin() as conn:
+            before = conn.execute(max_id_sql).scalar_one()
+            conn.execute(_ENQUEUE_SQL, batch)
+            added = conn.execute(
+                text("SELECT COUNT(*) FROM freq_results WHERE id > :before"), {"before": before}
+            ).scalar_one()
+        batch.clear()
+        return added
+
+    ts = datetime.utcnow()
+    for raw in masks:
+        mask = (raw or "").strip()
+        if not mask:
+            continue
+        batch.append({"mask": mask, "region": region, "ts": ts})
+        if len(batch) >= batch_size:
+            inserted += flush()
+    if batch:
+        inserted += flush()
+    return inserted
+
+
+_UPSERT_TOTAL_SQL = text(
+    """
+    INSERT INTO freq_results
+        (mask, region, status, freq_total, freq_quotes, freq_exact, attempts, created_at, updated_at)
+    VALUES
+        (:mask, :region, 'ok', :freq_total, 0, 0, 1, :ts, :ts)
+    ON CONFLICT(mask, region) DO UPDATE SET
+        status = 'ok',
+        freq_total = excluded.freq_total,
+        error = NULL,
+        attempts = freq_results.attempts + 1,
+        updated_at = excluded.updated_at
+    """
+)
+
+
+def bulk_upsert_frequencies(rows: Sequence[tuple[str, int, int]]) -> int:
+    """Upsert (mask, region, freq_total) rows into freq_results in one transaction.
+
+    Uses a single executemany through the shared engine, so it is cheap enough to
+    be called every few seconds from a background flush. Blocking; call it via
+    ``asyncio.to_thread`` from async code.
+    """
+    if not rows:
+        return 0
+    ts = datetime.utcnow()
+    params = [
+        {"mask": mask.strip(), "region": int(region), "freq_total": int(freq or 0), "ts": ts}
+        for mask, region, freq in rows
+        if mask and mask.strip()
+    ]
+    if not params:
+        return 0
+    with engine.begin() as conn:
+        conn.execute(_UPSERT_TOTAL_SQL, params)
+    return len(params)
+
+
 @dataclass
 class ParseResult:
     total: int = 0      # WS broad
@@ -3,14 +3,9 @@
 Анализ частотности и генерация списков минус-слов как в Key Collector
 """
 from collections import Counter, defaultdict
-from typing import List, Dict, Set, Tuple, Iterable
-import re
+from typing import List, Dict, Set, Tuple, Iterable, Iterator
 
-TOKEN_RE = re.compile(r"[a-zA-Zа-яА-Я0-9ёЁ]+", re.U)
-
-
-def tokenize(text: str) -> List[str]:
-    return [t.lower() for t in TOKEN_RE.findall(text or "")] 
+from .morphology import tokenize
 
 
 class MinusWordsExtractor:
@@ -85,30 +80,59 @@ class MinusWordsExtractor:
 
         return sorted(set(candidates))
 
-    def cross_minus_between_groups(
+    def iter_cross_minus(
         self,
         groups: Dict[str, List[Dict]],
         rules: Dict[str, Iterable[str]] | None = None,
-    ) -> Dict[str, Set[str]]:
-        """Кросс-минусовка между группами. Для каждой группы находим слова,
-        уникальные для других групп, и предлагаем их заминусовать.
-        rules: словарь дополнительных правил по группам {group: [tokens_to_force_minus]}
+        limit: int | None = None,
+    ) -> Iterator[Tuple[str, Set[str]]]:
+        """Потоковая кросс-минусовка: отдаёт (группа, минус-слова) по одной группе.
+
+        Сначала один проход строит индекс токен -> число групп, где он встречается.
+        Слова «только из других групп» для группы g — это все токены индекса,
+        которых нет в g, поэтому объединение чужих наборов на каждую группу не
+        нужно. Токены заранее отсортированы по числу групп (чаще — выше), и при
+        limit на группу просматривается лишь начало списка: O(limit + |g|)
+        вместо O(G·T).
+        rules: словарь дополнительных правил по группам {group: [tokens_to_force_minus]},
+        эти слова добавляются сверх limit.
         """
         group_tokens: Dict[str, Set[str]] = {}
+        group_count: Counter = Counter()
         for g, rows in groups.items():
             toks: Set[str] = set()
             for r in rows:
                 toks.update(tokenize(r.get('phrase', '')))
             group_tokens[g] = toks
+            group_count.update(toks)
 
-        result: Dict[str, Set[str]] = {g: set() for g in groups}
+        ranked = [
+            t for t, _ in sorted(group_count.items(), key=lambda item: (-item[1], item[0]))
+            if t not in self.stop_words
+        ]
         for g, toks in group_tokens.items():
-            others = set().union(*[group_tokens[o] for o in group_tokens if o != g]) if len(group_tokens) > 1 else set()
-            to_minus = (others - toks) - self.stop_words
+            to_minus: Set[str] = set()
+            for t in ranked:
+                if limit is not None and len(to_minus) >= limit:
+                    break
+                if t not in toks:
+                    to_minus.add(t)
             if rules and g in rules:
-                to_minus.update(set(rules[g]))
-            result[g] = set(sorted(to_minus))
-        return result
+                to_minus.update(rules[g])
+            yield g, to_minus
+
+    def cross_minus_between_groups(
+        self,
+        groups: Dict[str, List[Dict]],
+        rules: Dict[str, Iterable[str]] | None = None,
+        limit: int | None = None,
+    ) -> Dict[str, Set[str]]:
+        """Кросс-минусовка между группами. Для каждой группы находим слова,
+        уникальные для других групп, и предлагаем их заминусовать.
+        rules: словарь дополнительных правил по группам {group: [tokens_to_force_minus]}
+        limit: максимум минус-слов на группу (самые распространённые по группам)
+        """
+        return dict(self.iter_cross_minus(groups, rules, limit))
 
     def analyze_efficiency(
         self,
@@ -203,7 +227,8 @@ def func_cross_minus(payload: Dict) -> Dict:
     extractor = MinusWordsExtractor()
     groups: Dict[str, List[Dict]] = payload.get('groups', {})
     rules = payload.get('rules')
-    result = extractor.cross_minus_between_groups(groups, rules)
+    limit = payload.get('params', {}).get('limit')
+    result = extractor.cross_minus_between_groups(groups, rules, int(limit) if limit else None)
     # сериализация сетов
     return {g: sorted(list(v)) for g, v in result.items()}
 
@@ -0,0 +1,200 @@
+"""Shared morphology layer: tokenization, lemmas and stems for keyword phrases.
+
+Clustering, minus-word extraction and deduplication all need the same view of
+a phrase's words. This module is the single place that splits phrases into
+tokens and maps every word to its lemma (dictionary form) and stem.
+
+Backends are optional and picked once on first use:
+ - lemmas come from ``pymorphy3`` (or ``pymorphy2``) when installed, otherwise
+   from the stemmer;
+ - stems come from NLTK's Russian Snowball stemmer when ``nltk`` is installed,
+   otherwise the lower-cased word is used as is.
+
+Word -> lemma and word -> stem lookups go through bounded LRU caches, so in a
+large corpus a repeated word costs one dictionary lookup. The batch helpers
+(:func:`lemmatize_many`, :func:`stem_many`) resolve each distinct word of a
+batch once and are what bulk callers should use.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable, Iterable
+import re
+
+__all__ = [
+    "WORD_CACHE_SIZE",
+    "tokenize",
+    "lemma",
+    "stem",
+    "lemmas",
+    "stems",
+    "tokenize_many",
+    "lemmatize_many",
+    "stem_many",
+    "stopwords",
+    "backend_names",
+    "cache_info",
+    "clear_caches",
+]
+
+WORD_CACHE_SIZE = 200_000
+
+_TOKEN_RE = re.compile(r"\w+(?:-\w+)*", flags=re.UNICODE)
+
+# Used when the NLTK stopword corpus is not available.
+_FALLBACK_STOPWORDS = frozenset(
+    "в на с со для из по к ко о об а и но или от до за под над при через у без "
+    "не ни же ли бы то как что это".split()
+)
+
+_lemmatizer: Callable[[str], str] | None = None
+_stemmer: Callable[[str], str] | None = None
+_backends: dict[str, str] = {}
+
+
+def _load_stemmer() -> Callable[[str], str]:
+    global _stemmer
+    if _stemmer is None:
+        try:
+            from nltk.stem.snowball import SnowballStemmer
+
+            _stemmer = SnowballStemmer("russian").stem
+            _backends["stem"] = "nltk-snowball"
+        except ImportError:
+            _stemmer = str.lower
+            _backends["stem"] = "identity"
+    return _stemmer
+
+
+def _load_lemmatizer() -> Callable[[str], str]:
+    global _lemmatizer
+    if _lemmatizer is None:
+        analyzer = None
+        for module_name in ("pymorphy3", "pymorphy2"):
+            try:
+                module = __import__(module_name)
+            except ImportError:
+                continue
+            analyzer = module.MorphAnalyzer()
+            _backends["lemma"] = module_name
+            break
+        if analyzer is not None:
+            parse = analyzer.parse
+
+            def _normal_form(word: str) -> str:
+                parsed = parse(word)
+                return parsed[0].normal_form if parsed else word
+
+            _lemmatizer = _normal_form
+        else:
+            _lemmatizer = _load_stemmer()
+            _backends["lemma"] = f"stem:{_backends['stem']}"
+    return _lemmatizer
+
+
+def tokenize(phrase: str, *, keep_digits: bool = True) -> list[str]:
+    """Split *phrase* into lower-cased word tokens.
+
+    Hyphenated words (``интернет-магазин``) stay one token; minus operators and
+    other punctuation are dropped.
+    """
+
+    tokens = _TOKEN_RE.findall((phrase or "").lower())
+    if not keep_digits:
+        tokens = [token for token in tokens if not token.isdigit()]
+    return tokens
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def lemma(word: str) -> str:
+    """Return the dictionary form of a lower-cased *word*."""
+
+    if word.isdigit():
+        return word
+    return _load_lemmatizer()(word)
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def stem(word: str) -> str:
+    """Return the stem of a lower-cased *word*."""
+
+    if word.isdigit():
+        return word
+    return _load_stemmer()(word)
+
+
+def lemmas(phrase: str) -> list[str]:
+    """Tokenize *phrase* and map every token to its lemma."""
+
+    return [lemma(token) for token in tokenize(phrase)]
+
+
+def stems(phrase: str) -> list[str]:
+    """Tokenize *phrase* and map every token to its stem."""
+
+    return [stem(token) for token in tokenize(phrase)]
+
+
+def tokenize_many(phrases: Iterable[str], *, keep_digits: bool = True) -> list[list[str]]:
+    """Tokenize a batch of phrases."""
+
+    return [tokenize(phrase, keep_digits=keep_digits) for phrase in phrases]
+
+
+def _map_many(phrases: Iterable[str], resolve: Callable[[str], str]) -> list[list[str]]:
+    # Resolve each distinct word of the batch once through a plain dict; the
+    # LRU cache behind *resolve* then carries the forms over to later batches.
+    forms: dict[str, str] = {}
+    result: list[list[str]] = []
+    for phrase in phrases:
+        row = []
+        for token in tokenize(phrase):
+            form = forms.get(token)
+            if form is None:
+                form = forms[token] = resolve(token)
+            row.append(form)
+        result.append(row)
+    return result
+
+
+def lemmatize_many(phrases: Iterable[str]) -> list[list[str]]:
+    """Return the lemma list of every phrase in *phrases*."""
+
+    return _map_many(phrases, lemma)
+
+
+def stem_many(phrases: Iterable[str]) -> list[list[str]]:
+    """Return the stem list of every phrase in *phrases*."""
+
+    return _map_many(phrases, stem)
+
+
+@lru_cache(maxsize=1)
+def stopwords() -> frozenset[str]:
+    """Russian stop words from NLTK, or a small built-in list without the corpus."""
+
+    try:
+        from nltk.corpus import stopwords as corpus
+
+        return frozenset(corpus.words("russian"))
+    except (ImportError, LookupError):
+        return _FALLBACK_STOPWORDS
+
+
+def backend_names() -> dict[str, str]:
+    """Return the backends in use, e.g. ``{"lemma": "pymorphy3", "stem": "nltk-snowball"}``."""
+
+    _load_lemmatizer()
+    _load_stemmer()
+    return dict(_backends)
+
+
+def cache_info() -> dict[str, object]:
+    """Return LRU statistics of the word caches."""
+
+    return {"lemma": lemma.cache_info(), "stem": stem.cache_info()}
+
+
+def clear_caches() -> None:
+    lemma.cache_clear()
+    stem.cache_clear()
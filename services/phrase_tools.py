@@ -8,23 +8,50 @@ They are intended to support the workflow described in the project notes:
  - light-weight clustering/grouping based on token overlap.
 
 All functions are deterministic and side-effect free so they can be unit-tested
-independently of the GUI or worker processes.
+independently of the GUI or worker processes. The only exceptions are the
+explicit disk helpers for very large combinator runs (:class:`DiskHashSet`
+and :func:`write_combination_shards`) and :meth:`DuplicateGroups.write_aliases`,
+which touch only the paths they are given or a private temporary file.
 """
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from itertools import product
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import islice, product
+from math import ceil, prod
+from pathlib import Path
 from typing import Callable, Iterable, Iterator, Sequence
+import csv
+import os
+import pickle
 import re
+import sqlite3
+import tempfile
+
+from . import morphology
+from .morphology import tokenize
 
 __all__ = [
     "NormalizationOptions",
     "FilterOptions",
     "generate_combinations",
+    "combination_count",
+    "iter_combinations",
+    "iter_combination_chunks",
+    "write_combination_shards",
+    "DiskHashSet",
     "normalize_phrases",
+    "canonical_key",
+    "phrase_hash",
+    "collapse_duplicates",
+    "DuplicateGroups",
     "filter_phrases",
+    "filter_many",
     "tokenize",
     "cluster_phrases",
+    "ClusterIndex",
     "Cluster",
     "walk_clusters",
 ]
@@ -46,25 +73,33 @@ class NormalizationOptions:
 
     def apply(self, phrase: str) -> str:
         if self.strip_chars:
-            for ch in self.strip_chars:
-                phrase = phrase.replace(ch, " ")
+            phrase = phrase.translate(_space_table(self.strip_chars))
         phrase = phrase.strip()
         if self.collapse_whitespace:
-            phrase = re.sub(r"\s+", " ", phrase)
+            phrase = " ".join(phrase.split())
         if self.lowercase:
             phrase = phrase.lower()
         if self.strip_punctuation:
-            phrase = re.sub(r'[^\w\s]+', ' ', phrase)
+            phrase = _PUNCT_RE.sub(' ', phrase)
         return phrase
 
 
+@lru_cache(maxsize=16)
+def _space_table(chars: str) -> dict[int, str]:
+    return {ord(ch): " " for ch in chars}
+
+
 _PUNCT_RE = re.compile(r'[^\w\s]+', flags=re.UNICODE)
-_TOKEN_RE = re.compile(r"[\w-]+", flags=re.UNICODE)
 
 
 @dataclass(slots=True)
 class FilterOptions:
-    """Business rules for filtering raw phrases."""
+    """Business rules for filtering raw phrases.
+
+    ``stopwords`` are matched per token: a phrase is dropped when it contains
+    any single-word entry as a token, or a multi-word entry as a run of
+    consecutive tokens.
+    """
 
     min_length: int = 0
     max_length: int | None = None
@@ -78,14 +113,82 @@ class FilterOptions:
         return CompiledFilter(self)
 
 
+_LITERAL_RE = re.compile(r"[\w\s-]+", flags=re.UNICODE)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Build one regex for a list of literals by factoring common prefixes.
+
+    ``бренд|брендовый|брелок`` becomes ``бре(?:нд(?:овый)?|лок)``, so the
+    regex engine follows a single path per position instead of trying every
+    alternative in turn; this is the stdlib stand-in for an Aho-Corasick
+    automaton.
+    """
+
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def render(node: dict) -> str:
+        optional = "" in node
+        branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            return (body if len(branches) > 1 else f"(?:{body})") + "?"
+        return body
+
+    return render(trie)
+
+
+def _merge_patterns(patterns: Sequence[str]) -> list[re.Pattern[str]]:
+    """Compile *patterns* into as few case-insensitive regexes as possible.
+
+    Plain words and phrases are folded into a single prefix trie; the remaining
+    regexes are joined into one alternation. Patterns that cannot be merged
+    (back-references, inline flags) keep a regex of their own.
+    """
+
+    literals = {p.lower() for p in patterns if _LITERAL_RE.fullmatch(p)}
+    regexes = [p for p in patterns if not _LITERAL_RE.fullmatch(p)]
+    compiled: list[re.Pattern[str]] = []
+    if literals:
+        compiled.append(re.compile(_trie_pattern(literals), re.IGNORECASE))
+    if regexes:
+        for pattern in regexes:
+            re.compile(pattern)  # surface a bad pattern before merging hides it
+        mergeable = [p for p in regexes if not re.search(r"\\\d|\(\?P=|\(\?[aiLmsux-]+[:)]", p)]
+        separate = [p for p in regexes if p not in mergeable]
+        if mergeable:
+            try:
+                compiled.append(re.compile("|".join(f"(?:{p})" for p in mergeable), re.IGNORECASE))
+            except re.error:
+                separate = regexes
+        compiled.extend(re.compile(p, re.IGNORECASE) for p in separate)
+    return compiled
+
+
 @dataclass(slots=True)
 class CompiledFilter:
     options: FilterOptions
+    _include: list[re.Pattern[str]] = field(init=False, repr=False)
+    _exclude: list[re.Pattern[str]] = field(init=False, repr=False)
+    _stop_tokens: frozenset[str] = field(init=False, repr=False)
+    _stop_runs: re.Pattern[str] | None = field(init=False, repr=False)
 
     def __post_init__(self) -> None:
-        self._include = [re.compile(p, re.IGNORECASE) for p in self.options.include_patterns]
-        self._exclude = [re.compile(p, re.IGNORECASE) for p in self.options.exclude_patterns]
-        self._stop = {w.lower() for w in self.options.stopwords}
+        self._include = _merge_patterns(list(self.options.include_patterns))
+        self._exclude = _merge_patterns(list(self.options.exclude_patterns))
+        entries = [" ".join(tokenize(w)) for w in self.options.stopwords]
+        self._stop_tokens = frozenset(e for e in entries if e and " " not in e)
+        runs = {e for e in entries if " " in e}
+        self._stop_runs = re.compile(r"(?:^| )" + _trie_pattern(runs) + r"(?: |$)") if runs else None
 
     def __call__(self, phrase: str) -> bool:
         opts = self.options
@@ -97,8 +200,12 @@ class CompiledFilter:
             return False
         if not opts.allow_punctuation and _PUNCT_RE.search(phrase):
             return False
-        if self._stop and phrase.lower() in self._stop:
-            return False
+        if self._stop_tokens or self._stop_runs is not None:
+            tokens = tokenize(phrase)
+            if not self._stop_tokens.isdisjoint(tokens):
+                return False
+            if self._stop_runs is not None and self._stop_runs.search(" ".join(tokens)):
+                return False
         if self._include and not any(p.search(phrase) for p in self._include):
             return False
         if self._exclude and any(p.search(phrase) for p in self._exclude):
@@ -111,6 +218,196 @@ class CompiledFilter:
 # ---------------------------------------------------------------------------
 
 
+_PLACEHOLDER_RE = re.compile(r"\{(\d+)\}")
+
+
+def _compile_template(template: str) -> Callable[[Sequence[str]], str]:
+    """Turn a ``{i}`` template into a single-pass formatter."""
+
+    pieces: list[str | int] = []
+    pos = 0
+    for match in _PLACEHOLDER_RE.finditer(template):
+        pieces.append(template[pos:match.start()])
+        pieces.append(int(match.group(1)))
+        pos = match.end()
+    pieces.append(template[pos:])
+
+    def render(parts: Sequence[str]) -> str:
+        return "".join(
+            piece if isinstance(piece, str)
+            else (parts[piece] if piece < len(parts) else f"{{{piece}}}")
+            for piece in pieces
+        )
+
+    return render
+
+
+def _columns(dictionaries: Sequence[Sequence[str]]) -> list[list[str]]:
+    return [list(col) for col in dictionaries or () if col]
+
+
+def combination_count(dictionaries: Sequence[Sequence[str]]) -> int:
+    """Exact number of raw combinations (before normalisation and deduplication)."""
+
+    sequences = _columns(dictionaries)
+    return prod(len(col) for col in sequences) if sequences else 0
+
+
+class DiskHashSet:
+    """Set of phrases backed by a temporary SQLite file.
+
+    Membership is tracked by a 64-bit BLAKE2 hash of the phrase, so memory stays
+    flat regardless of the number of phrases. The chance of a false "already
+    seen" is about n²/2⁶⁵ (≈0.2% for 300M phrases). Use as a context manager or
+    call :meth:`close` to delete the file.
+    """
+
+    _BATCH = 900  # below SQLite's default host-parameter limit
+
+    def __init__(self, directory: str | os.PathLike | None = None) -> None:
+        fd, self.path = tempfile.mkstemp(prefix="combo_seen_", suffix=".db", dir=directory)
+        os.close(fd)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+        self._conn.execute("CREATE TABLE seen (h INTEGER PRIMARY KEY) WITHOUT ROWID")
+        self.count = 0
+
+    @staticmethod
+    def _hash(phrase: str) -> int:
+        return int.from_bytes(blake2b(phrase.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+    def filter_new(self, phrases: Iterable[str]) -> list[str]:
+        """Return phrases not seen before (in input order) and remember them."""
+
+        fresh: dict[int, str] = {}
+        for phrase in phrases:
+            fresh.setdefault(self._hash(phrase), phrase)
+        if not fresh:
+            return []
+        # Sorted keys keep B-tree lookups and inserts local
+        hashes = sorted(fresh)
+        for i in range(0, len(hashes), self._BATCH):
+            batch = hashes[i:i + self._BATCH]
+            marks = ",".join("?" * len(batch))
+            for (known,) in self._conn.execute(f"SELECT h FROM seen WHERE h IN ({marks})", batch):
+                fresh.pop(known, None)
+        self._conn.executemany("INSERT INTO seen (h) VALUES (?)", ((h,) for h in hashes if h in fresh))
+        self._conn.commit()
+        self.count += len(fresh)
+        return list(fresh.values())
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self) -> "DiskHashSet":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def _raw_combinations(
+    sequences: list[list[str]],
+    glue: str,
+    prefix: str,
+    suffix: str,
+    template: str | None,
+    normalization: NormalizationOptions | None,
+) -> Iterator[str]:
+    render = _compile_template(template) if template else glue.join
+    normalizer = normalization.apply if normalization else None
+    wrap = bool(prefix or suffix)
+    for parts in product(*sequences):
+        phrase = render(parts)
+        if wrap:
+            phrase = f"{prefix}{phrase}{suffix}"
+        if normalizer:
+            phrase = normalizer(phrase)
+        if phrase:
+            yield phrase
+
+
+def iter_combination_chunks(
+    dictionaries: Sequence[Sequence[str]],
+    *,
+    glue: str = " ",
+    prefix: str = "",
+    suffix: str = "",
+    template: str | None = None,
+    normalization: NormalizationOptions | None = None,
+    chunk_size: int = 10_000,
+    dedup: str | None = "auto",
+    max_memory_items: int = 2_000_000,
+    temp_dir: str | os.PathLike | None = None,
+) -> Iterator[list[str]]:
+    """Stream combinations in lists of up to *chunk_size* phrases.
+
+    Parameters are the same as :func:`generate_combinations`, plus:
+
+    chunk_size:
+        Maximum phrases per yielded list (a chunk may be shorter after dedup).
+    dedup:
+        ``"memory"`` keeps a set of seen phrases, ``"disk"`` uses :class:`DiskHashSet`,
+        ``None`` disables deduplication. ``"auto"`` follows
+        ``normalization.deduplicate`` and switches to disk when
+        :func:`combination_count` exceeds *max_memory_items*.
+    temp_dir:
+        Where the disk-backed set keeps its temporary file.
+    """
+
+    sequences = _columns(dictionaries)
+    if not sequences:
+        return
+    if dedup == "auto":
+        if not (normalization and normalization.deduplicate):
+            dedup = None
+        else:
+            dedup = "disk" if combination_count(sequences) > max_memory_items else "memory"
+
+    phrases = _raw_combinations(sequences, glue, prefix, suffix, template, normalization)
+    chunk_size = max(1, chunk_size)
+    if dedup == "disk":
+        with DiskHashSet(temp_dir) as seen:
+            while True:
+                raw = list(islice(phrases, chunk_size))
+                if not raw:
+                    return
+                fresh = seen.filter_new(raw)
+                if fresh:
+                    yield fresh
+    else:
+        seen_memory: set[str] | None = set() if dedup == "memory" else None
+        while True:
+            raw = list(islice(phrases, chunk_size))
+            if not raw:
+                return
+            if seen_memory is not None:
+                fresh = []
+                for phrase in raw:
+                    if phrase not in seen_memory:
+                        seen_memory.add(phrase)
+                        fresh.append(phrase)
+                raw = fresh
+            if raw:
+                yield raw
+
+
+def iter_combinations(dictionaries: Sequence[Sequence[str]], **kwargs) -> Iterator[str]:
+    """Lazy version of :func:`generate_combinations`; accepts the same keywords as
+    :func:`iter_combination_chunks`."""
+
+    for chunk in iter_combination_chunks(dictionaries, **kwargs):
+        yield from chunk
+
+
 def generate_combinations(
     dictionaries: Sequence[Sequence[str]],
     *,
@@ -125,7 +422,7 @@ def generate_combinations(
     Parameters
     ----------
     dictionaries:
-        A sequence of iterables (columns). Empty strings are ignored.
+        A sequence of iterables (columns). Empty columns are ignored.
     glue:
         String inserted between dictionary parts when *template* is not provided.
     prefix/suffix:
@@ -134,30 +431,90 @@ def generate_combinations(
         Custom format string using `{i}` placeholders. When provided, *glue* is ignored.
     normalization:
         Optional :class:`NormalizationOptions` applied to the final phrase.
+
+    The whole product is materialised; use :func:`combination_count` to check the
+    size first and :func:`iter_combination_chunks` for large inputs.
     """
 
-    if not dictionaries:
-        return []
-    sequences = [list(col) for col in dictionaries if col]
-    if not sequences:
-        return []
+    return list(
+        iter_combinations(
+            dictionaries,
+            glue=glue,
+            prefix=prefix,
+            suffix=suffix,
+            template=template,
+            normalization=normalization,
+            dedup="memory" if normalization and normalization.deduplicate else None,
+        )
+    )
+
+
+def write_combination_shards(
+    chunks: Iterable[Sequence[str]],
+    out_dir: str | os.PathLike,
+    *,
+    shard_size: int = 1_000_000,
+    stem: str = "combinations",
+) -> list[Path]:
+    """Write phrase chunks into ``<stem>_00001.txt``-style files of up to *shard_size* lines.
 
-    normalizer = normalization.apply if normalization else (lambda s: s)
-    phrases: list[str] = []
-    for parts in product(*sequences):
-        if template:
-            phrase = template
-            for idx, part in enumerate(parts):
-                phrase = phrase.replace(f"{{{idx}}}", part)
-        else:
-            phrase = glue.join(parts)
-        phrase = f"{prefix}{phrase}{suffix}" if prefix or suffix else phrase
-        phrase = normalizer(phrase)
-        if phrase:
-            phrases.append(phrase)
-    if normalization and normalization.deduplicate:
-        phrases = list(dict.fromkeys(phrases))
-    return phrases
+    Returns the shard paths in order.
+    """
+
+    target = Path(out_dir)
+    target.mkdir(parents=True, exist_ok=True)
+    shard_size = max(1, shard_size)
+    paths: list[Path] = []
+    handle = None
+    in_shard = 0
+    try:
+        for chunk in chunks:
+            pos = 0
+            while pos < len(chunk):
+                if handle is None or in_shard >= shard_size:
+                    if handle is not None:
+                        handle.close()
+                    path = target / f"{stem}_{len(paths) + 1:05d}.txt"
+                    handle = path.open("w", encoding="utf-8", newline="\n")
+                    paths.append(path)
+                    in_shard = 0
+                take = min(shard_size - in_shard, len(chunk) - pos)
+                handle.write("\n".join(chunk[pos:pos + take]))
+                handle.write("\n")
+                in_shard += take
+                pos += take
+    finally:
+        if handle is not None:
+            handle.close()
+    return paths
+
+
+PARALLEL_MIN_PHRASES = 50_000
+
+
+def _chunked(items: Sequence, parts: int) -> list:
+    size = max(1, -(-len(items) // parts))
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def _parallel_map(func: Callable, chunks: list, *args) -> list | None:
+    """Run ``func(chunk, *args)`` in a process pool, or return ``None``.
+
+    ``None`` means the work could not be shipped to other processes (for
+    example a lambda tokenizer) and the caller should fall back to running it
+    inline.
+    """
+
+    try:
+        pickle.dumps((func, args))
+    except Exception:
+        return None
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [pool.submit(func, chunk, *args) for chunk in chunks]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+    return results
 
 
 def normalize_phrases(
@@ -187,23 +544,203 @@ def filter_phrases(
 ) -> list[str]:
     if options is None:
         return [p for p in phrases]
+    return filter_many(phrases, options)
+
+
+def _filter_chunk(chunk: list[str], options: FilterOptions) -> list[str]:
+    compiled = options.compile()
+    return [phrase for phrase in chunk if compiled(phrase)]
+
+
+def filter_many(
+    phrases: Iterable[str],
+    options: FilterOptions | CompiledFilter,
+    *,
+    workers: int | None = 1,
+) -> list[str]:
+    """Filter a batch of phrases, optionally fanning out over processes.
+
+    With ``workers > 1`` (``None`` means ``os.cpu_count()``) and at least
+    :data:`PARALLEL_MIN_PHRASES` phrases, the input is split into one chunk per
+    worker and every process compiles the filter once. Order is preserved.
+    """
+
     compiled = options if isinstance(options, CompiledFilter) else options.compile()
-    return [phrase for phrase in phrases if compiled(phrase)]
+    items = phrases if isinstance(phrases, list) else list(phrases)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and len(items) >= PARALLEL_MIN_PHRASES:
+        result = _parallel_map(_filter_chunk, _chunked(items, workers), compiled.options)
+        if result is not None:
+            return result
+    return [phrase for phrase in items if compiled(phrase)]
+
+
+# ---------------------------------------------------------------------------
+# Near-duplicate collapsing
+# ---------------------------------------------------------------------------
+
 
+_OPERATOR_TOKEN_RE = re.compile(r"\[|\]|(?:(?<![\w-])[-!+])?\w+(?:-\w+)*", flags=re.UNICODE)
+_OPERATOR_RE = re.compile(r'["\[\]!+]|(?<![\w-])-', flags=re.UNICODE)
 
-def tokenize(phrase: str, *, keep_digits: bool = True) -> list[str]:
-    """Split a phrase into tokens suitable for clustering.
 
-    The tokenizer is intentionally simple and relies only on the standard library.
+def canonical_key(phrase: str, *, lemmatize: bool = True) -> str:
+    """Return a key that is equal for phrases differing only in order or word forms.
+
+    Plain words are replaced by their lemmas and sorted (as a multiset, so a
+    repeated word still counts twice). Wordstat/Direct operators are part of
+    the key: ``"..."`` marks the whole phrase, ``!word`` and ``+word`` keep
+    their exact form, ``[...]`` keeps the order of the words inside, and
+    ``-word`` minus words form a separate sorted set.
     """
 
-    tokens = []
-    for match in _TOKEN_RE.finditer(phrase.lower()):
+    to_form = morphology.lemma if lemmatize else str
+    if not _OPERATOR_RE.search(phrase):
+        return " ".join(sorted(map(to_form, tokenize(phrase))))
+
+    words: list[str] = []
+    minus: set[str] = set()
+    fixed_runs: list[str] = []
+    run: list[str] | None = None
+    for match in _OPERATOR_TOKEN_RE.finditer(phrase.lower()):
         token = match.group(0)
-        if not keep_digits and token.isdigit():
+        if token == "[":
+            run = []
+            continue
+        if token == "]":
+            if run:
+                fixed_runs.append(" ".join(run))
+            run = None
+            continue
+        operator = token[0]
+        if operator == "-":
+            minus.add(to_form(token[1:]))
+            continue
+        form = token if operator in "!+" else to_form(token)
+        if run is not None:
+            run.append(form)
+        else:
+            words.append(form)
+    if run:
+        fixed_runs.append(" ".join(run))
+
+    key = " ".join(sorted(words))
+    if fixed_runs:
+        key += " [" + "][".join(sorted(fixed_runs)) + "]"
+    if minus:
+        key += " -" + " -".join(sorted(minus))
+    if '"' in phrase:
+        key = f'"{key}"'
+    return key
+
+
+def phrase_hash(key: str) -> int:
+    """Stable 64-bit hash of a :func:`canonical_key` (same value in every process)."""
+
+    return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+@dataclass(slots=True)
+class DuplicateGroups:
+    """Result of :func:`collapse_duplicates`.
+
+    ``representatives`` keeps one phrase per group in first-seen order;
+    ``aliases`` maps a representative to the phrases collapsed into it.
+    """
+
+    representatives: list[str]
+    aliases: dict[str, list[str]]
+
+    @property
+    def removed(self) -> int:
+        return sum(len(members) for members in self.aliases.values())
+
+    def iter_aliases(self) -> Iterator[tuple[str, str]]:
+        """Yield ``(alias, representative)`` pairs."""
+
+        for representative, members in self.aliases.items():
+            for alias in members:
+                yield alias, representative
+
+    def write_aliases(self, path: str | os.PathLike) -> int:
+        """Write the alias mapping as ``phrase;representative`` CSV and return the row count."""
+
+        count = 0
+        with open(path, "w", encoding="utf-8-sig", newline="") as handle:
+            writer = csv.writer(handle, delimiter=";")
+            writer.writerow(["phrase", "representative"])
+            for row in self.iter_aliases():
+                writer.writerow(row)
+                count += 1
+        return count
+
+
+def collapse_duplicates(
+    phrases: Iterable[str],
+    *,
+    choose: str | Callable[[str], float] = "first",
+    lemmatize: bool = True,
+) -> DuplicateGroups:
+    """Collapse phrases with the same :func:`canonical_key` in a single pass.
+
+    Groups are keyed by the 64-bit :func:`phrase_hash` of the canonical key, so
+    memory stays proportional to the number of groups rather than to the key
+    text. The chance of two different keys sharing a hash is about n²/2⁶⁵
+    (≈1e-7, one in ten million, for 2M distinct keys).
+
+    Parameters
+    ----------
+    phrases:
+        Input phrases, usually the output of :func:`normalize_phrases`.
+    choose:
+        Which phrase represents a group: ``"first"`` (first seen),
+        ``"shortest"``, or a callable returning a score where the highest
+        score wins (for example a frequency lookup). Ties keep the earlier
+        phrase.
+    lemmatize:
+        Compare lemmas (default) or only word order and exact forms.
+    """
+
+    if choose == "first":
+        score = None
+    elif choose == "shortest":
+        score = lambda phrase: -len(phrase)  # noqa: E731
+    elif callable(choose):
+        score = choose
+    else:
+        raise ValueError(f"Unknown representative choice: {choose!r}")
+
+    slots: dict[int, int] = {}
+    representatives: list[str] = []
+    scores: list[float] = []
+    members: dict[int, list[str]] = {}
+    for phrase in phrases:
+        digest = phrase_hash(canonical_key(phrase, lemmatize=lemmatize))
+        slot = slots.get(digest)
+        if slot is None:
+            slots[digest] = len(representatives)
+            representatives.append(phrase)
+            if score is not None:
+                scores.append(score(phrase))
+            continue
+        current = representatives[slot]
+        if phrase == current:
             continue
-        tokens.append(token)
-    return tokens
+        group = members.setdefault(slot, [])
+        if phrase in group:
+            continue
+        if score is not None:
+            value = score(phrase)
+            if value > scores[slot]:
+                group.append(current)
+                representatives[slot] = phrase
+                scores[slot] = value
+                continue
+        group.append(phrase)
+
+    aliases = {representatives[slot]: group for slot, group in sorted(members.items())}
+    return DuplicateGroups(representatives, aliases)
 
 
 @dataclass(slots=True)
@@ -224,14 +761,162 @@ class Cluster:
         return len(self.keys)
 
 
+_EPS = 1e-9
+
+
+class ClusterIndex:
+    """Incremental greedy clustering by Jaccard similarity of token sets.
+
+    Phrases are assigned greedily in the order they are added: a phrase joins
+    the earliest created cluster that has a member with Jaccard index
+    ``>= similarity`` and starts a new cluster otherwise. The index can be
+    seeded with clusters built earlier (for example loaded from the database)
+    and then extended with :meth:`add_phrases`; the result is the same as
+    clustering the old and new phrases together in one run.
+
+    Candidates come from an inverted index of token prefixes. Tokens of each
+    phrase are ordered from rarest to most frequent, and two sets with Jaccard
+    ``>= t`` must share a token among the first ``|x| - ceil(t * |x|) + 1``
+    tokens of either one, so only those prefix tokens are indexed and probed.
+    Postings are further bucketed by set size and token position: a whole
+    bucket is skipped when the sizes or the tokens left after the first shared
+    one cannot reach the required overlap, so common words (usually the seed
+    keyword present in every phrase) do not turn each probe into a scan.
+    Within a bucket members are grouped by cluster, and clusters created after
+    the best match so far are skipped wholesale.
+
+    The token order only has to stay fixed while the index lives: tokens first
+    seen in a later batch are ranked ahead of (as rarer than) all known ones.
+    """
+
+    def __init__(
+        self,
+        *,
+        similarity: float = 0.5,
+        tokenizer: Callable[[str], Iterable[str]] | None = None,
+        clusters: Iterable[Cluster] = (),
+    ) -> None:
+        self.similarity = min(max(similarity, 0.0), 1.0)
+        self.tokenizer = tokenizer or tokenize
+        self.clusters: list[Cluster] = []
+        self._rank: dict[str, int] = {}
+        # token -> (set size, token position) -> cluster id -> member token sets
+        self._index: dict[str, dict[tuple[int, int], dict[int, list[set[str]]]]] = {}
+        self._indexed: set[tuple[frozenset[str], int]] = set()
+
+        existing = list(clusters)
+        self._extend_rank(frozenset(tokens) for cluster in existing for tokens in cluster.tokens)
+        for cluster in existing:
+            cluster_id = len(self.clusters)
+            self.clusters.append(cluster)
+            for tokens in cluster.tokens:
+                if tokens:
+                    self._index_member(frozenset(tokens), tokens, cluster_id)
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def add_phrases(self, phrases: Iterable[str], *, workers: int | None = 1) -> list[int]:
+        """Assign *phrases* to clusters and return the cluster number of each.
+
+        ``workers`` is passed to tokenization as in :func:`cluster_phrases`.
+        """
+
+        items = list(phrases)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        return self.add_token_sets(items, _tokenize_all(items, self.tokenizer, workers))
+
+    def add_token_sets(self, phrases: Sequence[str], token_sets: Sequence[frozenset[str]]) -> list[int]:
+        """Like :meth:`add_phrases` for phrases that are already tokenized."""
+
+        self._extend_rank(token_sets)
+        return [self._assign(phrase, tokens) for phrase, tokens in zip(phrases, token_sets)]
+
+    def _extend_rank(self, token_sets: Iterable[frozenset[str]]) -> None:
+        frequency: dict[str, int] = {}
+        for tokens in token_sets:
+            for token in tokens:
+                if token not in self._rank:
+                    frequency[token] = frequency.get(token, 0) + 1
+        if not frequency:
+            return
+        start = min(self._rank.values(), default=0) - len(frequency)
+        for position, token in enumerate(sorted(frequency, key=lambda t: (frequency[t], t))):
+            self._rank[token] = start + position
+
+    def _prefix(self, tokens: frozenset[str]) -> list[str]:
+        size = len(tokens)
+        return sorted(tokens, key=self._rank.__getitem__)[: size - ceil(self.similarity * size - _EPS) + 1]
+
+    def _index_member(self, tokens: frozenset[str], token_set: set[str], cluster_id: int) -> None:
+        # A second member with the same tokens in the same cluster can never
+        # change which cluster a later phrase matches, so it is not indexed.
+        if (tokens, cluster_id) in self._indexed:
+            return
+        self._indexed.add((tokens, cluster_id))
+        size = len(tokens)
+        for position, token in enumerate(self._prefix(tokens)):
+            self._index.setdefault(token, {}).setdefault((size, position), {}).setdefault(cluster_id, []).append(token_set)
+
+    def _find(self, tokens: frozenset[str]) -> int | None:
+        similarity = self.similarity
+        if similarity == 0.0:
+            # Every phrase with tokens joins the very first cluster.
+            return 0 if self.clusters else None
+        overlap_ratio = similarity / (1 + similarity)
+        size = len(tokens)
+        target: int | None = None
+        for position, token in enumerate(self._prefix(tokens)):
+            if target == 0:
+                break
+            postings = self._index.get(token)
+            if not postings:
+                continue
+            for (other_size, other_position), by_cluster in postings.items():
+                if min(size, other_size) < similarity * max(size, other_size) - _EPS:
+                    continue
+                required = ceil(overlap_ratio * (size + other_size) - _EPS)
+                if 1 + min(size - position - 1, other_size - other_position - 1) < required:
+                    continue
+                for cluster_id, members in by_cluster.items():
+                    if target is not None and cluster_id >= target:
+                        continue
+                    for other in members:
+                        if _jaccard(tokens, other) >= similarity:
+                            target = cluster_id
+                            break
+        return target
+
+    def _assign(self, phrase: str, tokens: frozenset[str]) -> int:
+        token_set = set(tokens)
+        target = self._find(tokens) if tokens else None
+        if target is None:
+            target = len(self.clusters)
+            self.clusters.append(Cluster([phrase], [token_set]))
+        else:
+            self.clusters[target].add(phrase, token_set)
+        if tokens and self.similarity > 0.0:
+            self._index_member(tokens, token_set, target)
+        return target
+
+
 def cluster_phrases(
     phrases: Iterable[str],
     *,
     similarity: float = 0.5,
     tokenizer: Callable[[str], Iterable[str]] | None = None,
+    workers: int | None = 1,
 ) -> list[Cluster]:
     """Group phrases by Jaccard similarity of token sets.
 
+    Phrases are assigned greedily in input order: a phrase joins the earliest
+    created cluster that has a member with Jaccard index ``>= similarity`` and
+    starts a new cluster otherwise. Candidates come from an inverted token
+    index (see :class:`ClusterIndex`), so only members sharing a rare enough
+    token are ever compared; the result is the same as comparing the phrase
+    with every member of every cluster.
+
     Parameters
     ----------
     phrases:
@@ -240,30 +925,32 @@ def cluster_phrases(
         Minimum Jaccard index (0..1) to join the same cluster.
     tokenizer:
         Optional callable to obtain tokens. Defaults to :func:`tokenize`.
+    workers:
+        Number of processes used to tokenize inputs of at least
+        :data:`PARALLEL_MIN_PHRASES` phrases. ``None`` means
+        ``os.cpu_count()``. The tokenizer must be picklable (a module-level
+        function) to run in worker processes; otherwise it runs inline.
     """
 
-    if similarity <= 0:
-        similarity = 0.0
-    if similarity > 1:
-        similarity = 1.0
-    get_tokens = tokenizer or tokenize
+    index = ClusterIndex(similarity=similarity, tokenizer=tokenizer)
+    index.add_phrases(phrases, workers=workers)
+    return index.clusters
 
-    clusters: list[Cluster] = []
-    for phrase in phrases:
-        tokens = set(get_tokens(phrase))
-        if not tokens:
-            clusters.append(Cluster([phrase], [set()]))
-            continue
-        placed = False
-        for cluster in clusters:
-            best = max(_jaccard(tokens, existing) for existing in cluster.tokens or [set()])
-            if best >= similarity:
-                cluster.add(phrase, tokens)
-                placed = True
-                break
-        if not placed:
-            clusters.append(Cluster([phrase], [tokens]))
-    return clusters
+
+def _tokenize_chunk(chunk: list[str], get_tokens: Callable[[str], Iterable[str]]) -> list[frozenset[str]]:
+    return [frozenset(get_tokens(phrase)) for phrase in chunk]
+
+
+def _tokenize_all(
+    items: list[str],
+    get_tokens: Callable[[str], Iterable[str]],
+    workers: int,
+) -> list[frozenset[str]]:
+    if workers > 1 and len(items) >= PARALLEL_MIN_PHRASES:
+        result = _parallel_map(_tokenize_chunk, _chunked(items, workers), get_tokens)
+        if result is not None:
+            return result
+    return _tokenize_chunk(items, get_tokens)
 
 
 def _jaccard(a: set[str], b: set[str]) -> float:
@@ -0,0 +1,215 @@
+"""
+Связанные фразы из ответов Wordstat API (левая и правая колонки).
+
+Каждый ответ ``/wordstat/api`` кроме ``totalValue`` несёт две колонки:
+ - left  — «Что ещё искали со словом…» (фразы, содержащие маску);
+ - right — «Похожие запросы» (ассоциации).
+Здесь они извлекаются из JSON, пачками пишутся в таблицу ``related_phrases``
+с привязкой к исходной маске и читаются обратно для глубокого парсинга,
+чтобы не отправлять повторные запросы в Wordstat.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import text
+
+from ..core.db import engine
+
+RELATED_KINDS = ("left", "right")
+
+# Ключи, под которыми Wordstat отдаёт колонки (в разных версиях API по-разному)
+_LEFT_KEYS = frozenset({"popular", "topRequests", "leftColumn", "includingPhrases", "searchedWith"})
+_RIGHT_KEYS = frozenset({"associations", "similar", "rightColumn", "relatedQueries", "phrasesAssociations"})
+_PHRASE_KEYS = ("text", "phrase", "query", "word", "searchValue")
+_FREQ_KEYS = ("value", "count", "number", "shows", "frequency")
+
+# (source_mask, region, kind, phrase, freq, position, source)
+RelatedRow = tuple[str, int, str, str, int, int, str]
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        digits = value.replace(" ", "").replace("\xa0", "").replace(",", "")
+        if digits.isdigit():
+            return int(digits)
+    return None
+
+
+def _column_items(items: list) -> Iterator[tuple[str, int]]:
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        phrase = next((item[k] for k in _PHRASE_KEYS if isinstance(item.get(k), str)), None)
+        if not phrase or not phrase.strip():
+            continue
+        freq = next((v for v in (_to_int(item.get(k)) for k in _FREQ_KEYS) if v is not None), 0)
+        yield phrase.strip(), freq
+
+
+def extract_related(payload: Any) -> dict[str, list[tuple[str, int]]]:
+    """Return ``{"left": [(phrase, freq), ...], "right": [...]}`` from an API payload.
+
+    The payload is walked recursively, so both ``data.table.tableData.popular``
+    and flatter layouts are recognised. Unknown structures yield empty columns.
+    """
+    found: dict[str, list[tuple[str, int]]] = {kind: [] for kind in RELATED_KINDS}
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, list) and key in _LEFT_KEYS:
+                    found["left"].extend(_column_items(value))
+                elif isinstance(value, list) and key in _RIGHT_KEYS:
+                    found["right"].extend(_column_items(value))
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(v for v in node if isinstance(v, (dict, list)))
+    return found
+
+
+def related_rows(
+    source_mask: str,
+    region: int,
+    payload: Any,
+    *,
+    source: str = "wordstat_api",
+) -> list[RelatedRow]:
+    """Flatten :func:`extract_related` output into rows for :func:`bulk_store_related`."""
+    mask = (source_mask or "").strip()
+    if not mask:
+        return []
+    rows: list[RelatedRow] = []
+    for kind, items in extract_related(payload).items():
+        for position, (phrase, freq) in enumerate(items):
+            rows.append((mask, int(region), kind, phrase, int(freq), position, source))
+    return rows
+
+
+_UPSERT_RELATED_SQL = text(
+    """
+    INSERT INTO related_phrases
+        (source_mask, region, kind, phrase, freq, position, source, captured_at)
+    VALUES
+        (:source_mask, :region, :kind, :phrase, :freq, :position, :source, :ts)
+    ON CONFLICT(source_mask, region, kind, phrase) DO UPDATE SET
+        freq = excluded.freq,
+        position = excluded.position,
+        source = excluded.source,
+        captured_at = excluded.captured_at
+    """
+)
+
+
+def bulk_store_related(rows: Sequence[RelatedRow]) -> int:
+    """Upsert related phrase rows in one transaction (blocking, use ``asyncio.to_thread``)."""
+    if not rows:
+        return 0
+    ts = datetime.utcnow()
+    params = [
+        {
+            "source_mask": mask,
+            "region": region,
+            "kind": kind,
+            "phrase": phrase,
+            "freq": freq,
+            "position": position,
+            "source": source,
+            "ts": ts,
+        }
+        for mask, region, kind, phrase, freq, position, source in rows
+    ]
+    with engine.begin() as conn:
+        conn.execute(_UPSERT_RELATED_SQL, params)
+    return len(params)
+
+
+def load_related(
+    source_masks: Iterable[str],
+    region: int,
+    *,
+    kinds: Sequence[str] = RELATED_KINDS,
+    min_freq: int = 0,
+) -> dict[str, list[dict]]:
+    """Return stored related phrases grouped by source mask (ordered as captured)."""
+    masks = [m.strip() for m in source_masks if m and m.strip()]
+    if not masks:
+        return {}
+    out: dict[str, list[dict]] = {m: [] for m in masks}
+    sql = text(
+        """
+        SELECT source_mask, kind, phrase, freq, source, captured_at
+        FROM related_phrases
+        WHERE region = :region AND source_mask = :mask AND freq >= :min_freq
+        ORDER BY kind, position
+        """
+    )
+    with engine.connect() as conn:
+        for mask in masks:
+            for row in conn.execute(sql, {"region": region, "mask": mask, "min_freq": min_freq}):
+                if row.kind not in kinds:
+                    continue
+                out[mask].append(
+                    {
+                        "phrase": row.phrase,
+                        "freq": int(row.freq or 0),
+                        "kind": row.kind,
+                        "source": row.source,
+                        "captured_at": row.captured_at,
+                    }
+                )
+    return out
+
+
+def expand_from_cache(
+    seeds: Iterable[str],
+    region: int,
+    *,
+    min_freq_left: int = 0,
+    min_freq_right: int = 0,
+    topk: int = 50,
+) -> tuple[list[str], list[str]]:
+    """Build the next deep-parse level from stored columns.
+
+    Returns ``(candidates, uncached)``: new phrases taken from the left/right
+    columns of already parsed seeds, and the seeds that have nothing stored yet
+    and still need a real Wordstat request.
+    """
+    seed_list = list(dict.fromkeys(s.strip() for s in seeds if s and s.strip()))
+    cached = load_related(seed_list, region)
+    seen = set(seed_list)
+    candidates: list[str] = []
+    uncached: list[str] = []
+    for seed in seed_list:
+        rows = cached.get(seed) or []
+        if not rows:
+            uncached.append(seed)
+            continue
+        taken = 0
+        for row in rows:
+            limit = min_freq_left if row["kind"] == "left" else min_freq_right
+            if row["freq"] < limit or row["phrase"] in seen:
+                continue
+            seen.add(row["phrase"])
+            candidates.append(row["phrase"])
+            taken += 1
+            if taken >= topk:
+                break
+    return candidates, uncached
+
+
+__all__ = [
+    "RELATED_KINDS",
+    "extract_related",
+    "related_rows",
+    "bulk_store_related",
+    "load_related",
+    "expand_from_cache",
+]
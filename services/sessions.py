@@ -13,6 +13,7 @@ from playwright.async_api import async_playwright, BrowserContext
 
 from ..core.db import SessionLocal
 from ..core.models import Account
+from ..workers.waits import wait_for_any
 
 
 SESSION_PROFILES_DIR = Path(".profiles")
@@ -52,7 +53,7 @@ async def create_session_for_account(account_id: int, proxy: Optional[str] = Non
         )
         
         page = context.pages[0] if context.pages else await context.new_page()
-        await page.goto("https://wordstat.yandex.ru/", wait_until="networkidle")
+        await page.goto("https://wordstat.yandex.ru/", wait_until="domcontentloaded")
         
         # Закрываем cookie уведомление если есть
         try:
@@ -129,24 +130,22 @@ async def check_session_status(profile_path: str) -> dict:
             )
             
             page = context.pages[0] if context.pages else await context.new_page()
-            await page.goto("https://wordstat.yandex.ru/", wait_until="networkidle", timeout=30000)
             
-            # Проверяем наличие поля ввода
+            # Ждём либо поле ввода Wordstat, либо редирект на паспорт - что наступит раньше
             input_selectors = [
                 "textarea[placeholder*='Введите']",
                 "textarea",
                 "input[type='text']"
             ]
-            
-            logged_in = False
-            for selector in input_selectors:
-                try:
-                    elem = page.locator(selector).first
-                    if await elem.is_visible(timeout=3000):
-                        logged_in = True
-                        break
-                except:
-                    continue
+            hit = await wait_for_any(
+                page,
+                action=lambda: page.goto("https://wordstat.yandex.ru/", wait_until="domcontentloaded", timeout=30000),
+                url="passport.yandex",
+                selectors=input_selectors,
+                timeout=15000,
+                label=f"session {path.name}",
+            )
+            logged_in = hit == "dom" and "passport." not in page.url
             
             await context.close()
             
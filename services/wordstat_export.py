@@ -0,0 +1,133 @@
+"""
+Streaming parser for Wordstat CSV exports.
+
+An export for one mask lists every phrase containing it with its frequency
+(the same data as the left column). :class:`ExportScanner` consumes the
+response body chunk by chunk and yields all ``(phrase, freq)`` rows in a
+single pass, remembering the mask's own frequency on the way, so the HTTP
+replay can store the whole export instead of one number.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+from typing import AsyncIterable, Iterable, Iterator, Optional
+
+from .related_phrases import RelatedRow
+
+EXPORT_SOURCE = "wordstat_export"
+
+_DELIMITERS = (";", "\t", ",")
+
+
+def _to_freq(value: str) -> Optional[int]:
+    digits = value.replace(" ", "").replace("\xa0", "").replace(",", "").strip()
+    return int(digits) if digits.isdigit() else None
+
+
+class ExportScanner:
+    """Single-pass ``(phrase, freq)`` extractor for one export body.
+
+    Feed raw bytes with :meth:`feed` (or text lines with :meth:`feed_lines`)
+    and call :meth:`close` at the end; each returns the rows completed so far.
+    ``mask_freq`` is the frequency of the row equal to the mask, falling back
+    to the first numeric row like the old two-pass parser did.
+    """
+
+    def __init__(self, mask: str, encoding: str = "utf-8-sig"):
+        self.mask = mask.strip().lower()
+        self.mask_freq: Optional[int] = None
+        self.first_freq: Optional[int] = None
+        self.rows = 0
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._tail = ""
+        self._delimiter: Optional[str] = None
+
+    @property
+    def freq(self) -> Optional[int]:
+        return self.mask_freq if self.mask_freq is not None else self.first_freq
+
+    def feed(self, chunk: bytes) -> list[tuple[str, int]]:
+        text = self._tail + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        self._tail = lines.pop()
+        return list(self.feed_lines(lines))
+
+    def close(self) -> list[tuple[str, int]]:
+        text = self._tail + self._decoder.decode(b"", final=True)
+        self._tail = ""
+        return list(self.feed_lines([text])) if text.strip() else []
+
+    def feed_lines(self, lines: Iterable[str]) -> Iterator[tuple[str, int]]:
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line.strip():
+                continue
+            if self._delimiter is None:
+                self._delimiter = next((d for d in _DELIMITERS if d in line), ";")
+            cells = next(csv.reader([line], delimiter=self._delimiter), [])
+            if len(cells) < 2:
+                continue
+            phrase = cells[0].strip()
+            freq = _to_freq(cells[1])
+            if not phrase or freq is None:
+                # header ("Ключевые фразы;Число запросов") or a non-numeric line
+                continue
+            if self.first_freq is None:
+                self.first_freq = freq
+            if self.mask_freq is None and phrase.lower() == self.mask:
+                self.mask_freq = freq
+            self.rows += 1
+            yield phrase, freq
+
+
+def scan_export_text(csv_text: str, mask: str) -> tuple[Optional[int], list[tuple[str, int]]]:
+    """Parse an already downloaded export. Returns ``(mask_freq, rows)``."""
+    scanner = ExportScanner(mask)
+    rows = list(scanner.feed_lines(csv_text.splitlines()))
+    return scanner.freq, rows
+
+
+async def scan_export_stream(
+    chunks: AsyncIterable[bytes],
+    mask: str,
+) -> tuple[Optional[int], list[tuple[str, int]]]:
+    """Parse an export from an async byte stream (e.g. ``resp.content.iter_chunked``)."""
+    scanner = ExportScanner(mask)
+    rows: list[tuple[str, int]] = []
+    async for chunk in chunks:
+        rows.extend(scanner.feed(chunk))
+    rows.extend(scanner.close())
+    return scanner.freq, rows
+
+
+def export_related_rows(
+    source_mask: str,
+    region: int,
+    rows: Iterable[tuple[str, int]],
+    *,
+    source: str = EXPORT_SOURCE,
+) -> list[RelatedRow]:
+    """Tag export rows with their source mask for :func:`bulk_store_related`.
+
+    Export phrases all contain the mask, so they are stored as the ``left``
+    column; the mask's own row is skipped.
+    """
+    mask = (source_mask or "").strip()
+    if not mask:
+        return []
+    mask_lower = mask.lower()
+    return [
+        (mask, int(region), "left", phrase, int(freq), position, source)
+        for position, (phrase, freq) in enumerate(rows)
+        if phrase.lower() != mask_lower
+    ]
+
+
+__all__ = [
+    "EXPORT_SOURCE",
+    "ExportScanner",
+    "scan_export_text",
+    "scan_export_stream",
+    "export_related_rows",
+]
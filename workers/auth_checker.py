@@ -1,16 +1,112 @@
 """
 Модуль для проверки авторизации через реальный запрос к Wordstat
+
+Сначала дешёвая HTTP-проверка по сохранённым cookies профиля
+(storage_state.json, пишется после успешной браузерной проверки), и только
+если она ничего не решила - полноценный Chromium. Браузеров одновременно
+не больше max_browsers, результаты отдаются по мере готовности.
 """
 
 import asyncio
+import json
+import re
 from playwright.async_api import async_playwright
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from ..utils.proxy import parse_proxy
+from .http_replay import DEFAULT_HEADERS, cookie_header
+
+WORDSTAT_URL = "https://wordstat.yandex.ru/"
+STORAGE_STATE_NAME = "storage_state.json"
+# Флаги авторизации во встроенном состоянии страницы Яндекса
+LOGGED_IN_RE = re.compile(r'"(?:isAuth|isAuthorized|isLoggedIn|logged_?in)"\s*:\s*true', re.I)
+# Больше не читаем: логин и состояние лежат в начале страницы
+PROBE_BODY_LIMIT = 512 * 1024
+
+
+def _login_re(account_name: str) -> re.Pattern:
+    """Логин аккаунта в HTML; Яндекс показывает точки в логине как дефисы"""
+    login = account_name.split("@")[0].strip().lower()
+    variants = {login, login.replace(".", "-"), login.replace("-", ".")}
+    return re.compile(
+        r"(?<![\w.-])(?:%s)(?![\w.-])" % "|".join(re.escape(v) for v in sorted(variants)),
+        re.I,
+    )
 
 
 class AuthChecker:
     """Проверка авторизации аккаунтов через Wordstat"""
     
+    def __init__(self, max_browsers: int = 3, http_concurrency: int = 10, probe_timeout: float = 15.0):
+        self.max_browsers = max(1, max_browsers)
+        self.http_concurrency = max(1, http_concurrency)
+        self.probe_timeout = probe_timeout
+        self._browser_sem: Optional[asyncio.Semaphore] = None
+        self._http_sem: Optional[asyncio.Semaphore] = None
+    
+    async def probe_http(self, account_name: str, profile_path: str,
+                         proxy: Optional[str] = None) -> Optional[Dict[str, any]]:
+        """
+        Быстрая проверка без браузера: GET Wordstat с cookies из storage_state.json
+        
+        Returns:
+            Результат как у check_account_auth или None, если проверка
+            ничего не решила (нет cookies, SOCKS-прокси, капча, сеть).
+            Авторизованным аккаунт считается только при явном признаке на
+            странице: логин аккаунта или флаг авторизации в состоянии.
+        """
+        state_path = Path(profile_path) / STORAGE_STATE_NAME
+        if not state_path.exists():
+            return None
+        try:
+            cookies = json.loads(state_path.read_text(encoding="utf-8")).get("cookies", [])
+        except Exception:
+            return None
+        if not any(c.get("name") == "Session_id" for c in cookies):
+            return None
+        
+        request_kwargs = {}
+        proxy_config = parse_proxy(proxy) if proxy else None
+        if proxy_config:
+            if proxy_config["server"].startswith("socks"):
+                return None
+            request_kwargs["proxy"] = proxy_config["server"]
+            if proxy_config.get("username"):
+                request_kwargs["proxy_auth"] = aiohttp.BasicAuth(
+                    proxy_config["username"], proxy_config.get("password", "")
+                )
+        
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.probe_timeout)
+            async with aiohttp.ClientSession(timeout=timeout, headers=DEFAULT_HEADERS) as session:
+                async with session.get(
+                    WORDSTAT_URL,
+                    headers={"Cookie": cookie_header(cookies, WORDSTAT_URL)},
+                    allow_redirects=False,
+                    **request_kwargs
+                ) as resp:
+                    location = resp.headers.get("Location", "")
+                    body = ""
+                    if resp.status == 200:
+                        raw = await resp.content.read(PROBE_BODY_LIMIT)
+                        body = raw.decode(resp.charset or "utf-8", errors="replace")
+        except Exception as e:
+            print(f"[AuthCheck] {account_name}: HTTP probe failed: {str(e)[:80]}")
+            return None
+        
+        if "passport.yandex" in location:
+            print(f"[AuthCheck] {account_name}: HTTP probe - redirected to login - NOT AUTHORIZED")
+            return {"is_authorized": False, "needs_login": True, "status": "need_login"}
+        if resp.status == 200 and (_login_re(account_name).search(body) or LOGGED_IN_RE.search(body)):
+            print(f"[AuthCheck] {account_name}: HTTP probe - AUTHORIZED")
+            return {"is_authorized": True, "needs_login": False, "status": "authorized"}
+        # 200 без признаков входа (гостевая страница), капча, 403, другие
+        # редиректы - пусть решает браузер
+        return None
+    
     async def check_account_auth(self, account_name: str, profile_path: str, 
                                  proxy: Optional[str] = None) -> Dict[str, any]:
         """
@@ -158,6 +254,13 @@ class AuthChecker:
                         result["needs_login"] = True
                         result["status"] = "error"
             
+            # Сохраняем cookies для следующей дешёвой HTTP-проверки
+            if result["is_authorized"]:
+                try:
+                    await context.storage_state(path=str(Path(profile_path) / STORAGE_STATE_NAME))
+                except Exception as e:
+                    print(f"[AuthCheck] {account_name}: storage_state not saved: {e}")
+            
         except Exception as e:
             print(f"[AuthCheck] {account_name}: Error: {e}")
             result["is_authorized"] = False
@@ -173,32 +276,58 @@ class AuthChecker:
         
         return result
     
-    async def check_multiple_accounts(self, accounts: List[Dict]) -> Dict[str, Dict]:
+    async def check_account(self, acc: Dict) -> Dict[str, any]:
+        """HTTP-проверка, а если она ничего не решила - браузер (не больше max_browsers сразу)"""
+        if self._browser_sem is None:
+            self._browser_sem = asyncio.Semaphore(self.max_browsers)
+            self._http_sem = asyncio.Semaphore(self.http_concurrency)
+        name = acc["name"]
+        profile_path = acc.get("profile_path", f".profiles/{name}")
+        proxy = acc.get("proxy")
+        
+        async with self._http_sem:
+            result = await self.probe_http(name, profile_path, proxy)
+        if result is not None:
+            result["method"] = "http"
+            return result
+        
+        async with self._browser_sem:
+            result = await self.check_account_auth(name, profile_path, proxy)
+        result["method"] = "browser"
+        return result
+    
+    async def iter_check_accounts(self, accounts: List[Dict]) -> AsyncIterator[Tuple[Dict, Dict]]:
+        """Проверить аккаунты, отдавая (аккаунт, результат) по мере готовности"""
+        async def run(acc: Dict) -> Tuple[Dict, Dict]:
+            return acc, await self.check_account(acc)
+        
+        tasks = [asyncio.create_task(run(acc)) for acc in accounts]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def check_multiple_accounts(self, accounts: List[Dict],
+                                      on_result: Optional[Callable[[Dict, Dict], None]] = None) -> Dict[str, Dict]:
         """
-        Проверить несколько аккаунтов параллельно
+        Проверить несколько аккаунтов (параллельность ограничена max_browsers)
         
         Args:
             accounts: список словарей с данными аккаунтов
                      [{"name": "...", "profile_path": "...", "proxy": "..."}, ...]
+            on_result: callback (аккаунт, результат) сразу после каждой проверки
         
         Returns:
             Dict с результатами для каждого аккаунта
         """
-        tasks = []
-        for acc in accounts:
-            task = self.check_account_auth(
-                acc["name"],
-                acc.get("profile_path", f".profiles/{acc['name']}"),
-                acc.get("proxy")
-            )
-            tasks.append(task)
-        
-        results = await asyncio.gather(*tasks)
-        
-        # Создаем словарь результатов
         result_dict = {}
-        for acc, result in zip(accounts, results):
+        async for acc, result in self.iter_check_accounts(accounts):
             result_dict[acc["name"]] = result
+            if on_result:
+                on_result(acc, result)
         
         return result_dict
 
@@ -3,13 +3,39 @@
 Обрабатывает страницу логина как в DirectParser
 """
 
-import asyncio
+import re
 import time
 from typing import Optional, Dict, Any
 from playwright.async_api import Page
 from PySide6.QtWidgets import QInputDialog, QMessageBox
 from PySide6.QtCore import QObject, Signal
 
+from .waits import wait_for_any, wait_for_dom
+
+LOGIN_SELECTORS = [
+    'input[name="login"]',
+    'input[type="email"]',
+    'input[placeholder*="Логин"]',
+    'input[placeholder*="login"]',
+    'input#passp-field-login',
+    'input[data-t="field:input-login"]'
+]
+PASSWORD_SELECTORS = [
+    'input[type="password"]',
+    'input[name="passwd"]',
+    'input#passp-field-passwd',
+    'input[data-t="field:input-passwd"]'
+]
+# URL-шаблоны привязаны к хосту: retpath в адресе паспорта не экранирован и
+# содержит "wordstat.yandex", поэтому поиск подстроки срабатывал сразу
+PASSWORD_STEP_URL = re.compile(r"^https://(passport\.yandex\.\w+/auth/challenge|wordstat\.yandex)")
+AFTER_PASSWORD_URL = re.compile(
+    r"^https://(passport\.yandex\.\w+/auth/(challenge|finish)|id\.yandex|wordstat\.yandex)"
+)
+AFTER_SECRET_URL = re.compile(r"^https://(passport\.yandex\.\w+/auth/finish|id\.yandex|wordstat\.yandex)")
+SECRET_QUESTION_SELECTORS = ['.passp-form-field__hint', '.secret-question__question']
+WORDSTAT_INPUT = ['input[name="words"]', 'textarea', 'input[name="text"]']
+
 class AutoAuthHandler(QObject):
     """Обработчик автоматической авторизации в Яндекс"""
     
@@ -81,38 +107,40 @@ class AutoAuthHandler(QObject):
         print(f"[AUTH] Начинаем авторизацию для {login}")
         
         try:
-            # Ждем загрузки страницы
-            await page.wait_for_load_state('networkidle', timeout=10000)
+            # Ждем появления формы (логин или сразу пароль)
+            await wait_for_dom(page, LOGIN_SELECTORS + PASSWORD_SELECTORS, timeout=10000, label=f"auth {login}: form")
             
             # Шаг 1: Вводим логин
             login_input = await self._find_login_input(page)
             if login_input:
                 await login_input.fill(login)
-                await page.wait_for_timeout(500)
                 
-                # Нажимаем кнопку "Войти" или Enter
+                # Нажимаем кнопку "Войти" или Enter и ждем поле пароля
                 submit_button = await page.query_selector('button[type="submit"], button:has-text("Войти")')
-                if submit_button:
-                    await submit_button.click()
-                else:
-                    await login_input.press('Enter')
-                    
-                await page.wait_for_timeout(2000)
+                await wait_for_any(
+                    page,
+                    action=submit_button.click if submit_button else (lambda: login_input.press('Enter')),
+                    selectors=PASSWORD_SELECTORS,
+                    url=PASSWORD_STEP_URL,
+                    timeout=10000,
+                    label=f"auth {login}: password form",
+                )
                 
             # Шаг 2: Вводим пароль
             password_input = await self._find_password_input(page)
             if password_input:
                 await password_input.fill(password)
-                await page.wait_for_timeout(500)
                 
-                # Нажимаем войти
+                # Нажимаем войти и ждем результат: возврат, challenge или секретный вопрос
                 submit_button = await page.query_selector('button[type="submit"], button:has-text("Войти")')
-                if submit_button:
-                    await submit_button.click()
-                else:
-                    await password_input.press('Enter')
-                    
-                await page.wait_for_timeout(3000)
+                await wait_for_any(
+                    page,
+                    action=submit_button.click if submit_button else (lambda: password_input.press('Enter')),
+                    url=AFTER_PASSWORD_URL,
+                    selectors=SECRET_QUESTION_SELECTORS,
+                    timeout=15000,
+                    label=f"auth {login}: after password",
+                )
                 
             # Шаг 3: Проверяем секретный вопрос
             secret_question = await self._check_secret_question(page)
@@ -129,8 +157,6 @@ class AutoAuthHandler(QObject):
                     return False
                     
             # Проверяем успешность авторизации
-            await page.wait_for_timeout(2000)
-            
             if await self._check_auth_success(page):
                 print(f"[AUTH] Авторизация успешна для {login}")
                 self.auth_completed.emit(login)
@@ -146,16 +172,7 @@ class AutoAuthHandler(QObject):
             
     async def _find_login_input(self, page: Page) -> Optional[Any]:
         """Находит поле ввода логина"""
-        selectors = [
-            'input[name="login"]',
-            'input[type="email"]',
-            'input[placeholder*="Логин"]',
-            'input[placeholder*="login"]',
-            'input#passp-field-login',
-            'input[data-t="field:input-login"]'
-        ]
-        
-        for selector in selectors:
+        for selector in LOGIN_SELECTORS:
             element = await page.query_selector(selector)
             if element:
                 return element
@@ -163,14 +180,7 @@ class AutoAuthHandler(QObject):
         
     async def _find_password_input(self, page: Page) -> Optional[Any]:
         """Находит поле ввода пароля"""
-        selectors = [
-            'input[type="password"]',
-            'input[name="passwd"]',
-            'input#passp-field-passwd',
-            'input[data-t="field:input-passwd"]'
-        ]
-        
-        for selector in selectors:
+        for selector in PASSWORD_SELECTORS:
             element = await page.query_selector(selector)
             if element:
                 return element
@@ -207,14 +217,16 @@ class AutoAuthHandler(QObject):
         answer_input = await page.query_selector('input[name="question"], input[name="answer"], input[type="text"]')
         if answer_input:
             await answer_input.fill(answer)
-            await page.wait_for_timeout(500)
             
-            # Отправляем
+            # Отправляем и ждем ухода со страницы вопроса
             submit_button = await page.query_selector('button[type="submit"], button:has-text("Продолжить")')
-            if submit_button:
-                await submit_button.click()
-            else:
-                await answer_input.press('Enter')
+            await wait_for_any(
+                page,
+                action=submit_button.click if submit_button else (lambda: answer_input.press('Enter')),
+                url=AFTER_SECRET_URL,
+                timeout=15000,
+                label="auth: secret answer",
+            )
                 
     async def _check_auth_success(self, page: Page) -> bool:
         """Проверяет успешность авторизации"""
@@ -258,8 +270,13 @@ class AutoAuthHandler(QObject):
         
         if success:
             # Возвращаемся на Wordstat
-            await page.goto("https://wordstat.yandex.ru/?region=225", wait_until='networkidle')
-            await page.wait_for_timeout(2000)
+            await wait_for_dom(
+                page,
+                WORDSTAT_INPUT,
+                action=lambda: page.goto("https://wordstat.yandex.ru/?region=225", wait_until='domcontentloaded'),
+                timeout=15000,
+                label="auth: back to wordstat",
+            )
             return True
         else:
             return False
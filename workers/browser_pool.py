@@ -0,0 +1,369 @@
+"""
+Пул тёплых браузерных контекстов (keep_context из runner.yaml)
+
+Один Playwright на пул, один persistent context на профиль аккаунта.
+Контексты не закрываются между задачами: раннер берёт контекст в аренду через
+``async with pool.lease(profile_path, proxy=...)``, а по выходу он возвращается
+в пул уже залогиненным и с открытым Wordstat. Фоновая задача проверяет
+здоровье простаивающих контекстов и перезапускает/закрывает их по TTL.
+
+Пул живёт, пока жив его владелец, и закрывается через ``stop()`` или
+``async with``: иначе остаются процесс Playwright и SingletonLock профиля.
+Между задачами пул держит ``BrowserPoolHost``: свой event loop в фоновом
+потоке, задачи запускаются через ``shared_pool_host().run(...)``, а
+закрывается всё при выходе из приложения.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from playwright.async_api import async_playwright, BrowserContext, Page, Playwright
+
+from ..core.settings import ConfigError, RunnerConfig, load_runner_config
+from ..utils.proxy import parse_proxy
+
+WORDSTAT_URL = "https://wordstat.yandex.ru/"
+
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-background-timer-throttling',
+]
+
+
+@dataclass
+class PooledContext:
+    """Persistent context одного профиля и его статистика"""
+
+    key: str
+    profile_path: str
+    proxy: Optional[str]
+    headless: bool
+    context: BrowserContext
+    created_at: float = field(default_factory=time.monotonic)
+    last_used_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def leased(self) -> bool:
+        return self.lock.locked()
+
+    async def page(self) -> Page:
+        """Первая живая вкладка контекста (или новая)"""
+        for page in self.context.pages:
+            if not page.is_closed():
+                return page
+        return await self.context.new_page()
+
+
+class BrowserPool:
+    """Долгоживущий пул persistent context'ов с арендой для раннеров"""
+
+    def __init__(
+        self,
+        *,
+        keep_context: bool = True,
+        headless: bool = True,
+        idle_ttl: float = 600.0,
+        max_age: float = 3600.0,
+        max_uses: int = 500,
+        check_interval: float = 60.0,
+        warm_url: Optional[str] = WORDSTAT_URL,
+    ):
+        self.keep_context = keep_context
+        self.headless = headless
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.check_interval = check_interval
+        self.warm_url = warm_url
+        self._playwright: Optional[Playwright] = None
+        self._entries: dict[str, PooledContext] = {}
+        self._guard = asyncio.Lock()
+        self._janitor: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_runner_config(cls, config: RunnerConfig, **kwargs) -> "BrowserPool":
+        kwargs.setdefault("keep_context", config.keep_context)
+        kwargs.setdefault("headless", config.headless)
+        return cls(**kwargs)
+
+    # ------------------------------------------------------------------
+    # Жизненный цикл
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        if self.keep_context and self._janitor is None:
+            self._janitor = asyncio.create_task(self._run_janitor())
+
+    async def stop(self):
+        """Закрыть все контексты и остановить Playwright"""
+        if self._janitor is not None:
+            self._janitor.cancel()
+            try:
+                await self._janitor
+            except asyncio.CancelledError:
+                pass
+            self._janitor = None
+        for entry in list(self._entries.values()):
+            await self._close_entry(entry, "pool stop")
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self) -> "BrowserPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def warm(self, profiles: list[tuple[str, Optional[str]]]):
+        """Заранее поднять контексты для списка (profile_path, proxy)"""
+        for profile_path, proxy in profiles:
+            async with self.lease(profile_path, proxy=proxy):
+                pass
+
+    # ------------------------------------------------------------------
+    # Аренда
+    # ------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        profile_path: str,
+        *,
+        proxy: Optional[str] = None,
+        headless: Optional[bool] = None,
+    ) -> AsyncIterator[PooledContext]:
+        """Взять контекст профиля в эксклюзивное пользование на время блока"""
+        await self.start()
+        use_headless = self.headless if headless is None else headless
+        key = str(Path(profile_path).absolute())
+
+        entry = await self._get_or_launch(key, profile_path, proxy, use_headless)
+        await entry.lock.acquire()
+        # Захваченная блокировка; None, пока мы между контекстами
+        held: Optional[PooledContext] = entry
+        try:
+            if not await self._is_healthy(entry):
+                await self._close_entry(entry, "unhealthy before lease")
+                held = None
+                entry.lock.release()
+                entry = await self._get_or_launch(key, profile_path, proxy, use_headless)
+                await entry.lock.acquire()
+                held = entry
+            entry.uses += 1
+            entry.last_used_at = time.monotonic()
+            yield entry
+        finally:
+            if held is not None:
+                held.last_used_at = time.monotonic()
+                if not self.keep_context or held.uses >= self.max_uses:
+                    await self._close_entry(held, "keep_context off" if not self.keep_context else "max uses")
+                held.lock.release()
+
+    async def _get_or_launch(
+        self,
+        key: str,
+        profile_path: str,
+        proxy: Optional[str],
+        headless: bool,
+    ) -> PooledContext:
+        async with self._guard:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Профиль нельзя открыть дважды: занятый контекст ждём как есть
+                if entry.leased or (entry.proxy == proxy and entry.headless == headless):
+                    return entry
+                await self._close_entry(entry, "settings changed")
+            entry = await self._launch(key, profile_path, proxy, headless)
+            self._entries[key] = entry
+            return entry
+
+    async def _launch(self, key: str, profile_path: str, proxy: Optional[str], headless: bool) -> PooledContext:
+        context = await self._playwright.chromium.launch_persistent_context(
+            str(Path(profile_path)),
+            headless=headless,
+            args=BROWSER_ARGS,
+            viewport={"width": 1600, "height": 1200},
+            proxy=parse_proxy(proxy) if proxy else None,
+        )
+        entry = PooledContext(
+            key=key,
+            profile_path=profile_path,
+            proxy=proxy,
+            headless=headless,
+            context=context,
+        )
+        if self.warm_url:
+            try:
+                page = await entry.page()
+                await page.goto(self.warm_url, wait_until="domcontentloaded", timeout=30000)
+            except Exception as e:
+                print(f"[POOL] {Path(profile_path).name}: прогрев не удался: {e}")
+        print(f"[POOL] Запущен контекст {Path(profile_path).name}")
+        return entry
+
+    # ------------------------------------------------------------------
+    # Здоровье и переработка
+    # ------------------------------------------------------------------
+
+    async def _is_healthy(self, entry: PooledContext) -> bool:
+        try:
+            page = await entry.page()
+            await asyncio.wait_for(page.evaluate("1"), timeout=5)
+        except Exception:
+            return False
+        return "passport." not in page.url
+
+    async def _close_entry(self, entry: PooledContext, reason: str):
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        try:
+            await entry.context.close()
+        except Exception:
+            pass
+        print(f"[POOL] Закрыт контекст {Path(entry.profile_path).name}: {reason}")
+
+    async def _run_janitor(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            now = time.monotonic()
+            for entry in list(self._entries.values()):
+                if entry.leased:
+                    continue
+                if now - entry.last_used_at > self.idle_ttl:
+                    await self._close_entry(entry, "idle")
+                elif now - entry.created_at > self.max_age:
+                    await self._close_entry(entry, "max age")
+                elif not await self._is_healthy(entry):
+                    await self._close_entry(entry, "health check failed")
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "profile": Path(e.profile_path).name,
+                "leased": e.leased,
+                "uses": e.uses,
+                "age_sec": round(now - e.created_at, 1),
+                "idle_sec": round(now - e.last_used_at, 1),
+            }
+            for e in self._entries.values()
+        ]
+
+
+def default_browser_pool() -> BrowserPool:
+    """Новый (не запущенный) пул с настройками из runner.yaml; закрывает вызывающий"""
+    try:
+        return BrowserPool.from_runner_config(load_runner_config())
+    except ConfigError:
+        return BrowserPool()
+
+
+T = TypeVar("T")
+
+
+class BrowserPoolHost:
+    """
+    Долгоживущий пул на собственном event loop в фоновом потоке
+
+    Playwright привязан к event loop, а задачи приложения идут каждая в своём
+    потоке и asyncio.run. Хост держит один loop и один BrowserPool между
+    задачами (keep_context из runner.yaml работает от задачи к задаче) и
+    закрывает их только в ``shutdown()``.
+    """
+
+    def __init__(self, factory: Callable[[], BrowserPool] = default_browser_pool):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.pool: Optional[BrowserPool] = None
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+                self.pool = self._factory()
+            return self._loop
+
+    def run(self, job: Callable[[BrowserPool], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Выполнить ``job(pool)`` на loop хоста и дождаться результата (из любого потока)"""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(job(self.pool), loop).result(timeout)
+
+    def shutdown(self, timeout: float = 30.0):
+        """Закрыть пул и остановить loop; следующий run() поднимет их заново"""
+        with self._lock:
+            loop, thread, pool = self._loop, self._thread, self.pool
+            self._loop = self._thread = self.pool = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(pool.stop(), loop).result(timeout)
+        except Exception as e:
+            print(f"[POOL] Остановка пула: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+
+
+_HOST: Optional[BrowserPoolHost] = None
+_HOST_LOCK = threading.Lock()
+
+
+def shared_pool_host() -> BrowserPoolHost:
+    """Общий хост пула приложения (закрывается shutdown_shared_pool_host или при выходе)"""
+    global _HOST
+    with _HOST_LOCK:
+        if _HOST is None:
+            _HOST = BrowserPoolHost()
+            atexit.register(_HOST.shutdown)
+        return _HOST
+
+
+def shutdown_shared_pool_host():
+    if _HOST is not None:
+        _HOST.shutdown()
+
+
+def current_host_pool() -> Optional[BrowserPool]:
+    """Пул общего хоста, если код выполняется на его loop (иначе None)"""
+    host = _HOST
+    if host is None or host.loop is None:
+        return None
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    return host.pool if running is host.loop else None
+
+
+__all__ = [
+    "BrowserPool",
+    "BrowserPoolHost",
+    "PooledContext",
+    "current_host_pool",
+    "default_browser_pool",
+    "shared_pool_host",
+    "shutdown_shared_pool_host",
+]
@@ -7,18 +7,53 @@ from __future__ import annotations
 import asyncio
 import json
 import re
-import csv
-import io
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
-from urllib.parse import quote
+from typing import AsyncIterator, Optional
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
 
+import aiohttp
 from playwright.async_api import async_playwright, Page, Response
-import requests
 
+from ..core.batch_writer import AsyncBatchWriter
 from ..core.db import SessionLocal
 from ..core.models import Account, FrequencyResult
+from ..services.frequency import bulk_upsert_frequencies
+from ..services.related_phrases import bulk_store_related
+from ..services.wordstat_export import export_related_rows, scan_export_stream, scan_export_text
+from .browser_pool import BrowserPool, current_host_pool, shared_pool_host
+from .cookie_pool import CookieSessionPool, CookieSource, sources_from_accounts
+from .http_replay import AdaptivePacer, cookie_header, new_http_session
+from .xhr_recipes import RecipeReplayer, RecipeStore, XhrRecipe, templatize
+
+# Рецепт экспорта Wordstat в data/xhr_recipes.json: с ним захват через UI не нужен
+WORDSTAT_EXPORT_RECIPE = "wordstat_export"
+# capture_export_url открывает маску в этом регионе
+CAPTURE_REGION = 225
+
+
+def _export_url_for_mask(export_url: str, mask: str) -> str:
+    """URL экспорта для маски: меняется только значение параметра words"""
+    if "{q}" in export_url:
+        return export_url.replace("{q}", quote(mask))
+    parts = urlsplit(export_url)
+    query = [(key, mask if key == "words" else value)
+             for key, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
+
+
+def export_recipe(export_url: str, mask: str) -> Optional[XhrRecipe]:
+    """Рецепт из пойманного URL экспорта; None, если маски в URL не нашлось"""
+    template, found = templatize(export_url, {"q": mask, "region": str(CAPTURE_REGION)})
+    if "q" not in found:
+        return None
+    return XhrRecipe(
+        name=WORDSTAT_EXPORT_RECIPE,
+        method="GET",
+        url_template=template,
+        response_kind="csv",
+        placeholders=found,
+    )
 
 
 class CDPFrequencyParser:
@@ -37,7 +72,7 @@ class CDPFrequencyParser:
         self.cdp_url = cdp_url
         self.captured_data = []
         self.export_url_template = None
-        self.session: Optional[requests.Session] = None
+        self.cookies: Optional[list[dict]] = None
     
     async def init_connection(self):
         """Подключаемся к уже запущенному Chrome"""
@@ -84,7 +119,7 @@ class CDPFrequencyParser:
         # Пробуем первую маску и жмём "Скачать"
         if masks_sample:
             mask = masks_sample[0]
-            await page.goto(f"https://wordstat.yandex.ru/?words={quote(mask)}&regions=225")
+            await page.goto(f"https://wordstat.yandex.ru/?words={quote(mask)}&regions={CAPTURE_REGION}")
             await asyncio.sleep(2)
             
             # Ищем кнопку "Скачать"
@@ -100,70 +135,125 @@ class CDPFrequencyParser:
     
     def build_http_session(self, context_cookies):
         """
-        Создаём HTTP сессию с теми же cookies что в браузере
-        Для реплея запросов БЕЗ UI
+        Запоминаем cookies браузера для HTTP-реплея БЕЗ UI
+        (сама aiohttp-сессия создаётся внутри реплея, в его event loop)
         """
-        session = requests.Session()
-        
-        for cookie in context_cookies:
-            session.cookies.set(
-                cookie["name"],
-                cookie["value"],
-                domain=cookie.get("domain", "yandex.ru"),
-                path=cookie.get("path", "/")
-            )
-        
-        session.headers.update({
-            "Accept": "*/*",
-            "Accept-Language": "ru-RU,ru;q=0.9",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Referer": "https://wordstat.yandex.ru/"
-        })
-        
-        return session
+        self.cookies = list(context_cookies)
+        return self.cookies
     
-    def replay_export_http(self, masks: list[str], export_url_template: str, region: int = 225) -> list[dict]:
-        """
-        Реплеим запрос экспорта для каждой маски через HTTP
-        БЕЗ браузера! В 10 раз быстрее!
+    async def _fetch_export(
+        self,
+        http: aiohttp.ClientSession,
+        url: str,
+        mask: str,
+        headers: dict,
+        request_kwargs: Optional[dict] = None,
+    ) -> tuple[str, Optional[int], list]:
+        """Один запрос экспорта: (статус, частота маски, все строки CSV)"""
+        async with http.get(url, headers=headers, **(request_kwargs or {})) as resp:
+            if "showcaptcha" in str(resp.url):
+                return "captcha", None, []
+            if resp.status in (401, 403):
+                return "auth", None, []
+            if resp.status == 429 or resp.status >= 500:
+                return "throttled", None, []
+            if resp.status != 200 or "csv" not in resp.headers.get("content-type", ""):
+                return f"http {resp.status}", None, []
+            # CSV читаем потоком, за один проход, сохраняя все фразы
+            freq, rows = await scan_export_stream(resp.content.iter_chunked(64 * 1024), mask)
+            return ("ok" if freq else "no freq"), freq, rows
+    
+    async def iter_replay_export(
+        self,
+        masks: list[str],
+        export_url_template: str,
+        region: int = 225,
+        *,
+        concurrency: int = 4,
+        max_retries: int = 2,
+        pacer: Optional[AdaptivePacer] = None,
+        session_pool: Optional[CookieSessionPool] = None,
+    ) -> AsyncIterator[dict]:
         """
-        import time
-        import random
+        Реплеим экспорт для всех масок через aiohttp и отдаём результаты
+        по мере готовности: {"mask", "freq", "region", "status", "rows"},
+        где rows - все (фраза, частота) из CSV этой маски
         
-        if not self.session:
+        Параллельность и паузы - через AdaptivePacer на эти cookies:
+        успехи ускоряют, 429/5xx замедляют, капча сразу даёт максимум паузы.
+        С session_pool запросы ротируются по аккаунтам пула (у каждого свой
+        темп и прокси), а капча/401/403 переводят маску на другой аккаунт.
+        """
+        if self.cookies is None and session_pool is None:
             raise RuntimeError("HTTP session not initialized")
         
-        results = []
+        pacer = pacer or AdaptivePacer(concurrency=concurrency)
+        queue: asyncio.Queue = asyncio.Queue()
         
-        for idx, mask in enumerate(masks, 1):
-            # Подставляем маску в URL
-            url = export_url_template.replace("{q}", quote(mask))
-            url = re.sub(r'words=[^&]*', f'words={quote(mask)}', url)
-            
+        async def attempt(http: aiohttp.ClientSession, url: str, mask: str) -> tuple[str, Optional[int], list]:
+            if session_pool is not None:
+                async with session_pool.lease() as sess:
+                    try:
+                        result = await self._fetch_export(http, url, mask, sess.headers(url), sess.request_kwargs())
+                    except Exception as e:
+                        result = (f"error: {str(e)[:80]}", None, [])
+                session_pool.report(sess, result[0])
+                return result
             try:
-                resp = self.session.get(url, timeout=30)
-                
-                if resp.status_code == 200 and "csv" in resp.headers.get("content-type", ""):
-                    # Парсим CSV
-                    freq = self._parse_csv_response(resp.text, mask)
-                    if freq:
-                        results.append({
-                            "mask": mask,
-                            "freq": freq,
-                            "region": region
-                        })
-                        print(f"[HTTP] [{idx}/{len(masks)}] {mask}: {freq:,}")
-                    else:
-                        print(f"[HTTP] [{idx}/{len(masks)}] {mask}: частота не найдена в CSV")
-                else:
-                    print(f"[HTTP] [{idx}/{len(masks)}] {mask}: ошибка {resp.status_code}")
-                
-                # Пауза между запросами (синхронный sleep!)
-                time.sleep(random.uniform(2.0, 3.5))
-            
+                async with pacer:
+                    result = await self._fetch_export(http, url, mask, {"Cookie": cookie_header(self.cookies, url)})
             except Exception as e:
-                print(f"[HTTP] [{idx}/{len(masks)}] {mask}: {e}")
+                result = (f"error: {str(e)[:80]}", None, [])
+            status = result[0]
+            if status == "ok":
+                pacer.on_success()
+            elif status in ("captcha", "auth"):
+                pacer.on_captcha()
+            elif status == "throttled" or status.startswith("error"):
+                pacer.on_throttle()
+            return result
+        
+        async def run_one(http: aiohttp.ClientSession, mask: str):
+            url = _export_url_for_mask(export_url_template, mask)
+            status, freq, rows = "error", None, []
+            retryable = ("throttled", "captcha", "auth") if session_pool is not None else ("throttled",)
+            for _ in range(max_retries + 1):
+                try:
+                    status, freq, rows = await attempt(http, url, mask)
+                except RuntimeError as e:
+                    # в пуле не осталось живых сессий
+                    status = f"error: {e}"
+                    break
+                if status in retryable or status.startswith("error"):
+                    continue
+                break
+            await queue.put({"mask": mask, "freq": freq, "region": region, "status": status, "rows": rows})
         
+        sessions = session_pool.active_count() if session_pool is not None else 1
+        async with new_http_session(limit_per_host=max(pacer.concurrency * 2 * sessions, 8)) as http:
+            tasks = [asyncio.create_task(run_one(http, mask)) for mask in masks]
+            try:
+                for _ in range(len(tasks)):
+                    yield await queue.get()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def replay_export_http(self, masks: list[str], export_url_template: str, region: int = 225, **kwargs) -> list[dict]:
+        """
+        Реплеим запрос экспорта для каждой маски через HTTP
+        БЕЗ браузера! Возвращает только успешные результаты.
+        """
+        results = []
+        done = 0
+        async for item in self.iter_replay_export(masks, export_url_template, region, **kwargs):
+            done += 1
+            if item["status"] == "ok":
+                results.append(item)
+                print(f"[HTTP] [{done}/{len(masks)}] {item['mask']}: {item['freq']:,}")
+            else:
+                print(f"[HTTP] [{done}/{len(masks)}] {item['mask']}: {item['status']}")
         return results
     
     async def _parse_frequency_from_page(self, page: Page, mask: str) -> Optional[int]:
@@ -210,40 +300,9 @@ class CDPFrequencyParser:
         return None
     
     def _parse_csv_response(self, csv_text: str, mask: str) -> Optional[int]:
-        """Парсит CSV от Wordstat и извлекает частоту"""
-        try:
-            reader = csv.reader(io.StringIO(csv_text), delimiter=";")
-            mask_norm = mask.lower().strip()
-            
-            for row in reader:
-                if not row or len(row) < 2:
-                    continue
-                
-                phrase = row[0].lower().strip()
-                
-                # Пропускаем заголовки
-                if "ключев" in phrase or "фраз" in phrase:
-                    continue
-                
-                # Ищем точное совпадение с маской
-                if phrase == mask_norm:
-                    # Частота обычно во 2-й колонке
-                    freq_str = row[1].replace(" ", "").replace(",", "").replace('\xa0', '')
-                    if freq_str.isdigit():
-                        return int(freq_str)
-            
-            # Если точного совпадения нет, берём первую строку с числом
-            reader = csv.reader(io.StringIO(csv_text), delimiter=";")
-            for row in reader:
-                if len(row) >= 2:
-                    freq_str = row[1].replace(" ", "").replace(",", "").replace('\xa0', '')
-                    if freq_str.isdigit():
-                        return int(freq_str)
-        
-        except Exception:
-            pass
-        
-        return None
+        """Парсит CSV от Wordstat и извлекает частоту маски"""
+        freq, _ = scan_export_text(csv_text, mask)
+        return freq
 
 
 async def parse_with_cdp(
@@ -251,7 +310,10 @@ async def parse_with_cdp(
     masks: list[str],
     region: int = 225,
     cdp_url: str = "http://localhost:9222",
-    on_progress: callable = None
+    on_progress: callable = None,
+    concurrency: int = 4,
+    rotate_accounts: bool = False,
+    pool: Optional[BrowserPool] = None,
 ) -> dict:
     """
     Главная функция - парсинг через CDP
@@ -262,6 +324,10 @@ async def parse_with_cdp(
         region: Регион
         cdp_url: URL CDP (порт Chrome)
         on_progress: Callback прогресса
+        concurrency: Параллельных HTTP-запросов на cookies аккаунта
+        rotate_accounts: Реплеить с cookies всех рабочих аккаунтов (каждый через свой прокси)
+        pool: Долгоживущий пул браузеров для UI-фолбэка и сбора cookies
+            (по умолчанию - пул общего хоста, если вызов идёт на его loop)
     
     Returns:
         Статистика парсинга
@@ -287,7 +353,12 @@ async def parse_with_cdp(
                 ))
         session.commit()
     
+    from .session_frequency_runner import parse_frequency_with_session
+    
+    pool = pool or current_host_pool()
     parser = CDPFrequencyParser(cdp_url)
+    recipes = RecipeStore()
+    recipe = recipes.get(WORDSTAT_EXPORT_RECIPE)
     
     async with async_playwright() as p:
         # Подключаемся к запущенному Chrome
@@ -295,51 +366,72 @@ async def parse_with_cdp(
         context = browser.contexts[0]
         page = context.pages[0] if context.pages else await context.new_page()
         
-        # Шаг 1: Ловим URL экспорта на первой маске
-        print("[CDP] Захват URL экспорта...")
-        export_url = await parser.capture_export_url(page, masks[:1])
+        if recipe is None:
+            # Шаг 1: рецепта нет или он протух - ловим URL экспорта на первой маске
+            print("[CDP] Захват URL экспорта...")
+            export_url = await parser.capture_export_url(page, masks[:1])
+            recipe = export_recipe(export_url, masks[0]) if export_url else None
+            if recipe is None:
+                print("[CDP] Не удалось поймать URL экспорта. Парсим через UI...")
+                # Fallback на обычный парсинг через UI
+                return await parse_frequency_with_session(account_id, masks, region, False, on_progress, pool=pool)
+            recipes.put(recipe)
+            print(f"[CDP] URL экспорта: {export_url}")
+        else:
+            print(f"[CDP] Рецепт {WORDSTAT_EXPORT_RECIPE} из {recipes.path.name}, захват не нужен")
         
-        if not export_url:
-            print("[CDP] Не удалось поймать URL экспорта. Парсим через UI...")
-            # Fallback на обычный парсинг через UI
-            from .session_frequency_runner import parse_frequency_with_session
-            return await parse_frequency_with_session(account_id, masks, region, False, on_progress)
-        
-        print(f"[CDP] URL экспорта: {export_url}")
-        
-        # Шаг 2: Строим HTTP сессию с теми же cookies
-        cookies = await context.cookies()
-        parser.session = parser.build_http_session(cookies)
+        # Шаг 2: Cookies этого Chrome для HTTP-реплея
+        cookies = parser.build_http_session(await context.cookies())
         
         await browser.close()
     
-    # Шаг 3: Реплеим через HTTP (БЕЗ браузера!)
+    # Шаг 3: Реплеим через HTTP (БЕЗ браузера!), результаты пишем пачками по мере готовности
     print(f"[HTTP] Начинаю реплей для {len(masks)} масок...")
-    results = parser.replay_export_http(masks, export_url, region)
-    
-    # Шаг 4: Записываем в БД
     stats = {"success": 0, "failed": 0}
     
-    for result in results:
-        try:
-            with SessionLocal() as session:
-                freq_result = session.query(FrequencyResult).filter(
-                    FrequencyResult.mask == result["mask"],
-                    FrequencyResult.region == region
-                ).first()
-                
-                if freq_result:
-                    freq_result.status = "ok"
-                    freq_result.freq_total = result["freq"]
-                    freq_result.updated_at = datetime.utcnow()
-                    session.commit()
-                    stats["success"] += 1
-                    
-                    if on_progress:
-                        on_progress(result["mask"], result["freq"], stats["success"], len(masks))
-        except Exception as e:
-            print(f"[DB] Ошибка записи {result['mask']}: {e}")
-            stats["failed"] += 1
+    session_pool = None
+    if rotate_accounts:
+        sources = [CookieSource(name="cdp", cdp_url=cdp_url)] + sources_from_accounts()
+        session_pool = await CookieSessionPool(
+            sources, concurrency_per_session=concurrency, browser_pool=pool
+        ).start()
+    
+    replayer = RecipeReplayer(
+        recipe, cookies=cookies, session_pool=session_pool, store=recipes, concurrency=concurrency
+    )
+    stale_masks: list[str] = []
+    writer = AsyncBatchWriter(bulk_upsert_frequencies, name="cdp")
+    related_writer = AsyncBatchWriter(bulk_store_related, max_batch=2000, name="cdp_export")
+    try:
+        async with writer, related_writer:
+            async for result in replayer.iter_replay([{"q": mask, "region": region} for mask in masks]):
+                mask, status = result["values"]["q"], result["status"]
+                if status == "stale":
+                    # Рецепт протух: эти маски доделает браузер
+                    stale_masks.append(mask)
+                    continue
+                freq, rows = scan_export_text(result["data"], mask) if status == "ok" else (None, [])
+                if not freq:
+                    stats["failed"] += 1
+                    print(f"[HTTP] {mask}: {status if status != 'ok' else 'no freq'}")
+                    continue
+                writer.add((mask, region, freq))
+                # Весь экспорт маски - в related_phrases с привязкой к маске
+                related_writer.extend(export_related_rows(mask, region, rows))
+                stats["success"] += 1
+                if on_progress:
+                    on_progress(mask, freq, stats["success"], len(masks))
+    finally:
+        if session_pool is not None:
+            await session_pool.stop()
+    
+    if stale_masks:
+        print(f"[CDP] Рецепт экспорта устарел, {len(stale_masks)} масок - через UI")
+        fallback = await parse_frequency_with_session(
+            account_id, stale_masks, region, False, on_progress, pool=pool
+        )
+        stats["success"] += fallback.get("success", 0)
+        stats["failed"] += fallback.get("failed", 0)
     
     # Обновляем last_used_at аккаунта
     with SessionLocal() as session:
@@ -349,3 +441,13 @@ async def parse_with_cdp(
             session.commit()
     
     return stats
+
+
+def run_with_cdp(account_id: int, masks: list[str], **kwargs) -> dict:
+    """
+    Блокирующий запуск parse_with_cdp (из QThread или скрипта) на общем хосте пула
+
+    Браузерные контексты остаются тёплыми между задачами; закрывает их
+    shutdown_shared_pool_host() при выходе из приложения.
+    """
+    return shared_pool_host().run(lambda pool: parse_with_cdp(account_id, masks, pool=pool, **kwargs))
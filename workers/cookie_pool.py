@@ -0,0 +1,312 @@
+"""
+Сбор cookies со всех аккаунтов и ротация HTTP-сессий для реплея
+
+Раньше весь HTTP-реплей шёл с cookies одного браузерного контекста, и этот
+аккаунт быстро упирался в лимиты. Здесь:
+ - harvest_cookies   — забирает cookies из профиля (через BrowserPool),
+                       CDP-эндпоинта или файла storage_state;
+ - CookieSessionPool — пул HTTP-сессий «cookies + прокси аккаунта» с
+                       ротацией; на 401/403/капче сессия выводится из
+                       оборота и в фоне обновляется из браузера.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import aiohttp
+from playwright.async_api import async_playwright
+
+from ..core.db import SessionLocal
+from ..core.models import Account
+from ..utils.proxy import parse_proxy
+from .browser_pool import BrowserPool, current_host_pool, default_browser_pool
+from .http_replay import AdaptivePacer, cookie_header
+
+# Cookie авторизации Яндекса: без неё Wordstat отдаёт страницу логина
+AUTH_COOKIE = "Session_id"
+
+# Статусы ответа, после которых сессию нельзя использовать
+RETIRE_STATUSES = ("captcha", "auth")
+
+
+@dataclass
+class CookieSource:
+    """Откуда брать cookies аккаунта (ровно одно из profile_path / cdp_url / storage_state)"""
+
+    name: str
+    account_id: Optional[int] = None
+    profile_path: Optional[str] = None
+    cdp_url: Optional[str] = None
+    storage_state: Optional[str] = None
+    proxy: Optional[str] = None
+
+
+@dataclass
+class HttpSession:
+    """Cookies одного аккаунта + его прокси и темп запросов"""
+
+    source: CookieSource
+    cookies: list[dict]
+    pacer: AdaptivePacer
+    harvested_at: float = field(default_factory=time.monotonic)
+    active: bool = True
+    uses: int = 0
+    failures: int = 0
+    last_used_at: float = 0.0
+    retired_reason: Optional[str] = None
+
+    def headers(self, url: str) -> dict:
+        return {"Cookie": cookie_header(self.cookies, url)}
+
+    def request_kwargs(self) -> dict:
+        """proxy/proxy_auth для aiohttp"""
+        config = parse_proxy(self.source.proxy) if self.source.proxy else None
+        if not config:
+            return {}
+        kwargs = {"proxy": config["server"]}
+        if config.get("username"):
+            kwargs["proxy_auth"] = aiohttp.BasicAuth(config["username"], config.get("password", ""))
+        return kwargs
+
+
+def sources_from_accounts(account_ids: Optional[list[int]] = None) -> list[CookieSource]:
+    """Источники cookies для всех рабочих аккаунтов с профилем"""
+    with SessionLocal() as session:
+        query = session.query(Account).filter(Account.status == "ok")
+        if account_ids:
+            query = query.filter(Account.id.in_(account_ids))
+        return [
+            CookieSource(
+                name=account.name,
+                account_id=account.id,
+                profile_path=account.profile_path,
+                proxy=account.proxy,
+            )
+            for account in query.all()
+            if account.profile_path and Path(account.profile_path).exists()
+        ]
+
+
+async def harvest_cookies(source: CookieSource, pool: Optional[BrowserPool] = None) -> list[dict]:
+    """Cookies источника; пустой список если авторизации нет"""
+    if source.storage_state:
+        state = json.loads(Path(source.storage_state).read_text(encoding="utf-8"))
+        cookies = state.get("cookies", [])
+    elif source.cdp_url:
+        async with async_playwright() as p:
+            browser = await p.chromium.connect_over_cdp(source.cdp_url)
+            try:
+                cookies = await browser.contexts[0].cookies() if browser.contexts else []
+            finally:
+                # Отключаемся, сам Chrome остаётся работать
+                await browser.close()
+    elif source.profile_path:
+        pool = pool or current_host_pool()
+        if pool is None:
+            # Свой пул только на этот сбор, чтобы не оставить браузер открытым
+            async with default_browser_pool() as own_pool:
+                return await harvest_cookies(source, own_pool)
+        async with pool.lease(source.profile_path, proxy=source.proxy) as leased:
+            cookies = await leased.context.cookies()
+    else:
+        return []
+    if not any(c.get("name") == AUTH_COOKIE and c.get("value") for c in cookies):
+        print(f"[COOKIES] {source.name}: нет {AUTH_COOKIE}, аккаунт не авторизован")
+        return []
+    return cookies
+
+
+class CookieSessionPool:
+    """
+    Ротация авторизованных HTTP-сессий по аккаунтам
+
+    ``lease()`` выдаёт давно не использованную активную сессию; вызывающий
+    сообщает итог через ``report(session, status)``. На 401/403/капче сессия
+    снимается с ротации и через ``refresh_delay`` обновляется из браузера в
+    фоне; неудачное обновление повторяется с удвоенной паузой, а после
+    ``max_refreshes`` неудач подряд сессия остаётся выключенной.
+    """
+
+    def __init__(
+        self,
+        sources: list[CookieSource],
+        *,
+        concurrency_per_session: int = 4,
+        refresh_delay: float = 60.0,
+        max_refreshes: int = 3,
+        browser_pool: Optional[BrowserPool] = None,
+    ):
+        self.sources = sources
+        self.concurrency_per_session = concurrency_per_session
+        self.refresh_delay = refresh_delay
+        self.max_refreshes = max_refreshes
+        self.browser_pool = browser_pool
+        self._own_browser_pool = False
+        self.sessions: list[HttpSession] = []
+        self._changed = asyncio.Condition()
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._refresh_counts: dict[str, int] = {}
+
+    @classmethod
+    def from_accounts(cls, account_ids: Optional[list[int]] = None, **kwargs) -> "CookieSessionPool":
+        return cls(sources_from_accounts(account_ids), **kwargs)
+
+    # ------------------------------------------------------------------
+    # Жизненный цикл
+    # ------------------------------------------------------------------
+
+    async def start(self) -> "CookieSessionPool":
+        """Собрать cookies со всех источников (профили по очереди, профиль нельзя открыть дважды)"""
+        if self.browser_pool is None:
+            self.browser_pool = current_host_pool()
+        if self.browser_pool is None and any(s.profile_path for s in self.sources):
+            # Один браузерный пул на сбор и фоновые обновления; закрывается в stop()
+            self.browser_pool = default_browser_pool()
+            self._own_browser_pool = True
+        for source in self.sources:
+            session = await self._harvest(source)
+            if session is not None:
+                self.sessions.append(session)
+        print(f"[COOKIES] Сессий в пуле: {self.active_count()}/{len(self.sources)}")
+        return self
+
+    async def stop(self):
+        for task in self._refreshing.values():
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        self._refreshing.clear()
+        if self._own_browser_pool:
+            await self.browser_pool.stop()
+            self.browser_pool = None
+            self._own_browser_pool = False
+
+    async def __aenter__(self) -> "CookieSessionPool":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _harvest(self, source: CookieSource) -> Optional[HttpSession]:
+        if source.proxy and (parse_proxy(source.proxy) or {}).get("server", "").startswith("socks"):
+            # aiohttp без aiohttp_socks SOCKS не умеет, а без прокси идти нельзя
+            print(f"[COOKIES] {source.name}: SOCKS-прокси не поддерживается для HTTP-реплея, пропуск")
+            return None
+        try:
+            cookies = await harvest_cookies(source, self.browser_pool)
+        except Exception as e:
+            print(f"[COOKIES] {source.name}: не удалось собрать cookies: {str(e)[:100]}")
+            return None
+        if not cookies:
+            return None
+        return HttpSession(
+            source=source,
+            cookies=cookies,
+            pacer=AdaptivePacer(concurrency=self.concurrency_per_session),
+        )
+
+    # ------------------------------------------------------------------
+    # Ротация
+    # ------------------------------------------------------------------
+
+    def active_count(self) -> int:
+        return sum(1 for s in self.sessions if s.active)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[HttpSession]:
+        """Взять сессию (с её темпом); ждёт, пока идёт фоновое обновление"""
+        async with self._changed:
+            while True:
+                active = [s for s in self.sessions if s.active]
+                if active:
+                    break
+                if not self._refreshing:
+                    raise RuntimeError("Нет живых HTTP-сессий: все аккаунты выведены из ротации")
+                await self._changed.wait()
+            session = min(active, key=lambda s: s.last_used_at)
+            session.last_used_at = time.monotonic()
+            session.uses += 1
+        async with session.pacer:
+            yield session
+
+    def report(self, session: HttpSession, status: str):
+        """Итог запроса: ok / throttled / captcha / auth / прочая ошибка"""
+        if status == "ok":
+            session.pacer.on_success()
+            session.failures = 0
+            return
+        session.failures += 1
+        if status == "throttled":
+            session.pacer.on_throttle()
+        elif status in RETIRE_STATUSES:
+            session.pacer.on_captcha()
+            self.retire(session, status)
+
+    def retire(self, session: HttpSession, reason: str):
+        if not session.active:
+            return
+        session.active = False
+        session.retired_reason = reason
+        print(f"[COOKIES] {session.source.name}: выведена из ротации ({reason})")
+        name = session.source.name
+        if name not in self._refreshing and self._refresh_counts.get(name, 0) < self.max_refreshes:
+            self._refreshing[name] = asyncio.create_task(self._refresh(session))
+        asyncio.create_task(self._notify())
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _refresh(self, session: HttpSession):
+        name = session.source.name
+        delay = self.refresh_delay
+        try:
+            while self._refresh_counts.get(name, 0) < self.max_refreshes:
+                await asyncio.sleep(delay)
+                fresh = await self._harvest(session.source)
+                if fresh is not None:
+                    self._refresh_counts[name] = 0
+                    session.cookies = fresh.cookies
+                    session.harvested_at = fresh.harvested_at
+                    session.pacer = fresh.pacer
+                    session.failures = 0
+                    session.retired_reason = None
+                    session.active = True
+                    print(f"[COOKIES] {name}: cookies обновлены, сессия снова в ротации")
+                    return
+                self._refresh_counts[name] = self._refresh_counts.get(name, 0) + 1
+                delay *= 2
+            print(f"[COOKIES] {name}: {self.max_refreshes} обновлений не удались, сессия выключена")
+        finally:
+            self._refreshing.pop(name, None)
+            await self._notify()
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": s.source.name,
+                "active": s.active,
+                "uses": s.uses,
+                "failures": s.failures,
+                "delay": round(s.pacer.delay, 3),
+                "age_sec": round(now - s.harvested_at, 1),
+                "retired_reason": s.retired_reason,
+            }
+            for s in self.sessions
+        ]
+
+
+__all__ = [
+    "AUTH_COOKIE",
+    "CookieSource",
+    "HttpSession",
+    "CookieSessionPool",
+    "harvest_cookies",
+    "sources_from_accounts",
+]
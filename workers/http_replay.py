@@ -0,0 +1,120 @@
+"""
+Общие кирпичи HTTP-реплея Wordstat без браузера
+
+ - AdaptivePacer   — темп запросов одной сессии (cookies): AIMD-пауза
+                     между стартами и ограничение параллельности;
+ - cookie_header   — заголовок Cookie из cookies Playwright;
+ - new_http_session — aiohttp-сессия с общим пулом соединений.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+DEFAULT_HEADERS = {
+    "Accept": "*/*",
+    "Accept-Language": "ru-RU,ru;q=0.9",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Referer": "https://wordstat.yandex.ru/",
+}
+
+
+class AdaptivePacer:
+    """
+    Темп запросов одной сессии
+
+    Параллельность ограничена семафором, а старты запросов разнесены не
+    меньше чем на ``delay``. Успех уменьшает паузу (×decrease, до min_delay),
+    429/5xx увеличивают (×increase), капча — сразу до max_delay.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 4,
+        min_delay: float = 0.05,
+        max_delay: float = 5.0,
+        start_delay: float = 0.3,
+        increase: float = 2.0,
+        decrease: float = 0.9,
+        jitter: float = 0.2,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min(max(start_delay, min_delay), max_delay)
+        self.increase = increase
+        self.decrease = decrease
+        self.jitter = jitter
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def __aenter__(self) -> "AdaptivePacer":
+        await self._sem.acquire()
+        try:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                spacing = self.delay * (1 + random.uniform(-self.jitter, self.jitter))
+                self._next_start = max(now, self._next_start) + spacing
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._sem.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._sem.release()
+
+    def on_success(self):
+        self.delay = max(self.min_delay, self.delay * self.decrease)
+
+    def on_throttle(self):
+        self.delay = min(self.max_delay, self.delay * self.increase)
+
+    def on_captcha(self):
+        self.delay = self.max_delay
+
+
+def cookie_header(cookies: Iterable[dict], url: Optional[str] = None) -> str:
+    """Cookie-заголовок из cookies Playwright (для url — только подходящие домены)"""
+    host = (urlsplit(url).hostname or "") if url else ""
+    picked: dict[str, tuple[int, str]] = {}
+    for cookie in cookies:
+        name = cookie.get("name")
+        if not name:
+            continue
+        domain = (cookie.get("domain") or "").lstrip(".")
+        if host and domain and not (host == domain or host.endswith("." + domain)):
+            continue
+        # При совпадении имени берём cookie с самым точным доменом
+        if name not in picked or len(domain) > picked[name][0]:
+            picked[name] = (len(domain), cookie.get("value", ""))
+    return "; ".join(f"{name}={value}" for name, (_, value) in picked.items())
+
+
+def new_http_session(
+    *,
+    limit: int = 100,
+    limit_per_host: int = 16,
+    timeout: float = 30.0,
+    headers: Optional[dict] = None,
+) -> aiohttp.ClientSession:
+    """aiohttp-сессия с пулом keep-alive соединений (создавать внутри event loop)"""
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, ttl_dns_cache=300)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={**DEFAULT_HEADERS, **(headers or {})},
+        cookie_jar=aiohttp.DummyCookieJar(),
+    )
+
+
+__all__ = ["DEFAULT_HEADERS", "AdaptivePacer", "cookie_header", "new_http_session"]
@@ -0,0 +1,155 @@
+"""
+Здоровье вкладок для долгих парсеров
+
+Вкладка Wordstat после нескольких тысяч запросов разрастается по памяти и
+тормозит. PageHealth считает по каждой вкладке: сколько запросов обслужено,
+скользящую задержку ответа, серию ошибок и размер JS heap (CDP
+``Performance.getMetrics``), и говорит когда вкладку пора пересоздать.
+Фразы, отправленные но ещё без ответа, остаются в ``inflight`` и при
+пересоздании возвращаются в очередь.
+"""
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from playwright.async_api import BrowserContext, Page
+
+
+@dataclass
+class HealthThresholds:
+    """Пороги пересоздания вкладки"""
+
+    max_queries: int = 1500          # запросов на одну вкладку
+    max_heap_mb: float = 1024.0      # JSHeapUsedSize
+    max_error_streak: int = 5        # ошибок подряд
+    max_avg_latency: float = 8.0     # сек, средняя по окну
+    latency_window: int = 50         # размер окна задержек
+    heap_check_every: int = 50       # как часто спрашивать CDP (в запросах)
+
+
+class PageHealth:
+    """Метрики одной вкладки и решение о её пересоздании"""
+
+    def __init__(self, page: Page, thresholds: Optional[HealthThresholds] = None):
+        self.page = page
+        self.thresholds = thresholds or HealthThresholds()
+        self.queries = 0
+        self.errors = 0
+        self.error_streak = 0
+        self.heap_mb: Optional[float] = None
+        self.latencies: deque[float] = deque(maxlen=self.thresholds.latency_window)
+        self.inflight: dict[str, float] = {}
+        self.created_at = time.monotonic()
+        self._cdp = None
+        self._last_heap_check = 0
+
+    # --- события ---------------------------------------------------------
+
+    def on_submit(self, phrase: str):
+        self.inflight[phrase] = time.monotonic()
+
+    def on_result(self, phrase: str):
+        started = self.inflight.pop(phrase, None)
+        if started is not None:
+            self.latencies.append(time.monotonic() - started)
+        self.queries += 1
+        self.error_streak = 0
+
+    def on_error(self, phrase: Optional[str] = None):
+        if phrase is not None:
+            self.inflight.pop(phrase, None)
+        self.errors += 1
+        self.error_streak += 1
+
+    def take_inflight(self) -> list[str]:
+        """Забрать фразы без ответа (в порядке отправки)"""
+        pending = sorted(self.inflight, key=self.inflight.get)
+        self.inflight.clear()
+        return pending
+
+    # --- метрики ---------------------------------------------------------
+
+    @property
+    def avg_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    async def sample_heap(self) -> Optional[float]:
+        """JS heap вкладки в МБ через CDP Performance.getMetrics"""
+        try:
+            if self._cdp is None:
+                self._cdp = await self.page.context.new_cdp_session(self.page)
+                await self._cdp.send("Performance.enable")
+            data = await self._cdp.send("Performance.getMetrics")
+            for metric in data.get("metrics", []):
+                if metric.get("name") == "JSHeapUsedSize":
+                    self.heap_mb = metric["value"] / (1024 * 1024)
+                    break
+        except Exception:
+            # CDP недоступен (не Chromium или вкладка закрыта) - живём без heap
+            pass
+        return self.heap_mb
+
+    async def should_recycle(self) -> Optional[str]:
+        """Причина пересоздания вкладки или None"""
+        t = self.thresholds
+        if self.page.is_closed():
+            return "page closed"
+        if self.error_streak >= t.max_error_streak:
+            return f"{self.error_streak} ошибок подряд"
+        if self.queries >= t.max_queries:
+            return f"{self.queries} запросов"
+        if len(self.latencies) >= t.latency_window and self.avg_latency > t.max_avg_latency:
+            return f"средняя задержка {self.avg_latency:.1f} с"
+        if self.queries - self._last_heap_check >= t.heap_check_every:
+            self._last_heap_check = self.queries
+            heap = await self.sample_heap()
+            if heap is not None and heap > t.max_heap_mb:
+                return f"JS heap {heap:.0f} МБ"
+        return None
+
+    def score(self) -> float:
+        """Оценка 0..1 (1 - свежая вкладка), для логов и выбора вкладки"""
+        t = self.thresholds
+        parts = [
+            1 - min(1.0, self.queries / t.max_queries),
+            1 - min(1.0, self.error_streak / t.max_error_streak),
+            1 - min(1.0, self.avg_latency / t.max_avg_latency),
+        ]
+        if self.heap_mb is not None:
+            parts.append(1 - min(1.0, self.heap_mb / t.max_heap_mb))
+        return round(min(parts), 3)
+
+    def summary(self) -> str:
+        heap = f"{self.heap_mb:.0f}МБ" if self.heap_mb is not None else "n/a"
+        return (
+            f"запросов={self.queries} ошибок={self.errors} серия={self.error_streak} "
+            f"задержка={self.avg_latency:.2f}с heap={heap} score={self.score()}"
+        )
+
+    async def detach(self):
+        if self._cdp is not None:
+            try:
+                await self._cdp.detach()
+            except Exception:
+                pass
+            self._cdp = None
+
+
+async def recycle_page(context: BrowserContext, page: Page, url: str, timeout: int = 15000) -> Page:
+    """Закрыть вкладку и открыть вместо неё свежую на том же URL"""
+    new_page = await context.new_page()
+    try:
+        await new_page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+    except Exception as e:
+        print(f"[HEALTH] Новая вкладка не загрузилась: {str(e)[:80]}")
+    try:
+        await page.close()
+    except Exception:
+        pass
+    return new_page
+
+
+__all__ = ["HealthThresholds", "PageHealth", "recycle_page"]
@@ -5,16 +5,45 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import re
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-from playwright.async_api import async_playwright, Page
+from playwright.async_api import Page
 
 from ..core.db import SessionLocal
 from ..core.models import Account, FrequencyResult
-from ..services.sessions import _build_proxy_config
+from ..core.settings import ConfigError, load_runner_config
+from .browser_pool import BrowserPool, current_host_pool, default_browser_pool
+from .waits import wait_for_any, wait_for_dom
+
+# Признаки того, что результат по маске отрисован
+RESULT_INPUT_SELECTOR = 'input[name="text"], input[name="words"], textarea'
+
+
+def _result_ready_js(mask: str) -> str:
+    """Предикат: результат отрисован и относится к запрошенной маске"""
+    words = json.dumps(" ".join(mask.lower().split()), ensure_ascii=False)
+    selector = json.dumps(RESULT_INPUT_SELECTOR)
+    return (
+        "() => {"
+        " const text = document.body && document.body.innerText;"
+        " if (!text || !/Общее число запросов/.test(text)) return false;"
+        f" const input = document.querySelector({selector});"
+        " const value = ((input && input.value) || '').toLowerCase().split(/\\s+/).filter(Boolean).join(' ');"
+        f" return value === {words} || text.toLowerCase().includes({words});"
+        " }"
+    )
+
+
+RESULT_SELECTORS = [
+    ".WordStat-Table .text-bold",
+    ".wordstat-table__number",
+    "[data-stat='main-table'] td:first-child",
+]
 
 
 async def parse_frequency_with_session(
@@ -22,7 +51,10 @@ async def parse_frequency_with_session(
     masks: list[str],
     region: int = 225,
     headless: bool = True,
-    on_progress: callable = None
+    on_progress: callable = None,
+    pool: Optional[BrowserPool] = None,
+    max_pages: Optional[int] = None,
+    page_delay: float = 2.0,
 ) -> dict:
     """
     Парсит частотность используя сохранённую сессию аккаунта
@@ -33,10 +65,23 @@ async def parse_frequency_with_session(
         region: Регион Яндекса
         headless: Фоновый режим
         on_progress: Callback для прогресса (mask, freq, idx, total)
+        pool: Пул браузеров владельца (долгоживущий, см. BrowserPoolHost); без него
+            берётся пул общего хоста, а вне его - свой на один вызов
+        max_pages: Вкладок на контекст (по умолчанию max_concurrent_pages из runner.yaml)
+        page_delay: Пауза между масками на одной вкладке, сек
     
     Returns:
         {'success': int, 'failed': int, 'errors': list}
     """
+    pool = pool or current_host_pool()
+    if pool is None:
+        # Холодный старт: вызов не из хоста и пул не передан
+        async with default_browser_pool() as own_pool:
+            return await parse_frequency_with_session(
+                account_id, masks, region, headless, on_progress,
+                pool=own_pool, max_pages=max_pages, page_delay=page_delay,
+            )
+
     # Загружаем аккаунт
     with SessionLocal() as session:
         account = session.get(Account, account_id)
@@ -78,77 +123,101 @@ async def parse_frequency_with_session(
         'errors': []
     }
     
-    # Парсинг через браузер
-    async with async_playwright() as p:
-        context = await p.chromium.launch_persistent_context(
-            str(profile_path),
-            headless=headless,
-            args=[
-                '--disable-blink-features=AutomationControlled',
-                '--disable-background-timer-throttling',
-            ],
-            viewport={"width": 1600, "height": 1200},
-            proxy=_build_proxy_config(proxy) if proxy else None
-        )
-        
-        page = context.pages[0] if context.pages else await context.new_page()
-        
-        # Открываем Wordstat
-        await page.goto(f"https://wordstat.yandex.ru/?regions={region}", wait_until="networkidle")
-        
-        # Закрываем cookie уведомление
+    if max_pages is None:
         try:
-            cookie_btns = ["button:has-text('Accept')", "button:has-text('Принять')"]
-            for btn in cookie_btns:
-                try:
-                    elem = page.locator(btn).first
-                    if await elem.is_visible(timeout=1000):
-                        await elem.click()
-                        await asyncio.sleep(0.5)
-                        break
-                except:
-                    pass
-        except:
-            pass
-        
-        # Парсим каждую маску
-        total = len(masks)
-        for idx, mask in enumerate(masks, 1):
-            mask_norm = mask.strip()
-            if not mask_norm:
-                continue
+            max_pages = load_runner_config().max_concurrent_pages
+        except ConfigError:
+            max_pages = 1
+    
+    queue: deque[tuple[int, str]] = deque(
+        (idx, mask.strip()) for idx, mask in enumerate(masks, 1) if mask.strip()
+    )
+    total = len(masks)
+    num_pages = max(1, min(int(max_pages), len(queue) or 1))
+    done = 0
+    
+    async def page_worker(page: Page, worker_id: int):
+        """Одна вкладка: берёт маски из общей очереди, пауза - своя на вкладку"""
+        nonlocal done
+        # Разносим старты вкладок, чтобы не бить Wordstat пачкой
+        if worker_id:
+            await asyncio.sleep(worker_id * page_delay / num_pages)
+        handled = 0
+        while queue:
+            idx, mask_norm = queue.popleft()
+            if handled:
+                await asyncio.sleep(page_delay + (handled % 3) * 0.5)
+            handled += 1
             
             try:
                 # Обновляем статус на "running"
-                _update_status(mask_norm, region, 'running')
+                await asyncio.to_thread(_update_status, mask_norm, region, 'running')
                 
                 # Парсим частоту
                 freq = await _parse_single_mask(page, mask_norm, region)
                 
                 if freq is not None:
                     # Записываем в БД
-                    _update_result(mask_norm, region, freq)
+                    await asyncio.to_thread(_update_result, mask_norm, region, freq)
                     stats['success'] += 1
+                    done += 1
                     
                     if on_progress:
-                        on_progress(mask_norm, freq, idx, total)
+                        on_progress(mask_norm, freq, done, total)
                 else:
-                    _update_status(mask_norm, region, 'error', error='Частота не найдена')
+                    await asyncio.to_thread(_update_status, mask_norm, region, 'error', 'Частота не найдена')
                     stats['failed'] += 1
                     stats['errors'].append(f"{mask_norm}: частота не найдена")
                 
-                # Пауза между запросами
-                if idx < total:
-                    delay = 2.0 + (idx % 3) * 0.5
-                    await asyncio.sleep(delay)
-                
             except Exception as e:
                 error_msg = str(e)
-                _update_status(mask_norm, region, 'error', error=error_msg)
+                await asyncio.to_thread(_update_status, mask_norm, region, 'error', error_msg)
                 stats['failed'] += 1
                 stats['errors'].append(f"{mask_norm}: {error_msg}")
+    
+    # Парсинг через браузер: тёплый контекст из пула, не закрываем его после задачи
+    async with pool.lease(str(profile_path), proxy=proxy, headless=headless) as leased:
+        page = await leased.page()
+        
+        # Открываем Wordstat: ждём поле ввода, а не networkidle
+        await wait_for_dom(
+            page,
+            ["textarea", "input[name='text']", "input[type='text']"],
+            action=lambda: page.goto(f"https://wordstat.yandex.ru/?regions={region}", wait_until="domcontentloaded"),
+            timeout=30000,
+            label=f"wordstat {account_name}",
+        )
+        
+        # Закрываем cookie уведомление
+        try:
+            cookie_btns = ["button:has-text('Accept')", "button:has-text('Принять')"]
+            for btn in cookie_btns:
+                try:
+                    elem = page.locator(btn).first
+                    if await elem.is_visible(timeout=1000):
+                        await elem.click()
+                        await asyncio.sleep(0.5)
+                        break
+                except:
+                    pass
+        except:
+            pass
         
-        await context.close()
+        # Доп. вкладки в том же контексте: сессия общая, повторный логин не нужен
+        extra_pages = [await leased.context.new_page() for _ in range(num_pages - 1)]
+        if extra_pages:
+            print(f"[SESSION] {account_name}: {num_pages} вкладок на одну сессию")
+        try:
+            await asyncio.gather(*(
+                page_worker(p, i) for i, p in enumerate([page] + extra_pages)
+            ))
+        finally:
+            # Основная вкладка остаётся в пуле, дополнительные закрываем
+            for extra in extra_pages:
+                try:
+                    await extra.close()
+                except Exception:
+                    pass
     
     # Обновляем last_used_at аккаунта
     with SessionLocal() as session:
@@ -163,10 +232,23 @@ async def parse_frequency_with_session(
 async def _parse_single_mask(page: Page, mask: str, region: int) -> Optional[int]:
     """Парсит частоту для одной маски"""
     
-    # Открываем страницу с маской
+    # Открываем страницу с маской. Ждём ответ API именно на этот запрос
+    # (слушатель ставится до goto), а DOM проверяем только после commit и
+    # только для запрошенных слов: на вкладке ещё может висеть прошлый результат.
     url = f"https://wordstat.yandex.ru/?words={mask.replace(' ', '+')}&regions={region}"
-    await page.goto(url, wait_until="networkidle", timeout=30000)
-    await asyncio.sleep(1.5)
+    await wait_for_any(
+        page,
+        action=lambda: page.goto(url, wait_until="commit", timeout=30000),
+        response="/wordstat/api",
+        timeout=30000,
+        label=f"mask {mask[:30]}: api",
+    )
+    await wait_for_any(
+        page,
+        predicate=_result_ready_js(mask),
+        timeout=15000,
+        label=f"mask {mask[:30]}: dom",
+    )
     
     # Метод 1: Ищем "Общее число запросов ... : 190 467"
     try:
@@ -191,13 +273,7 @@ async def _parse_single_mask(page: Page, mask: str, region: int) -> Optional[int
     
     # Метод 2: Ищем в таблице
     try:
-        selectors = [
-            ".WordStat-Table .text-bold",
-            ".wordstat-table__number",
-            "[data-stat='main-table'] td:first-child"
-        ]
-        
-        for selector in selectors:
+        for selector in RESULT_SELECTORS:
             try:
                 elem = page.locator(selector).first
                 if await elem.is_visible(timeout=2000):
@@ -8,18 +8,22 @@ import asyncio
 import time
 import json
 import random
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 from urllib.parse import quote
 
 from playwright.async_api import async_playwright, Page, Browser, BrowserContext
-import sqlite3
 
+from ..core.batch_writer import AsyncBatchWriter
 from ..core.db import SessionLocal
 from ..core.models import Account
+from ..services.frequency import bulk_upsert_frequencies
+from ..services.related_phrases import bulk_store_related, related_rows
 from .visual_browser_manager import VisualBrowserManager, BrowserStatus
 from .auto_auth_handler import AutoAuthHandler
+from .page_health import HealthThresholds, PageHealth, recycle_page
 
 
 class AIMDController:
@@ -67,7 +71,17 @@ class TurboWordstatParser:
         self.num_tabs = 1  # количество вкладок для стабильной работы
         self.num_browsers = 1  # количество видимых браузеров
         self.visual_manager = None  # Менеджер визуальных браузеров
-        self.db_path = Path("C:/AI/yandex/keyset/data/keyset.db")
+        self.region = 225
+        # Инкрементальная запись в freq_results: пачками по размеру или по таймеру
+        self.flush_batch_size = 500
+        self.flush_interval = 2.0
+        self.writer: Optional[AsyncBatchWriter] = None
+        # Левая/правая колонки Wordstat из тех же ответов API (для глубокого парсинга)
+        self.capture_related = True
+        self.related_writer: Optional[AsyncBatchWriter] = None
+        # Пороги пересоздания вкладок (память/задержка/ошибки) и повторы фраз
+        self.health_thresholds = HealthThresholds()
+        self.max_phrase_retries = 2
         self.auth_handler = AutoAuthHandler()  # Обработчик авторизации
         
         # Загружаем данные авторизации из accounts.json если нет в аккаунте
@@ -263,6 +277,58 @@ class TurboWordstatParser:
         except Exception as e:
             print(f"[WAIT] Ошибка ожидания загрузки Wordstat: {e}")
     
+    def _record_result(self, phrase: str, frequency: int):
+        """Запоминаем результат и ставим его в очередь на запись в БД"""
+        self.results[phrase] = frequency
+        if self.writer:
+            self.writer.add((phrase, self.region, frequency))
+
+    def _record_related(self, phrase: str, data: Dict[str, Any]):
+        """Ставим в очередь связанные фразы из ответа API (с привязкой к маске)"""
+        if not self.related_writer:
+            return
+        try:
+            self.related_writer.extend(related_rows(phrase, self.region, data, source="turbo"))
+        except Exception as e:
+            print(f"[TURBO] Не удалось разобрать колонки для '{phrase}': {e}")
+
+    async def _start_writer(self):
+        """Запуск фоновой пакетной записи в freq_results (и related_phrases)"""
+        if self.writer is None:
+            self.writer = AsyncBatchWriter(
+                bulk_upsert_frequencies,
+                max_batch=self.flush_batch_size,
+                flush_interval=self.flush_interval,
+                name="TURBO",
+            )
+            self.writer.start()
+        if self.capture_related and self.related_writer is None:
+            self.related_writer = AsyncBatchWriter(
+                bulk_store_related,
+                max_batch=self.flush_batch_size * 20,
+                flush_interval=self.flush_interval,
+                name="TURBO related",
+            )
+            self.related_writer.start()
+
+    async def _stop_writer(self):
+        """Дописываем хвост и останавливаем запись"""
+        if self.related_writer is not None:
+            related_writer, self.related_writer = self.related_writer, None
+            try:
+                await related_writer.close()
+                print(f"[TURBO] Сохранено {related_writer.total_written} связанных фраз")
+            except Exception as e:
+                print(f"[TURBO] Ошибка записи связанных фраз ({related_writer.pending()} не сохранено): {e}")
+        if self.writer is None:
+            return
+        writer, self.writer = self.writer, None
+        try:
+            await writer.close()
+            print(f"[TURBO] Сохранено {writer.total_written} результатов в БД")
+        except Exception as e:
+            print(f"[TURBO] Ошибка записи в БД ({writer.pending()} не сохранено): {e}")
+
     async def handle_response(self, response, tab_id):
         """Перехват XHR ответов от Wordstat API"""
         try:
@@ -282,7 +348,8 @@ class TurboWordstatParser:
                             query = request_data.get("searchValue", "").strip()
                             
                             if query:
-                                self.results[query] = frequency
+                                self._record_result(query, frequency)
+                                self._record_related(query, data)
                                 self.total_processed += 1
                                 self.aimd.on_success()
                                 print(f"[Tab {tab_id}] OK {query} = {frequency:,}")
@@ -293,6 +360,7 @@ class TurboWordstatParser:
         """Воркер для обработки фраз на одной вкладке (рабочая версия из parse_5_accounts_cdp.py)"""
         tab_results = []
         results_lock = asyncio.Lock()
+        health = PageHealth(page, self.health_thresholds)
         
         # Настраиваем обработчик ответов для перехвата частотностей
         async def handle_response(response):
@@ -317,10 +385,12 @@ class TurboWordstatParser:
                             
                             if phrase:
                                 async with results_lock:
-                                    self.results[phrase] = frequency
+                                    self._record_result(phrase, frequency)
+                                    self._record_related(phrase, data)
                                     tab_results.append({'query': phrase, 'frequency': frequency})
                                     self.total_processed += 1
                                     self.aimd.on_success()
+                                    health.on_result(phrase)
                                 print(f"[Tab {tab_id}] OK: {phrase} = {frequency:,} показов")
                 except Exception as e:
                     pass  # Игнорируем ошибки парсинга
@@ -353,8 +423,32 @@ class TurboWordstatParser:
             print(f"[Tab {tab_id}] Поле ввода не найдено, страница не готова")
             return tab_results
         
+        queue = deque(phrases)
+        attempts: Dict[str, int] = {}
+        failed: List[str] = []
+        
+        def requeue(items: List[str]):
+            """Вернуть фразы без ответа в начало очереди (с лимитом повторов)"""
+            retry = []
+            for item in items:
+                if item in self.results:
+                    continue
+                attempts[item] = attempts.get(item, 0) + 1
+                if attempts[item] <= self.max_phrase_retries:
+                    retry.append(item)
+                else:
+                    failed.append(item)
+            queue.extendleft(reversed(retry))
+        
         # Обрабатываем каждую фразу
-        for phrase in phrases:
+        while True:
+            if not queue:
+                # Даем время на последние ответы; фразы без ответа - на повтор
+                await asyncio.sleep(2)
+                requeue(health.take_inflight())
+                if not queue:
+                    break
+            phrase = queue.popleft()
             if phrase in self.results:
                 continue
             
@@ -380,33 +474,55 @@ class TurboWordstatParser:
                     # Очищаем и вводим фразу
                     await input_field.clear()
                     await input_field.fill(phrase)
+                    health.on_submit(phrase)
                     await input_field.press("Enter")
                     
                     # Ждем ответ (минимальная задержка)
                     await asyncio.sleep(0.5)
                 else:
                     print(f"[Tab {tab_id}] Не найдено поле ввода для '{phrase}'")
+                    health.on_error(phrase)
+                    requeue([phrase])
                     
             except Exception as e:
                 print(f"[Tab {tab_id}] Ошибка для '{phrase}': {str(e)[:50]}")
                 self.aimd.on_error()
+                health.on_error(phrase)
+                requeue([phrase] + health.take_inflight())
                 
-                # При ошибке пробуем перезагрузить страницу
+                # Лёгкое восстановление; если ошибки идут серией - вкладку пересоздадим ниже
                 try:
                     await page.reload()
                     await asyncio.sleep(2)
                 except:
                     pass
+            
+            # Проверяем здоровье вкладки и при необходимости пересоздаём её
+            reason = await health.should_recycle()
+            if reason:
+                print(f"[Tab {tab_id}] Пересоздаю вкладку: {reason} ({health.summary()})")
+                requeue(health.take_inflight())
+                await health.detach()
+                page = await recycle_page(page.context, page, "https://wordstat.yandex.ru")
+                page.on("response", handle_response)
+                if tab_id < len(self.pages):
+                    self.pages[tab_id] = page
+                health = PageHealth(page, self.health_thresholds)
+                try:
+                    await page.wait_for_selector('input[placeholder*="слово"], input[name="text"]', timeout=10000)
+                except:
+                    print(f"[Tab {tab_id}] Новая вкладка не готова, продолжаю с ошибками")
         
-        # Даем время на последние ответы
-        await asyncio.sleep(2)
-        
-        print(f"[Tab {tab_id}] Завершено: обработано {len(tab_results)} фраз")
+        await health.detach()
+        if failed:
+            print(f"[Tab {tab_id}] Без ответа после {self.max_phrase_retries} повторов: {len(failed)} фраз")
+        print(f"[Tab {tab_id}] Завершено: обработано {len(tab_results)} фраз ({health.summary()})")
         return tab_results
     
     async def parse_batch_visual(self, queries: List[str], region: int = 225):
         """Парсинг батча фраз в визуальном режиме с несколькими браузерами"""
         self.start_time = time.time()
+        self.region = region
         
         # Создаем визуальный менеджер
         self.visual_manager = VisualBrowserManager(num_browsers=self.num_browsers)
@@ -457,6 +573,8 @@ class TurboWordstatParser:
                 accounts.append(acc)
         
         try:
+            await self._start_writer()
+
             # Запускаем браузеры в видимом режиме
             print(f"\n[VISUAL] Запуск {self.num_browsers} браузеров...")
             await self.visual_manager.start_all_browsers(accounts)
@@ -487,11 +605,9 @@ class TurboWordstatParser:
                     'frequency': freq,
                     'timestamp': datetime.now().isoformat()
                 })
+                self._record_result(phrase, freq)
                 self.total_processed += 1
             
-            # Сохраняем в БД
-            await self.save_to_db(results)
-            
             # Статистика
             elapsed = time.time() - self.start_time
             speed = len(results) / elapsed * 60 if elapsed > 0 else 0
@@ -509,6 +625,7 @@ class TurboWordstatParser:
             return results
             
         finally:
+            await self._stop_writer()
             if self.visual_manager:
                 await self.visual_manager.close_all()
     
@@ -519,9 +636,13 @@ class TurboWordstatParser:
             return await self.parse_batch_visual(queries, region)
         
         self.start_time = time.time()
+        self.region = region
         all_results = []  # Инициализируем результаты до try
         
         try:
+            # Результаты пишутся в БД по мере поступления, а не в конце
+            await self._start_writer()
+
             # Инициализация
             await self.init_browser()
             await self.setup_tabs()
@@ -566,31 +687,16 @@ class TurboWordstatParser:
             print(f"[TURBO] КРИТИЧЕСКАЯ ОШИБКА в parse_batch: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            await self._stop_writer()
         
         return all_results
     
     async def save_to_db(self, results: List[Dict]):
-        """Сохранение результатов в БД KeySet"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for result in results:
-            cursor.execute("""
-                INSERT OR REPLACE INTO freq_results 
-                (mask, region, freq_total, freq_exact, status, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                result['query'],
-                225,  # регион РФ
-                result['frequency'],
-                result['frequency'],
-                'ok',
-                result['timestamp']
-            ))
-        
-        conn.commit()
-        conn.close()
-        print(f"[TURBO] Сохранено {len(results)} результатов в БД")
+        """Разовое сохранение результатов в БД KeySet (одной транзакцией, вне event loop)"""
+        rows = [(r['query'], self.region, r['frequency']) for r in results]
+        saved = await asyncio.to_thread(bulk_upsert_frequencies, rows)
+        print(f"[TURBO] Сохранено {saved} результатов в БД")
     
     async def close(self):
         """Отключение от CDP браузера (НЕ закрываем Chrome - он остается работать)"""
@@ -657,9 +763,8 @@ async def run_turbo_parser(queries: List[str], account: Optional[Account] = None
     parser = TurboWordstatParser(account=account, headless=headless)
     
     try:
-        results = await parser.parse_batch(queries)
-        await parser.save_to_db(results)
-        return results
+        # parse_batch сам пишет результаты в БД по мере поступления
+        return await parser.parse_batch(queries)
     finally:
         await parser.close()
 
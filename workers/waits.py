@@ -0,0 +1,163 @@
+"""
+Ожидания по событиям вместо networkidle и фиксированных sleep
+
+networkidle на Яндексе почти никогда не наступает быстро (метрика, реклама,
+long-polling), а sleep(2..5) ждёт одинаково долго и когда страница уже
+готова, и когда ещё нет. Здесь ожидания, которые завершаются ровно тогда,
+когда случилось нужное: пришёл ответ, URL совпал с шаблоном, появился
+элемент или выполнился JS-предикат. Каждое ожидание пишет в лог, сколько
+оно реально заняло.
+
+    hit = await wait_for_any(
+        page,
+        action=lambda: page.goto(url, wait_until="commit"),
+        response="/wordstat/api",
+        selectors=["table"],
+        timeout=15000,
+        label="wordstat mask",
+    )
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence, Union
+
+from playwright.async_api import Page, Response
+
+UrlPattern = Union[str, re.Pattern, Callable[[str], bool]]
+ResponsePattern = Union[str, re.Pattern, Callable[[Response], bool]]
+
+
+def _url_matcher(pattern: UrlPattern) -> Callable[[str], bool]:
+    if callable(pattern) and not isinstance(pattern, re.Pattern):
+        return pattern
+    if isinstance(pattern, re.Pattern):
+        return lambda url: bool(pattern.search(url))
+    return lambda url: pattern in url
+
+
+def _response_matcher(pattern: ResponsePattern) -> Callable[[Response], bool]:
+    if callable(pattern) and not isinstance(pattern, re.Pattern):
+        return pattern
+    match_url = _url_matcher(pattern)
+    return lambda response: match_url(response.url)
+
+
+@asynccontextmanager
+async def timed(label: str) -> AsyncIterator[None]:
+    """Залогировать, сколько занял блок"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        print(f"[WAIT] {label}: {time.perf_counter() - started:.2f}s")
+
+
+async def wait_for_any(
+    page: Page,
+    *,
+    url: Optional[UrlPattern] = None,
+    response: Optional[ResponsePattern] = None,
+    selectors: Optional[Sequence[str]] = None,
+    predicate: Optional[str] = None,
+    action: Optional[Callable[[], Awaitable[Any]]] = None,
+    timeout: float = 15000,
+    label: str = "wait",
+) -> Optional[str]:
+    """
+    Ждать первое из событий: "url", "response", "dom" или "predicate"
+
+    Слушатели ставятся до ``action`` (goto, click), так что быстрый ответ не
+    теряется. Возвращает имя сработавшего условия или None по таймауту.
+    URL, который уже совпадает с шаблоном, срабатывает сразу.
+    """
+    started = time.perf_counter()
+    waiters: dict[asyncio.Task, str] = {}
+
+    if url is not None:
+        match_url = _url_matcher(url)
+        waiters[asyncio.create_task(
+            page.wait_for_url(match_url, timeout=timeout, wait_until="commit")
+        )] = "url"
+    if response is not None:
+        waiters[asyncio.create_task(
+            page.wait_for_event("response", predicate=_response_matcher(response), timeout=timeout)
+        )] = "response"
+    if selectors:
+        locator = page.locator(selectors[0])
+        for selector in selectors[1:]:
+            locator = locator.or_(page.locator(selector))
+        waiters[asyncio.create_task(
+            locator.first.wait_for(state="visible", timeout=timeout)
+        )] = "dom"
+    if predicate is not None:
+        waiters[asyncio.create_task(
+            page.wait_for_function(predicate, timeout=timeout)
+        )] = "predicate"
+
+    # даём задачам повесить слушателей до действия
+    await asyncio.sleep(0)
+    hit: Optional[str] = None
+    try:
+        if action is not None:
+            await action()
+        pending = set(waiters)
+        # Отсчёт после действия: долгий goto не должен съедать время ожидания,
+        # а уже сработавшие условия проверяются хотя бы один раз
+        deadline = time.perf_counter() + timeout / 1000
+        while pending and hit is None:
+            left = max(0.0, deadline - time.perf_counter())
+            done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    hit = waiters[task]
+                    break
+            if left == 0:
+                break
+    finally:
+        for task in waiters:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"[WAIT] {label}: {hit or 'timeout'} за {elapsed:.2f}s")
+    return hit
+
+
+async def wait_for_url(page: Page, pattern: UrlPattern, *, timeout: float = 15000,
+                       action: Optional[Callable[[], Awaitable[Any]]] = None,
+                       label: str = "url") -> bool:
+    """Ждать URL по шаблону (подстрока, regex или функция)"""
+    return await wait_for_any(page, url=pattern, action=action, timeout=timeout, label=label) is not None
+
+
+async def wait_for_response(page: Page, pattern: ResponsePattern, *, timeout: float = 15000,
+                            action: Optional[Callable[[], Awaitable[Any]]] = None,
+                            label: str = "response") -> Optional[Response]:
+    """Ждать ответ по URL/предикату; возвращает сам Response или None"""
+    started = time.perf_counter()
+    try:
+        async with page.expect_response(_response_matcher(pattern), timeout=timeout) as info:
+            if action is not None:
+                await action()
+        result = await info.value
+    except Exception:
+        result = None
+    print(f"[WAIT] {label}: {'response' if result else 'timeout'} за {time.perf_counter() - started:.2f}s")
+    return result
+
+
+async def wait_for_dom(page: Page, selectors: Union[str, Sequence[str]], *, timeout: float = 15000,
+                       action: Optional[Callable[[], Awaitable[Any]]] = None,
+                       label: str = "dom") -> bool:
+    """Ждать видимость любого из селекторов"""
+    if isinstance(selectors, str):
+        selectors = [selectors]
+    return await wait_for_any(page, selectors=selectors, action=action, timeout=timeout, label=label) is not None
+
+
+__all__ = ["timed", "wait_for_any", "wait_for_url", "wait_for_response", "wait_for_dom"]
@@ -0,0 +1,443 @@
+"""
+Запись XHR-«рецептов» из браузера и их реплей по HTTP
+
+Рецепт - это снятый с реального запроса браузера шаблон: метод, URL,
+заголовки и тело, в которых образцы входных данных заменены плейсхолдерами
+``{{имя}}``. Один раз выполняем действие в браузере (Wordstat «Скачать»,
+«Прогноз бюджета» в Директе и т.п.), сохраняем рецепт под именем, а дальше
+гоняем его через aiohttp для пачки входов. Если рецепт протух (капча,
+401/403/404, ответ не того типа), оставшиеся входы уходят в браузерный
+фолбэк, а рецепт помечается stale до перезаписи.
+
+Плейсхолдеры и кодирование подстановки:
+    {{q}}          как есть
+    {{q|url}}      quote (в URL)
+    {{q|form}}     quote_plus (form-urlencoded)
+    {{q|jsonstr}}  содержимое JSON-строки (без кавычек)
+    {{q|json}}     JSON-значение целиком (для списков фраз)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Union
+from urllib.parse import quote, quote_plus, urlsplit, urlunsplit
+
+import aiohttp
+from playwright.async_api import BrowserContext, Request
+
+from ..core.db import DATA_DIR
+from .cookie_pool import CookieSessionPool
+from .http_replay import AdaptivePacer, cookie_header, new_http_session
+
+RECIPES_PATH = DATA_DIR / "xhr_recipes.json"
+
+# Заголовки, которые aiohttp выставит сам или которые привязаны к сессии
+_DROP_HEADERS = {"cookie", "content-length", "host", "connection", "accept-encoding"}
+
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+)(?:\|(\w+))?\}\}")
+
+InputValue = Union[str, list]
+Matcher = Union[str, Callable[[Request], bool]]
+
+
+@dataclass
+class XhrRecipe:
+    """Шаблон одного запроса"""
+
+    name: str
+    method: str
+    url_template: str
+    headers: dict = field(default_factory=dict)
+    body_template: Optional[str] = None
+    response_kind: str = "json"          # json / csv / text
+    placeholders: list = field(default_factory=list)
+    recorded_at: float = field(default_factory=time.time)
+    stale: bool = False
+    stale_reason: Optional[str] = None
+
+    def render(self, values: dict[str, InputValue]) -> tuple[str, Optional[str]]:
+        """URL и тело с подставленными значениями"""
+        url = _render(self.url_template, values)
+        body = _render(self.body_template, values) if self.body_template is not None else None
+        return url, body
+
+
+def _encode(value: InputValue, codec: Optional[str]) -> str:
+    if codec == "json":
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, list):
+        value = "\n".join(str(v) for v in value)
+    value = str(value)
+    if codec == "url":
+        return quote(value)
+    if codec == "form":
+        return quote_plus(value)
+    if codec == "jsonstr":
+        return json.dumps(value, ensure_ascii=False)[1:-1]
+    return value
+
+
+def _render(template: str, values: dict[str, InputValue]) -> str:
+    def sub(match: re.Match) -> str:
+        name, codec = match.group(1), match.group(2)
+        if name not in values:
+            raise KeyError(f"нет значения для плейсхолдера {name}")
+        return _encode(values[name], codec)
+
+    return _PLACEHOLDER_RE.sub(sub, template)
+
+
+def _variants(sample: InputValue, preferred: Optional[str]) -> dict[str, Optional[str]]:
+    """Все кодировки образца: строка -> кодек плейсхолдера"""
+    joined = "\n".join(str(v) for v in sample) if isinstance(sample, list) else str(sample)
+    candidates: list[tuple[str, Optional[str]]] = []
+    if isinstance(sample, list):
+        for kwargs in ({}, {"ensure_ascii": False}, {"separators": (",", ":")},
+                       {"ensure_ascii": False, "separators": (",", ":")}):
+            candidates.append((json.dumps(sample, **kwargs), "json"))
+    candidates += [
+        (quote_plus(joined), "form"),
+        (quote(joined), "url"),
+        (quote(joined, safe=""), "url"),
+        (json.dumps(joined)[1:-1], "jsonstr"),
+        (json.dumps(joined, ensure_ascii=False)[1:-1], "jsonstr"),
+        (joined, None),
+    ]
+    variants: dict[str, Optional[str]] = {}
+    for variant, codec in candidates:
+        if variant and (variant not in variants or codec == preferred):
+            variants[variant] = codec
+    return variants
+
+
+def _marker(name: str, codec: Optional[str]) -> str:
+    return f"{{{{{name}|{codec}}}}}" if codec else f"{{{{{name}}}}}"
+
+
+def _templatize_url(url: str, samples: dict[str, InputValue]) -> tuple[str, list[str]]:
+    # Только целые значения query-параметров и каждый образец один раз (первый
+    # параметр): короткий образец ("ru", "2") иначе задел бы хост, путь или
+    # соседние параметры вроде lang=ru
+    parts = urlsplit(url)
+    if not parts.query:
+        return url, []
+    variants = {name: _variants(sample, "url") for name, sample in samples.items()}
+    found: list[str] = []
+    pieces = []
+    for piece in parts.query.split("&"):
+        key, sep, value = piece.partition("=")
+        for name, codecs in variants.items():
+            if sep and name not in found and value in codecs:
+                value = _marker(name, codecs[value])
+                if name not in found:
+                    found.append(name)
+                break
+        pieces.append(f"{key}{sep}{value}")
+    return urlunsplit(parts._replace(query="&".join(pieces))), found
+
+
+def templatize(text: str, samples: dict[str, InputValue], *, context: str = "url") -> tuple[str, list[str]]:
+    """Заменить образцы значений в тексте на плейсхолдеры (во всех кодировках)
+
+    ``context`` (url / form / json / raw) решает, какую кодировку выбрать,
+    когда несколько вариантов дают одну и ту же строку. В URL заменяется
+    только первое значение query-параметра, совпадающее с образцом целиком.
+    """
+    if context == "url":
+        return _templatize_url(text, samples)
+    preferred = {"form": "form", "json": "jsonstr"}.get(context)
+    found: list[str] = []
+    for name, sample in samples.items():
+        # длинные варианты первыми, чтобы не резать закодированное частично
+        for variant, codec in sorted(_variants(sample, preferred).items(), key=lambda v: -len(v[0])):
+            if variant in text:
+                text = text.replace(variant, _marker(name, codec))
+                if name not in found:
+                    found.append(name)
+    return text, found
+
+
+class RecipeStore:
+    """Именованные рецепты в data/xhr_recipes.json"""
+
+    def __init__(self, path: Path = RECIPES_PATH):
+        self.path = Path(path)
+        self._recipes: dict[str, XhrRecipe] = {}
+        if self.path.exists():
+            try:
+                raw = json.loads(self.path.read_text(encoding="utf-8"))
+                self._recipes = {name: XhrRecipe(**data) for name, data in raw.items()}
+            except Exception as e:
+                print(f"[RECIPE] Не удалось прочитать {self.path}: {e}")
+
+    def get(self, name: str, *, allow_stale: bool = False) -> Optional[XhrRecipe]:
+        recipe = self._recipes.get(name)
+        if recipe is None or (recipe.stale and not allow_stale):
+            return None
+        return recipe
+
+    def put(self, recipe: XhrRecipe):
+        self._recipes[recipe.name] = recipe
+        self.save()
+
+    def mark_stale(self, name: str, reason: str):
+        recipe = self._recipes.get(name)
+        if recipe is not None and not recipe.stale:
+            recipe.stale = True
+            recipe.stale_reason = reason
+            self.save()
+            print(f"[RECIPE] {name}: рецепт устарел ({reason})")
+
+    def names(self) -> list[str]:
+        return sorted(self._recipes)
+
+    def save(self):
+        data = {name: asdict(recipe) for name, recipe in self._recipes.items()}
+        self.path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+class RecipeRecorder:
+    """
+    Снимает рецепт с запроса, который браузер делает во время блока:
+
+        recorder = RecipeRecorder(context)
+        async with recorder.record("wordstat_export", {"q": mask}, match="/export") as rec:
+            await page.click('text="Скачать"')
+        recipe = rec.recipe
+    """
+
+    def __init__(self, context: BrowserContext, store: Optional[RecipeStore] = None):
+        self.context = context
+        self.store = store or RecipeStore()
+        self.recipe: Optional[XhrRecipe] = None
+
+    @staticmethod
+    def _matches(request: Request, match: Matcher) -> bool:
+        if callable(match):
+            return bool(match(request))
+        return match in request.url
+
+    @asynccontextmanager
+    async def record(
+        self,
+        name: str,
+        samples: dict[str, InputValue],
+        *,
+        match: Matcher,
+        timeout: float = 30.0,
+    ) -> AsyncIterator["RecipeRecorder"]:
+        captured: asyncio.Future = asyncio.get_running_loop().create_future()
+
+        def on_request(request: Request):
+            if not captured.done() and self._matches(request, match):
+                captured.set_result(request)
+
+        self.context.on("request", on_request)
+        try:
+            yield self
+            request = await asyncio.wait_for(captured, timeout=timeout)
+            self.recipe = await self._build(name, request, samples)
+            self.store.put(self.recipe)
+            print(f"[RECIPE] {name}: записан {self.recipe.method} {self.recipe.url_template[:100]}")
+        finally:
+            self.context.remove_listener("request", on_request)
+
+    async def _build(self, name: str, request: Request, samples: dict[str, InputValue]) -> XhrRecipe:
+        headers = {
+            k: v
+            for k, v in (await request.all_headers()).items()
+            if k.lower() not in _DROP_HEADERS and not k.startswith(":")
+        }
+        url_template, url_found = templatize(request.url, samples, context="url")
+        body_template, body_found = (None, [])
+        if request.post_data is not None:
+            content_type = (request.headers.get("content-type") or "").lower()
+            body = request.post_data
+            if "json" in content_type or body.lstrip()[:1] in ("{", "["):
+                context = "json"
+            elif "x-www-form-urlencoded" in content_type:
+                context = "form"
+            else:
+                context = "raw"
+            body_template, body_found = templatize(body, samples, context=context)
+
+        response_kind = "text"
+        response = await request.response()
+        if response is not None:
+            content_type = (response.headers.get("content-type") or "").lower()
+            if "json" in content_type:
+                response_kind = "json"
+            elif "csv" in content_type or "octet-stream" in content_type:
+                response_kind = "csv"
+
+        placeholders = list(dict.fromkeys(url_found + body_found))
+        missing = [n for n in samples if n not in placeholders]
+        if missing:
+            print(f"[RECIPE] {name}: образцы {missing} не найдены в запросе, они будут константами")
+        return XhrRecipe(
+            name=name,
+            method=request.method,
+            url_template=url_template,
+            headers=headers,
+            body_template=body_template,
+            response_kind=response_kind,
+            placeholders=placeholders,
+        )
+
+
+class RecipeStale(Exception):
+    """Ответ говорит о том, что рецепт больше не работает"""
+
+
+class RecipeReplayer:
+    """
+    Реплей рецепта по HTTP для пачки входов
+
+    Cookies - из одного контекста (``cookies``) или ротация по аккаунтам
+    (``session_pool``). Результаты отдаются по мере готовности как
+    ``{"values", "status", "data"}``; data - JSON, текст CSV или текст.
+    Когда рецепт протухает, необработанные входы идут в ``fallback``
+    (браузерный путь, вызовы по очереди), status у них ``"fallback"``.
+    """
+
+    def __init__(
+        self,
+        recipe: XhrRecipe,
+        *,
+        cookies: Optional[list[dict]] = None,
+        session_pool: Optional[CookieSessionPool] = None,
+        store: Optional[RecipeStore] = None,
+        concurrency: int = 4,
+        max_retries: int = 2,
+    ):
+        if cookies is None and session_pool is None:
+            raise ValueError("нужны cookies или session_pool")
+        self.recipe = recipe
+        self.cookies = cookies
+        self.session_pool = session_pool
+        self.store = store
+        self.pacer = AdaptivePacer(concurrency=concurrency)
+        self.max_retries = max_retries
+
+    async def _send(self, http: aiohttp.ClientSession, values: dict, headers: dict, request_kwargs: dict) -> tuple[str, Any]:
+        url, body = self.recipe.render(values)
+        data = body.encode("utf-8") if body is not None else None
+        async with http.request(
+            self.recipe.method, url, data=data, headers={**self.recipe.headers, **headers}, **request_kwargs
+        ) as resp:
+            if "showcaptcha" in str(resp.url):
+                return "captcha", None
+            if resp.status in (401, 403):
+                return "auth", None
+            if resp.status in (404, 410):
+                raise RecipeStale(f"HTTP {resp.status}")
+            if resp.status == 429 or resp.status >= 500:
+                return "throttled", None
+            if resp.status != 200:
+                return f"http {resp.status}", None
+            content_type = (resp.headers.get("content-type") or "").lower()
+            if self.recipe.response_kind == "json":
+                if "json" not in content_type:
+                    raise RecipeStale(f"ожидался JSON, пришёл {content_type or 'пустой тип'}")
+                return "ok", await resp.json(content_type=None)
+            if self.recipe.response_kind == "csv" and "csv" not in content_type and "octet-stream" not in content_type:
+                raise RecipeStale(f"ожидался CSV, пришёл {content_type or 'пустой тип'}")
+            return "ok", await resp.text()
+
+    async def _attempt(self, http: aiohttp.ClientSession, values: dict) -> tuple[str, Any]:
+        url, _ = self.recipe.render(values)
+        if self.session_pool is not None:
+            async with self.session_pool.lease() as sess:
+                try:
+                    result = await self._send(http, values, sess.headers(url), sess.request_kwargs())
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    result = (f"error: {str(e)[:80]}", None)
+            self.session_pool.report(sess, result[0])
+            return result
+        try:
+            async with self.pacer:
+                result = await self._send(http, values, {"Cookie": cookie_header(self.cookies, url)}, {})
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result = (f"error: {str(e)[:80]}", None)
+        status = result[0]
+        if status == "ok":
+            self.pacer.on_success()
+        elif status in ("captcha", "auth"):
+            self.pacer.on_captcha()
+        elif status == "throttled" or status.startswith("error"):
+            self.pacer.on_throttle()
+        return result
+
+    async def iter_replay(
+        self,
+        inputs: list[dict[str, InputValue]],
+        *,
+        fallback: Optional[Callable[[dict], Awaitable[Any]]] = None,
+    ) -> AsyncIterator[dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        stale = asyncio.Event()
+        # браузер один - фолбэки по очереди
+        fallback_lock = asyncio.Lock()
+        retryable = ("throttled", "captcha", "auth") if self.session_pool is not None else ("throttled",)
+
+        async def run_one(http: aiohttp.ClientSession, values: dict):
+            status, data = "error", None
+            try:
+                for _ in range(self.max_retries + 1):
+                    if stale.is_set():
+                        break
+                    status, data = await self._attempt(http, values)
+                    if status in retryable or status.startswith("error"):
+                        continue
+                    break
+                if self.session_pool is None and status in ("captcha", "auth"):
+                    raise RecipeStale(status)
+            except RecipeStale as e:
+                if not stale.is_set():
+                    stale.set()
+                    if self.store is not None:
+                        self.store.mark_stale(self.recipe.name, str(e))
+            except RuntimeError as e:
+                # в пуле не осталось живых сессий
+                status = f"error: {e}"
+            except Exception as e:
+                # KeyError рендера, ошибки разбора ответа и т.п.: строка результата
+                # нужна всегда, иначе потребитель ждёт её вечно
+                status = f"error: {type(e).__name__}: {str(e)[:80]}"
+            if stale.is_set() and status != "ok":
+                status, data = "stale", None
+                if fallback is not None:
+                    try:
+                        async with fallback_lock:
+                            data = await fallback(values)
+                        status = "fallback"
+                    except Exception as e:
+                        status = f"fallback error: {str(e)[:80]}"
+            await queue.put({"values": values, "status": status, "data": data})
+
+        async with new_http_session(limit_per_host=max(self.pacer.concurrency * 2, 8)) as http:
+            tasks = [asyncio.create_task(run_one(http, values)) for values in inputs]
+            try:
+                for _ in range(len(tasks)):
+                    yield await queue.get()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+
+__all__ = [
+    "RECIPES_PATH",
+    "XhrRecipe",
+    "RecipeStore",
+    "RecipeRecorder",
+    "RecipeReplayer",
+    "RecipeStale",
+    "templatize",
+]
@@ -9,6 +9,23 @@ from pathlib import Path
 from playwright.async_api import async_playwright, expect
 from PySide6.QtCore import QObject, Signal
 
+from .waits import wait_for_any, wait_for_dom, wait_for_url
+
+# Поле поиска Wordstat = аккаунт авторизован
+WORDSTAT_INPUT = ['input[name="words"]', 'input.b-form-input__input']
+# Страницы паспорта: форма логина, выбор аккаунта
+PASSPORT_URL = re.compile(r"passport\.yandex|/pwl-yandex|/auth/list")
+LOGIN_FORM = ["#passp-field-login", 'input[name="login"]']
+# Куда ведёт успешный логин
+AUTH_DONE_URL = re.compile(r"^https://(ya\.ru|id\.yandex|wordstat\.yandex)")
+# Шаблоны привязаны к хосту: retpath в URL паспорта не экранирован и
+# содержит "wordstat.yandex", так что подстрока совпала бы сразу
+WORDSTAT_URL = re.compile(r"^https://wordstat\.yandex\.\w+")
+AFTER_SUBMIT_URL = re.compile(
+    r"^https://(passport\.yandex\.\w+/(auth/(challenge|finish)|(auth/)?(profile|success|welcome))"
+    r"|id\.yandex|ya\.ru|wordstat\.yandex)"
+)
+
 
 class YandexSmartLogin(QObject):
     """Умный автологин с обработкой всех вариантов форм Яндекса"""
@@ -129,8 +146,15 @@ class YandexSmartLogin(QObject):
                 # СРАЗУ ПЕРЕХОДИМ НА WORDSTAT, а не оставляем about:blank!
                 try:
                     self.status_update.emit(f"[NAVIGATE] Переход на wordstat.yandex.ru...")
-                    await page.goto("https://wordstat.yandex.ru", wait_until="domcontentloaded", timeout=30000)
-                    await asyncio.sleep(2)  # Даем странице загрузиться
+                    # Ждём поле поиска или редирект на паспорт, а не фиксированную паузу
+                    await wait_for_any(
+                        page,
+                        action=lambda: page.goto("https://wordstat.yandex.ru", wait_until="domcontentloaded", timeout=30000),
+                        url=PASSPORT_URL,
+                        selectors=WORDSTAT_INPUT,
+                        timeout=10000,
+                        label=f"login {account_name}: wordstat",
+                    )
                     self.status_update.emit(f"[NAVIGATE] Текущий URL: {page.url}")
                 except Exception as e:
                     self.status_update.emit(f"[WARNING] Не удалось перейти на wordstat: {str(e)}")
@@ -143,8 +167,6 @@ class YandexSmartLogin(QObject):
                 self.status_update.emit("[CHECK] Проверка авторизации...")
                 self.progress_update.emit(30)
                 
-                # Даем странице загрузиться
-                await asyncio.sleep(3)
                 current_url = page.url
                 
                 # ПРОВЕРЯЕМ РЕАЛЬНО ЛИ АВТОРИЗОВАН по элементам на странице
@@ -186,9 +208,13 @@ class YandexSmartLogin(QObject):
                         
                         if await existing_account.count() > 0:
                             self.status_update.emit(f"[PWL] Нашел аккаунт {account_name} в списке, выбираю его...")
-                            await existing_account.click()
-                            await page.wait_for_load_state("domcontentloaded")
-                            await asyncio.sleep(3)
+                            await wait_for_url(
+                                page,
+                                re.compile(r"^https://(wordstat\.yandex|passport\.yandex\.\w+/auth(?!/list))"),
+                                action=existing_account.click,
+                                timeout=10000,
+                                label=f"login {account_name}: pwl select",
+                            )
                             
                             # Проверяем - перешли ли на wordstat?
                             if "wordstat.yandex" in page.url:
@@ -202,9 +228,10 @@ class YandexSmartLogin(QObject):
                             self.status_update.emit("[PWL] Аккаунт не найден в списке, добавляю новый...")
                             add_btn = page.locator('a[href*="/auth/add"], a:has-text("Добавить"), button:has-text("Добавить")')
                             if await add_btn.count() > 0:
-                                await add_btn.first.click()
-                                await page.wait_for_load_state("domcontentloaded")
-                                await asyncio.sleep(2)
+                                await wait_for_dom(
+                                    page, LOGIN_FORM, action=add_btn.first.click, timeout=10000,
+                                    label=f"login {account_name}: add account",
+                                )
                     except Exception as e:
                         self.status_update.emit(f"[PWL] Ошибка при выборе аккаунта: {e}")
                         pass
@@ -215,9 +242,15 @@ class YandexSmartLogin(QObject):
                     await page.goto("https://passport.yandex.ru/auth?retpath=https://wordstat.yandex.ru", 
                                   wait_until="domcontentloaded", timeout=60000)
                 
-                # Ждем загрузки страницы и проверяем URL
+                # Ждем форму логина (или редирект обратно на wordstat)
                 await page.wait_for_load_state("domcontentloaded")
-                await asyncio.sleep(1)  # Даем время на возможные редиректы
+                await wait_for_any(
+                    page,
+                    url=WORDSTAT_URL,
+                    selectors=LOGIN_FORM + ['form input[type="password"]'],
+                    timeout=5000,
+                    label=f"login {account_name}: form",
+                )
                 
                 # Проверяем текущий URL
                 current_url = page.url
@@ -265,9 +298,10 @@ class YandexSmartLogin(QObject):
                         add_btn = page.locator('a[href*="/auth/add"], button:has-text("Добавить"), a:has-text("Другой")')
                         if await add_btn.count() > 0:
                             self.status_update.emit("[PWL] Нажимаю 'Добавить аккаунт'...")
-                            await add_btn.first.click()
-                            await page.wait_for_load_state("domcontentloaded")
-                            await asyncio.sleep(3)
+                            await wait_for_dom(
+                                page, LOGIN_FORM, action=add_btn.first.click, timeout=10000,
+                                label=f"login {account_name}: add account",
+                            )
                             
                             # После клика проверяем форму снова
                             is_new_form = await page.locator("#passp-field-login").count() > 0
@@ -315,7 +349,7 @@ class YandexSmartLogin(QObject):
                         await page.fill("#passp-field-passwd", password)
                         
                         await asyncio.gather(
-                            page.wait_for_url(re.compile(r"(challenge|finish|id\.yandex|profile|success|wordstat)", re.I), 
+                            page.wait_for_url(AFTER_SUBMIT_URL, 
                                             timeout=20000),
                             page.locator('button[type=submit], button:has-text("Войти")').click()
                         )
@@ -335,13 +369,19 @@ class YandexSmartLogin(QObject):
                         await password_field.fill(password)
                     
                     await asyncio.gather(
-                        page.wait_for_url(re.compile(r"(challenge|finish|id\.yandex|profile|welcome|wordstat)", re.I), 
+                        page.wait_for_url(AFTER_SUBMIT_URL, 
                                         timeout=20000),
                         form.get_by_role("button", name=re.compile("войти", re.I)).click()
                     )
                 
-                # Ждем результата
-                await asyncio.sleep(2)
+                # Ждем результата: challenge, успех или возврат на wordstat
+                await wait_for_any(
+                    page,
+                    url=AFTER_SUBMIT_URL,
+                    selectors=['iframe[src*="challenge"]', 'iframe[name*="passp:challenge"]'],
+                    timeout=5000,
+                    label=f"login {account_name}: after submit",
+                )
                 self.progress_update.emit(70)
                 
                 # 3. ОБРАБОТКА CHALLENGE (секретный вопрос в iframe)
@@ -397,7 +437,7 @@ class YandexSmartLogin(QObject):
                     await ch.get_by_role("button", name=re.compile("Продолжить|Continue", re.I)).click()
                 
                 # Финальная проверка
-                await asyncio.sleep(3)
+                await wait_for_url(page, AUTH_DONE_URL, timeout=10000, label=f"login {account_name}: done")
                 self.progress_update.emit(90)
                 
                 current_url = page.url
@@ -408,15 +448,17 @@ class YandexSmartLogin(QObject):
                     
                     # Если не на wordstat - переходим туда
                     if not current_url.startswith("https://wordstat.yandex"):
-                        await page.goto("https://wordstat.yandex.ru")
-                        await page.wait_for_load_state("networkidle")
+                        await wait_for_dom(
+                            page,
+                            WORDSTAT_INPUT,
+                            action=lambda: page.goto("https://wordstat.yandex.ru", wait_until="domcontentloaded"),
+                            timeout=15000,
+                            label=f"login {account_name}: wordstat",
+                        )
                     
                     self.progress_update.emit(100)
                     self.login_completed.emit(True, "Авторизация успешна")
                     
-                    # Оставляем браузер открытым для дальнейшей работы
-                    await asyncio.sleep(2)
-                    
                     # ВАЖНО: Сохраняем контекст чтобы браузер не закрылся!
                     self._context = context
                     self.status_update.emit(f"[SUCCESS] Браузер остается открытым для {account_name}")